@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: apipath.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        api.statuses.update.post(token, ...) 形式的动态调用链.
+        原先的实现在api对象上累积属性(self._attrs)，多个线程共享同一个api对象时，会把彼此的url混在一起。
+        现在每访问一级属性都返回一个新的、不可变的ApiPath对象，api对象本身不保存任何调用状态，可以在多线程间共享。
+        说明：
+            . ApiPath在被调用时，把属性元组交给所属对象的_invoke(attrs, token, kwargs)处理
+            . PathParser缓存属性元组到(http_method, api_uri)的解析结果
+            . ApiPath.iter以get方式自动翻页，交给所属对象的_iterate(attrs, token, kwargs)处理
+
+        python版本要求：python2.6+，不支持python3.x
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+
+class ApiPath(object):
+    __slots__ = ('_owner', '_attrs')
+
+    def __init__(self, owner, attrs):
+        self._owner = owner
+        self._attrs = attrs
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):   # copy, pickle等会查询__xxx__属性，不能当作api路径
+            raise AttributeError, attr
+        return ApiPath(self._owner, self._attrs + (attr, ))
+
+    def __call__(self, token = None, **kwargs):
+        """调用接口，如：api.statuses.public_timeline.get(token) # 以get方式提交请求
+        """
+        return self._owner._invoke(self._attrs, token, kwargs)
+
+    def iter(self, token = None, **kwargs):
+        """自动翻页，逐条返回结果，如：api.statuses.home_timeline.iter(token, count = 100)
+        """
+        if getattr(type(self._owner), '_iterate', None) is None:
+            raise TypeError('%s does not support iter()' % type(self._owner).__name__)
+        return self._owner._iterate(self._attrs + ('get', ), token, kwargs)
+
+    def __repr__(self):
+        return '<ApiPath %s>' % '.'.join(self._attrs)
+
+
+class PathParser(object):
+    _MAX_CACHE = 1024   # api的数量有限，超过这个数目说明调用方在拼接动态路径，直接清空
+
+    def __init__(self, aliases = None):
+        '''
+
+        @param aliases: 路径别名, 如：{'delete': 'del'}. del是python关键字，使用delete代替
+        '''
+        self._aliases = aliases or { }
+        self._cache = { }
+
+    def parse(self, attrs):
+        '''解析属性元组
+
+        @param attrs: 如：('statuses', 'update', 'post')
+        @return: 元组(http_method, api_uri), 如：('POST', 'statuses/update')
+        '''
+        try:
+            return self._cache[attrs]
+        except KeyError:
+            pass
+        aliases = self._aliases
+        ret = (attrs[-1].upper(), '/'.join(aliases.get(part, part) for part in attrs[:-1]))
+        if len(self._cache) >= PathParser._MAX_CACHE:
+            self._cache = { }
+        self._cache[attrs] = ret  # dict赋值是原子操作，不需要加锁
+        return ret
+
+
+if __name__ == '__main__':
+    pass
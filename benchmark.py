@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: benchmark.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        六个模块(weibo, qweibo, tweibo, weibo2, qweibo2, tweibo2)的性能测试，不访问真实的api.
+        请求由transport.Player在进程内回放：默认使用生成的响应(一页20条微博)，也可以指定录制的cassette。
+        测试项：
+            . call: _call调用timeline接口，包括参数编码、Oauth1.0签名、连接池(回放)和json解析
+            . upload: 上传图片(statuses/upload, t/add_pic)，包括multipart请求体的生成和读取
+            . decode: jsonobj.default_decoder解析一页timeline
+        指标：
+            . calls/s: 每秒调用次数(单线程)
+            . p50, p99: 每次调用的延迟(毫秒)
+            . KB/call: 一次调用的返回结果占用的内存(递归累加sys.getsizeof)
+            . leak: 不保留结果时，每次调用之后多出来的gc对象数，应该为0
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        python benchmark.py
+        python benchmark.py -n 5000 -m weibo2,qweibo2 -c /tmp/weibo.cassette
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import gc
+import os
+import sys
+import json
+import timeit
+import tempfile
+from types import ModuleType, FunctionType
+
+import jsonobj
+import transport
+
+
+MODULES = ('weibo', 'qweibo', 'tweibo', 'weibo2', 'qweibo2', 'tweibo2')
+
+_STATUS = {
+    'id': 3512345678901234, 'mid': '3512345678901234', 'idstr': '3512345678901234',
+    'created_at': 'Sat Jan 05 12:00:00 +0800 2013', 'text': u'选择python，选择简洁 http://darkbull.net',
+    'source': u'<a href="http://darkbull.net">weibosdk</a>', 'favorited': False, 'truncated': False,
+    'reposts_count': 12, 'comments_count': 34,
+    'user': {'id': 2617375872, 'screen_name': 'darkbull', 'name': 'darkbull', 'location': u'福建 厦门',
+             'followers_count': 1024, 'friends_count': 256, 'statuses_count': 4096, 'verified': False},
+}
+
+
+def _page(module, count = 20):
+    # 各平台一页timeline的响应
+    if module.startswith('qweibo'):
+        info = [{'id': str(_STATUS['id'] + i), 'text': _STATUS['text'], 'name': 'darkbull', 'nick': 'DarkBull',
+                 'timestamp': 1357358400 - i} for i in xrange(count)]
+        return json.dumps({'ret': 0, 'msg': 'ok', 'errcode': 0, 'data': {'info': info, 'hasnext': 0, 'timestamp': 1357358400}})
+    statuses = [dict(_STATUS, id = _STATUS['id'] + i) for i in xrange(count)]
+    if module.startswith('tweibo'):
+        return json.dumps(statuses)
+    return json.dumps({'statuses': statuses, 'total_number': 10000, 'next_cursor': 0})
+
+
+def _fallback(module):
+    page = _page(module)
+    posted = json.dumps({'ret': 0, 'msg': 'ok', 'errcode': 0, 'data': {'id': '1', 'time': 1357358400}}
+                        if module.startswith('qweibo') else dict(_STATUS, upload_image_url = 'http://img.t.163.com/1.jpg'))
+    return lambda http_method, scheme, netloc, path, body: (200, 'OK', posted if http_method == 'POST' else page)
+
+
+def _target(name):
+    '''返回(模块, token, 调用timeline的参数, 上传图片的接口, 上传图片的参数)
+    '''
+    module = __import__(name)
+    if name == 'weibo':
+        token = module.OAuthToken('appkey', 'appsecret', 'oauth_token', 'oauth_token_secret', 2617375872, 'verified')
+    elif name in ('qweibo', 'tweibo'):
+        token = module.OAuthToken('appkey', 'appsecret', 'oauth_token', 'oauth_token_secret', original_data = 'verified')
+    elif name == 'qweibo2':
+        token = module.OAuthToken('appkey', 'appsecret', 'access_token', 3600, 'openid', 'darkbull', 'DarkBull', '')
+    else:
+        token = module.OAuthToken('appkey', 'appsecret', 'access_token', 3600, '2617375872')
+    text = u'选择python，选择简洁'
+    if name.startswith('qweibo'):
+        return module, token, {'reqnum': '20'}, 't/add_pic', {'content': text}
+    return module, token, {'count': '20'}, 'statuses/upload', {'status': text}
+
+
+def _percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+
+def deep_size(obj):
+    '''obj及其引用的所有对象占用的内存(字节). 不包括类型、模块和函数
+    '''
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, ModuleType, FunctionType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def measure(func, n):
+    '''调用func n次，返回指标dict: calls/s, p50, p99(毫秒), KB/call, leak
+    '''
+    timer = timeit.default_timer
+    for _ in xrange(min(n, 50)):    # 预热
+        func()
+    gc.collect()
+    objects = len(gc.get_objects())
+    for _ in xrange(n):
+        func()
+    gc.collect()
+    leak = float(len(gc.get_objects()) - objects) / n
+
+    latencies = [ ]
+    start = timer()
+    for _ in xrange(n):
+        t = timer()
+        func()
+        latencies.append(timer() - t)
+    elapsed = timer() - start
+    kb = deep_size(func()) / 1024.0
+    latencies.sort()
+    return {'calls/s': n / elapsed, 'p50': _percentile(latencies, 0.5) * 1000, 'p99': _percentile(latencies, 0.99) * 1000,
+            'KB/call': kb, 'leak': leak}
+
+
+def run(modules = MODULES, n = 2000, cassette = None, pic_size = 200 * 1024):
+    '''运行所有测试项，返回[(模块, 测试项, 指标), ...]
+
+    @param cassette: transport.Cassette. 匹配不到的请求使用生成的响应
+    @param pic_size: 上传的图片大小(字节)
+    '''
+    fd, pic = tempfile.mkstemp(suffix = '.jpg')
+    os.write(fd, os.urandom(pic_size))
+    os.close(fd)
+    rows = [ ]
+    try:
+        for name in modules:
+            module, token, timeline_params, upload_api, upload_params = _target(name)
+            player = transport.Player(cassette or transport.Cassette(), _fallback(name))
+            with transport.use(player):
+                call = lambda: module._call('GET', 'statuses/home_timeline', token, **timeline_params)
+                rows.append((name, 'call', measure(call, n)))
+                upload = lambda: module._call('POST', upload_api, token, pic = pic, **upload_params)
+                rows.append((name, 'upload', measure(upload, max(1, n // 10))))
+            page = _page(name)
+            rows.append((name, 'decode', measure(lambda: jsonobj.default_decoder.decode(page), n)))
+    finally:
+        os.remove(pic)
+    return rows
+
+
+def report(rows, out = sys.stdout):
+    out.write('%-8s %-7s %10s %9s %9s %8s %6s\n' % ('module', 'test', 'calls/s', 'p50(ms)', 'p99(ms)', 'KB/call', 'leak'))
+    for name, test, m in rows:
+        out.write('%-8s %-7s %10.0f %9.3f %9.3f %8.2f %6.2f\n' % (name, test, m['calls/s'], m['p50'], m['p99'], m['KB/call'], m['leak']))
+
+
+def main(argv = None):
+    import optparse
+    parser = optparse.OptionParser(usage = 'python benchmark.py [options]')
+    parser.add_option('-n', type = 'int', default = 2000, help = 'calls per test (uploads use n / 10)')
+    parser.add_option('-m', '--modules', default = ','.join(MODULES), help = 'comma separated module names')
+    parser.add_option('-c', '--cassette', help = 'replay responses recorded by transport.Recorder')
+    parser.add_option('--json', action = 'store_true', help = 'print results as json')
+    options, _ = parser.parse_args(argv)
+    cassette = transport.Cassette(options.cassette) if options.cassette else None
+    rows = run(options.modules.split(','), options.n, cassette)
+    if options.json:
+        print json.dumps([{'module': name, 'test': test, 'metrics': m} for name, test, m in rows], indent = 2)
+    else:
+        report(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: coalesce.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        把并发的单个查询合并成批量接口的调用：
+            . 新浪: users/show(uid或screen_name) => users/show_batch(uids或screen_name)，每批最多50个
+            . 腾讯: user/other_info(name或fopenid) => user/infos(names或fopenids)；t/show(id) => t/list(ids)，每批最多30个
+        原先每查一个用户就是一次请求，服务里大量worker同时查用户信息时请求数和频次限制都很快用完。
+        说明：
+            . 第一个查询到达后等待window秒，这段时间内同一个token、同一个接口(其他参数也相同)的查询合并成一批；
+              达到每批的上限时立即发送
+            . 同一批里重复的参数只查一次
+            . 批量接口的结果按参数拆分，每个调用方拿到的结果与单个查询的格式相同(腾讯的结果包装成{ret, data})
+            . 批量接口出错时，这一批的所有调用方都抛出同样的异常；批量结果中没有的参数(如：用户不存在)抛出ApiError
+            . 批量请求在workers(executor.Executor)中执行；同步调用等待结果，AsyncOAuth2Api直接返回Future，不占用工作线程
+            . 合并的查询不经过OAuth2Api的cache
+            . 可以合并的接口由各平台的Platform.batch_apis定义
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        api = weibo2.OAuth2Api(appkey, appsecret, callback, coalescer = Coalescer(window = 0.01))
+        # 在多个线程中
+        user = api.users.show.get(token, uid = uid)
+        print api.coalescer.stats()
+
+        python coalesce.py  # 500个并发的users/show合并成的请求数
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import sys
+import time
+import threading
+
+import executor
+import errors
+
+
+utf8 = lambda u: u.encode('utf-8')
+
+
+class _Batch(object):
+    __slots__ = ('platform', 'token', 'api_uri', 'param', 'params', 'cache', 'futures', 'deadline')
+
+    def __init__(self, platform, token, api_uri, param, params, cache, deadline):
+        self.platform = platform
+        self.token = token
+        self.api_uri = api_uri
+        self.param = param
+        self.params = params
+        self.cache = cache
+        self.futures = { }  # key: 参数值, value: executor.Future
+        self.deadline = deadline
+
+
+class Coalescer(object):
+    def __init__(self, window = 0.01, workers = None):
+        '''
+
+        @param window: 第一个查询到达后等待合并的时间(秒)
+        @param workers: 执行批量请求的executor.Executor. None表示新建一个(最多8个线程)
+        '''
+        self.window = window
+        self.workers = workers or executor.Executor(8)
+        self._pending = { } # key: (平台, 接口, 参数名, token, 其他参数), value: _Batch
+        self._cond = threading.Condition()
+        self._thread = None
+        self.calls = 0  # 合并的单个查询数
+        self.batches = 0    # 发送的批量请求数
+
+    def match(self, platform, http_method, api_uri, kwargs):
+        '''可以合并时返回(参数名, 参数值, 其他参数)，否则返回None
+        '''
+        spec = platform.batch_apis.get(api_uri)
+        if spec is None or http_method != 'GET':
+            return None
+        names = [name for name in spec[1] if name in kwargs]
+        if len(names) != 1:
+            return None
+        params = dict(kwargs)
+        value = params.pop(names[0])
+        if isinstance(value, (list, tuple)):
+            return None
+        return names[0], utf8(value) if type(value) is unicode else str(value), params
+
+    def submit(self, platform, token, api_uri, param, value, params = None, cache = None):
+        '''提交一个单个查询，返回executor.Future
+
+        @param param: 单个查询的参数名，如：uid
+        @param value: 参数值(字符串)
+        @param params: 其他参数
+        '''
+        params = params or { }
+        max_size = platform.batch_apis[api_uri][2]
+        # 其他参数的值可能是list、dict等不能hash的类型，与singleflight.Group.make_key一样转换成字符串
+        others = tuple(sorted((key, utf8(val) if type(val) is unicode else str(val)) for key, val in params.items()))
+        key = (platform.name, api_uri, param, getattr(token, 'access_token', None), others)
+        full = None
+        with self._cond:
+            self.calls += 1
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = _Batch(platform, token, api_uri, param, params, cache, time.time() + self.window)
+                if self._thread is None:
+                    self._thread = threading.Thread(target = self._loop)
+                    self._thread.daemon = True
+                    self._thread.start()
+                self._cond.notify()
+            future = batch.futures.get(value)
+            if future is None:
+                future = batch.futures[value] = executor.Future()
+            if len(batch.futures) >= max_size:
+                del self._pending[key]
+                full = batch
+        if full is not None:
+            self._dispatch(full)
+        return future
+
+    def _loop(self):
+        # 到期的批次交给workers执行
+        while True:
+            with self._cond:
+                now = time.time()
+                due = [key for key, batch in self._pending.iteritems() if batch.deadline <= now]
+                batches = [self._pending.pop(key) for key in due]
+                if not batches:
+                    self._cond.wait(min(batch.deadline for batch in self._pending.itervalues()) - now if self._pending else None)
+                    continue
+            for batch in batches:
+                self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        with self._cond:
+            self.batches += 1
+        self.workers.submit_keyed(batch.platform.host, self._run, batch)
+
+    def _run(self, batch):
+        try:
+            results = batch.platform.call_batch(batch.api_uri, batch.param, list(batch.futures), batch.token, batch.cache, **batch.params)
+        except Exception:
+            exc_info = sys.exc_info()
+            for future in batch.futures.itervalues():
+                future.set_exc_info(exc_info)
+            return
+        for value, future in batch.futures.iteritems():
+            ret = results.get(value)
+            if ret is None:
+                message = u'[error occur when request "%s"]: %s=%s not found' % (batch.api_uri, batch.param, value.decode('utf-8'))
+                future.set_exc_info((errors.ApiError, errors.ApiError(message, request = batch.api_uri), None))
+            else:
+                future.set_result(ret)
+
+    def stats(self):
+        with self._cond:
+            return {'calls': self.calls, 'batches': self.batches, 'pending': len(self._pending)}
+
+
+def _benchmark(calls = 500, users = 200, threads = 100):
+    '''threads个线程并发查询calls次users/show(uid在users个用户中随机选择)，比较合并前后的请求数.
+    通过transport.Player回放(不联网)，每个users/show_batch请求模拟50ms的响应时间
+    '''
+    import json
+    import random
+    import urlparse
+    import Queue
+    import transport
+    import weibo2
+
+    requests = [ ]
+
+    def show_batch(http_method, scheme, netloc, path, body = None):
+        requests.append(path)
+        time.sleep(0.05)
+        query = dict(urlparse.parse_qsl(path.partition('?')[2]))
+        users = [{'id': int(uid), 'screen_name': 'user%s' % uid} for uid in query.get('uids', '').split(',') if uid]
+        return 200, 'OK', json.dumps({'users': users})
+
+    with transport.use(transport.Player(transport.Cassette(), show_batch)):
+        api = weibo2.OAuth2Api('', '', '', coalescer = Coalescer(window = 0.01))
+        token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+        uids = Queue.Queue()
+        for _ in xrange(calls):
+            uids.put(random.randint(1, users))
+
+        def work():
+            while True:
+                try:
+                    uid = uids.get_nowait()
+                except Queue.Empty:
+                    return
+                assert api.users.show.get(token, uid = uid).id == uid
+
+        start = time.time()
+        workers = [threading.Thread(target = work) for _ in xrange(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        print 'users/show calls: %d, http requests: %d (%.1fx fewer), %.3fs' % (calls, len(requests), float(calls) / len(requests), time.time() - start)
+        print api.coalescer.stats()
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: errors.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        各模块共用的异常类型和重试策略.
+        原先_call的所有错误都是同一个WeiBoError，只有一段文字说明，调用方要解析文字才能区分
+        临时性的错误(系统繁忙、频次超限、网络超时)和永久性的错误(token无效、内容重复).
+        说明：
+            . WeiBoError带有error_code, status(http状态码), request(请求的接口)属性，错误信息与原来相同
+            . 子类：NetworkError, ServerError, RateLimitError为临时性错误(retryable为True)；
+              AuthError, ApiError为永久性错误，重试没有意义
+            . rejected为True表示请求肯定没有被服务器处理(连接被拒绝、频次超限、服务暂停)，POST也可以安全地重发
+            . RetryPolicy: 指数退避 + 随机抖动(full jitter). GET重试所有临时性错误，POST等非幂等的请求只重试rejected的错误
+            . RetryBudget: 重试的次数不超过请求数的一定比例，服务端故障时避免重试风暴
+            . 每个模块都有一个retry_policy变量(默认None，不重试)
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        weibo2.retry_policy = RetryPolicy(max_attempts = 4, budget = RetryBudget(0.1))
+        try:
+            api.statuses.update.post(token, status = u'test')
+        except AuthError:
+            pass    # 重新授权
+        except WeiBoError as ex:
+            print ex.error_code, ex.status, ex.request
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import json
+import time
+import errno
+import random
+import socket
+import httplib
+import threading
+
+
+class WeiBoError(Exception):
+    retryable = False   # 是否为临时性错误
+
+    def __init__(self, message, error_code = None, status = None, request = None, rejected = False):
+        '''
+
+        @param message: 错误信息
+        @param error_code: 平台返回的错误码
+        @param status: http状态码
+        @param request: 请求的接口
+        @param rejected: 请求肯定没有被服务器处理
+        '''
+        Exception.__init__(self, message)
+        self.error_code = error_code
+        self.status = status
+        self.request = request
+        self.rejected = rejected
+
+
+class NetworkError(WeiBoError):
+    '''网络错误：连接失败、超时、连接被断开. 除了连接被拒绝以外，请求可能已经被服务器处理
+    '''
+    retryable = True
+
+
+class ServerError(WeiBoError):
+    '''服务器错误：5xx, 系统繁忙, 服务暂停
+    '''
+    retryable = True
+
+
+class RateLimitError(WeiBoError):
+    '''调用频次超过限制(服务器返回的，或者客户端限流等待超时)
+    '''
+    retryable = True
+
+
+class AuthError(WeiBoError):
+    '''token无效、过期、被撤销，需要重新授权
+    '''
+
+
+class ApiError(WeiBoError):
+    '''其他错误：参数错误、内容重复、权限不足等
+    '''
+
+
+# _request可能抛出的网络错误
+NETWORK_ERRORS = (IOError, httplib.HTTPException)
+
+# 新浪Oauth2.0的错误码: http://open.weibo.com/wiki/Error_code
+_SERVER_CODES = frozenset([10001, 10002, 10003, 10009, 10010])
+_REJECTED_CODES = frozenset([10002, 10009])    # 服务暂停，任务过多: 请求没有被执行
+_RATE_LIMIT_CODES = frozenset([10022, 10023, 10024, 20016])
+_AUTH_CODES = frozenset([21301, 21314, 21315, 21316, 21317, 21319, 21327, 21332, 21501])
+
+
+def _int(val):
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return None
+
+
+def make_error(message, error_code = None, status = None, request = None):
+    '''按错误码和http状态码创建对应类型的异常
+    '''
+    code = _int(error_code)
+    if code is not None and 400 <= code < 600:
+        status = code   # 新浪Oauth1.0、网易的error_code就是http状态码
+    if code in _RATE_LIMIT_CODES:
+        cls, rejected = RateLimitError, True
+    elif code in _AUTH_CODES or status == 401:
+        cls, rejected = AuthError, False
+    elif code in _SERVER_CODES or (status is not None and status >= 500):
+        cls, rejected = ServerError, code in _REJECTED_CODES or status == 503
+    else:
+        cls, rejected = ApiError, False
+    return cls(message, error_code, status, request, rejected)
+
+
+def from_json(json_obj, status, request):
+    '''返回结果中带有error_code时的异常
+    '''
+    message = u'[error:%s occur when request "%s"]:%s' % (json_obj['error_code'], json_obj.get('request'), json_obj.get('error'))
+    return make_error(message, json_obj['error_code'], status, json_obj.get('request') or request)
+
+
+def from_response(status, reason, html, request):
+    '''http状态码不是200时的异常
+    '''
+    try:
+        json_obj = json.loads(html)
+        if json_obj.get('error_code'):
+            return from_json(json_obj, status, request)
+    except Exception:
+        pass
+    return make_error('errcode: %d, reason: %s, html: %s' % (status, reason, html), None, status, request)
+
+
+def from_network(ex, request):
+    '''_request抛出的网络错误
+    '''
+    # 连接被拒绝、域名解析失败时请求还没有发出去
+    rejected = isinstance(ex, socket.gaierror) or getattr(ex, 'errno', None) == errno.ECONNREFUSED
+    return NetworkError(ex, None, None, request, rejected)
+
+
+class RetryBudget(object):
+    def __init__(self, ratio = 0.1, reserve = 10):
+        '''重试预算：每个请求存入ratio次重试的额度，每次重试消耗1次
+
+        @param ratio: 重试次数占请求次数的最大比例
+        @param reserve: 额度的上限(也是初始值)，允许少量请求时的重试
+        '''
+        self.ratio = ratio
+        self.reserve = float(reserve)
+        self._balance = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self.reserve, self._balance + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class RetryPolicy(object):
+    def __init__(self, max_attempts = 3, backoff = 0.5, max_backoff = 30, budget = None, idempotent = ('GET', )):
+        '''
+
+        @param max_attempts: 最多尝试的次数(包括第一次)
+        @param backoff: 第一次重试前等待时间的上限(秒), 以后每次翻倍
+        @param max_backoff: 等待时间上限的最大值(秒)
+        @param budget: RetryBudget对象，None表示不限制重试的比例
+        @param idempotent: 幂等的http方法，重试所有临时性错误; 其他方法只重试rejected的错误
+        '''
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.idempotent = idempotent
+        self.retries = 0    # 重试的次数
+        self.exhausted = 0  # 因重试预算用完而放弃重试的次数
+        self._lock = threading.Lock()
+
+    def should_retry(self, http_method, ex, attempt):
+        '''
+
+        @param attempt: 已经尝试的次数
+        '''
+        if not ex.retryable or attempt >= self.max_attempts:
+            return False
+        return http_method in self.idempotent or ex.rejected
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** (attempt - 1))))
+
+    def call(self, http_method, func, *args):
+        '''调用func(*args)，遇到可以重试的WeiBoError时等待后重试
+        '''
+        budget = self.budget
+        if budget is not None:
+            budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                return func(*args)
+            except WeiBoError as ex:
+                if not self.should_retry(http_method, ex, attempt):
+                    raise
+                if budget is not None and not budget.withdraw():
+                    with self._lock:
+                        self.exhausted += 1
+                    raise
+            with self._lock:
+                self.retries += 1
+            time.sleep(self.delay(attempt))
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {'retries': self.retries, 'exhausted': self.exhausted}
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: executor.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        异步调用api用到的Future和有界线程池.
+        python2.x没有asyncio和concurrent.futures, 这里用标准库的threading实现一个精简版本.
+        说明：
+            . Executor最多启动max_workers个线程，线程在第一次提交任务时才创建
+            . submit_keyed按key(如：api的host)限制同时执行的任务数，超出的任务排队，不占用工作线程
+            . 还没开始执行的任务可以通过Future.cancel()取消
+            . 任务在线程中执行，同时执行的任务数(如：正在网络上的请求数)最多是max_workers，不是非阻塞io
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        pool = Executor(max_workers = 8, max_per_key = 2)
+        futures = [pool.submit_keyed('api.weibo.com', api.users.show.get, token, uid = uid) for uid in uids]
+        for f in as_completed(futures):
+            print f.result()
+
+        with api.batch() as b:
+            for uid in uids:
+                b.users.show.get(token, uid = uid)
+            for slot in b.as_completed():
+                print slot.result()
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import sys
+import threading
+import Queue
+from collections import deque
+
+import apipath
+
+
+class CancelledError(Exception):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+_PENDING, _RUNNING, _CANCELLED, _FINISHED = range(4)
+
+
+class Future(object):
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._state = _PENDING
+        self._result = None
+        self._exc_info = None
+        self._callbacks = [ ]
+
+    def cancel(self):
+        '''取消任务. 任务已经开始执行时不能取消，返回False
+        '''
+        with self._cond:
+            if self._state == _RUNNING or self._state == _FINISHED:
+                return False
+            if self._state == _PENDING:
+                self._state = _CANCELLED
+                self._cond.notify_all()
+        self._run_callbacks()
+        return True
+
+    def cancelled(self):
+        return self._state == _CANCELLED
+
+    def running(self):
+        return self._state == _RUNNING
+
+    def done(self):
+        return self._state in (_CANCELLED, _FINISHED)
+
+    def _wait(self, timeout):
+        with self._cond:
+            if not self.done():
+                self._cond.wait(timeout)
+            if not self.done():
+                raise TimeoutError
+            if self._state == _CANCELLED:
+                raise CancelledError
+
+    def result(self, timeout = None):
+        '''等待并返回调用结果. 调用出错时，抛出原来的异常
+        '''
+        self._wait(timeout)
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout = None):
+        '''等待并返回调用抛出的异常，没有出错返回None
+        '''
+        self._wait(timeout)
+        return self._exc_info[1] if self._exc_info else None
+
+    def add_done_callback(self, fn):
+        '''任务完成(或取消)时调用fn(future). 如果任务已经完成，立即调用
+        '''
+        with self._cond:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_running(self):
+        '''标记任务开始执行. 已经取消的任务返回False
+        '''
+        with self._cond:
+            if self._state == _CANCELLED:
+                return False
+            self._state = _RUNNING
+            return True
+
+    def set_result(self, result):
+        with self._cond:
+            self._result = result
+            self._state = _FINISHED
+            self._cond.notify_all()
+        self._run_callbacks()
+
+    def set_exc_info(self, exc_info):
+        with self._cond:
+            self._exc_info = exc_info
+            self._state = _FINISHED
+            self._cond.notify_all()
+        self._run_callbacks()
+
+    def _run_callbacks(self):
+        with self._cond:
+            callbacks, self._callbacks = self._callbacks, [ ]
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                pass
+
+
+class Executor(object):
+    def __init__(self, max_workers = 16, max_per_key = None):
+        '''
+
+        @param max_workers: 最多工作线程数
+        @param max_per_key: 同一个key最多同时执行的任务数. None表示不限制
+        '''
+        self.max_workers = max_workers
+        self.max_per_key = max_per_key
+        self._cond = threading.Condition()
+        self._ready = deque()   # 可以立即执行的任务
+        self._waiting = { } # key: 任务key, value: 因并发限制而排队的任务
+        self._active = { }  # key: 任务key, value: 已经进入_ready或正在执行的任务数
+        self._workers = [ ]
+        self._idle = 0
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        '''提交任务，返回Future
+        '''
+        return self.submit_keyed(None, fn, *args, **kwargs)
+
+    def submit_keyed(self, key, fn, *args, **kwargs):
+        '''提交任务，同一个key的任务最多同时执行max_per_key个
+
+        @param key: 任务key, 如：api的host. None表示不限制
+        '''
+        future = Future()
+        task = (key, future, fn, args, kwargs)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError('cannot submit after shutdown')
+            limit = self.max_per_key
+            if key is not None and limit and self._active.get(key, 0) >= limit:
+                self._waiting.setdefault(key, deque()).append(task)
+                return future
+            self._schedule(task)
+        return future
+
+    def _schedule(self, task):
+        # 调用时必须持有self._cond
+        key = task[0]
+        if key is not None:
+            self._active[key] = self._active.get(key, 0) + 1
+        self._ready.append(task)
+        if self._idle:
+            self._cond.notify()
+        if len(self._ready) > self._idle and len(self._workers) < self.max_workers:
+            t = threading.Thread(target = self._work)
+            t.daemon = True
+            self._workers.append(t)
+            t.start()
+
+    def _release(self, key):
+        with self._cond:
+            self._active[key] -= 1
+            if not self._active[key]:
+                del self._active[key]
+            waiting = self._waiting.get(key)
+            if waiting:
+                self._schedule(waiting.popleft())
+                if not waiting:
+                    del self._waiting[key]
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._shutdown:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                if not self._ready:
+                    return
+                key, future, fn, args, kwargs = self._ready.popleft()
+            try:
+                if future.set_running():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException:
+                        future.set_exc_info(sys.exc_info())
+                    else:
+                        future.set_result(result)
+            finally:
+                if key is not None:
+                    self._release(key)
+
+    def shutdown(self, wait = True):
+        '''不再接受新任务. 已经提交的任务会继续执行完
+
+        @param wait: 是否等待所有工作线程退出
+        '''
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+            workers = list(self._workers)
+        if wait:
+            for t in workers:
+                t.join()
+
+
+def as_completed(futures, timeout = None):
+    '''按完成的先后顺序返回futures
+
+    @param timeout: 等待下一个完成的future的超时时间(秒)
+    '''
+    done = Queue.Queue()
+    futures = list(futures)
+    for f in futures:
+        f.add_done_callback(done.put)
+    for _ in futures:
+        try:
+            yield done.get(timeout = timeout) if timeout is not None else done.get()
+        except Queue.Empty:
+            raise TimeoutError
+
+
+class Batch(object):
+    '''批量调用. 通过with api.batch() as b使用，b的调用方式与api相同，每次调用返回一个Future(slot)
+    '''
+    def __init__(self, invoke, max_workers = 8):
+        '''
+
+        @param invoke: 同步执行一次api调用的函数: invoke(attrs, token, kwargs)
+        @param max_workers: 最多同时执行的请求数. 超过httpool连接池的maxsize时，多出的连接用完即关闭
+        '''
+        self._call = invoke
+        self._workers = Executor(max_workers)
+        self.slots = [ ]
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError, attr
+        return apipath.ApiPath(self, (attr, ))
+
+    def _invoke(self, attrs, token, kwargs):
+        slot = self._workers.submit(self._call, attrs, token, kwargs)
+        self.slots.append(slot)
+        return slot
+
+    def as_completed(self, timeout = None):
+        '''按完成的先后顺序返回已提交的slot. slot.result()返回结果或抛出调用时的异常
+        '''
+        return as_completed(list(self.slots), timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:    # with块内出错，还没开始的调用不再执行
+            for slot in self.slots:
+                slot.cancel()
+        self._workers.shutdown(wait = True)
+        return False
+
+
+if __name__ == '__main__':
+    pass
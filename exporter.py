@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: exporter.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        timeline、好友列表等分页接口的流式导出：边翻页边写文件，内存占用只和一页的大小有关，与导出的总条数无关.
+        原先导出时循环调用api.statuses.user_timeline.get，所有DictObject保存在内存中，最后才一次写出。
+        说明：
+            . 翻页由pager.pages完成(与OAuth2Api.iter相同，Platform.cursor)，后台线程预取下一页
+            . NdjsonWriter: 每条记录一行json
+            . ColumnarWriter: 一个目录下的五个文件，定长的列可以直接按下标读取：
+                ids: 记录的id(int64, 小端). 不是数字的id(如：腾讯的用户)为0
+                times: 创建时间的unix时间戳(int64, 小端). 没有时间的记录为0
+                ends: 每条记录在heap中的结束位置(int64, 小端)
+                flags: 每条记录从heap中去掉的字段(uint8)
+                heap: 所有记录的json依次拼接(utf-8). 可以由ids, times还原的字段(id, idstr, mid, created_at, timestamp)
+                      不再保存；ids接口的条目只保存在ids中
+              read_columnar逐条读回(还原去掉的字段)
+            . 每写完一页保存一次检查点(下一页的请求参数、翻页状态、已写入的条数和文件大小). 中断后用同样的参数
+              重新调用export会从检查点继续：输出文件截断到检查点的位置(去掉写了一半的页)，从下一页开始请求
+            . 检查点文件先写临时文件再改名，不会出现写了一半的检查点
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        api = weibo2.OAuth2Api(appkey, appsecret, callback)
+        count = export(api, token, 'statuses/user_timeline', NdjsonWriter('/tmp/timeline.ndjson'),
+                       checkpoint = '/tmp/timeline.ckpt', uid = 2617375872, count = 100)
+
+        export(api, token, 'friendships/friends', ColumnarWriter('/tmp/friends'), checkpoint = '/tmp/friends.ckpt', uid = 2617375872)
+        for id, timestamp, user in read_columnar('/tmp/friends'):
+            print id, user['screen_name']
+
+        python exporter.py  # 导出的速度、文件大小
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import os
+import time
+import json
+import struct
+import calendar
+from os.path import exists, join
+
+import pager
+import jsonobj
+
+
+def _default(obj):
+    if isinstance(obj, jsonobj.Record):   # typed模式
+        return obj.as_dict()
+    raise TypeError(repr(obj))
+
+
+def _dumps(item):
+    return json.dumps(item, separators = (',', ':'), default = _default)
+
+
+def _get(item, name):
+    if isinstance(item, (dict, jsonobj.Record)):
+        return item.get(name)
+    return item if name == 'id' else None   # ids接口的条目就是id本身
+
+
+def record_id(item):
+    '''记录的id. 不是数字时返回0
+    '''
+    val = _get(item, 'id')
+    if isinstance(val, (int, long)):
+        return val
+    if isinstance(val, basestring) and val.isdigit():
+        return int(val)
+    return 0
+
+
+_MONTHS = dict((name, i + 1) for i, name in enumerate('Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec'.split()))
+
+
+def record_time(item):
+    '''记录创建时间的unix时间戳. 没有或者无法解析时返回0
+    '''
+    val = _get(item, 'timestamp') or _get(item, 'created_at')  # 腾讯: timestamp; 新浪、网易: created_at
+    if isinstance(val, (int, long)):
+        return val
+    if not val:
+        return 0
+    if val.isdigit():
+        return int(val)
+    try:    # 如：Tue May 31 17:46:55 +0800 2011
+        parts = val.split()
+        hour, minute, second = parts[3].split(':')
+        ret = calendar.timegm((int(parts[5]), _MONTHS[parts[1]], int(parts[2]), int(hour), int(minute), int(second)))
+        tz = parts[4]
+        offset = (int(tz[1:3]) * 60 + int(tz[3:5])) * 60
+        return ret - offset if tz[0] == '+' else ret + offset
+    except (ValueError, IndexError, KeyError):
+        return 0
+
+
+class NdjsonWriter(object):
+    '''每条记录一行json
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._file = None
+
+    def open(self, state = None):
+        '''打开输出文件
+
+        @param state: 检查点中保存的状态(flush的返回值). None表示重新开始
+        '''
+        if state is None:
+            self._file = open(self.path, 'wb')
+            self.records = 0
+        else:
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(state['size'])
+            self._file.seek(0, os.SEEK_END)
+            self.records = state['records']
+
+    def write(self, item):
+        self._file.write(_dumps(item))
+        self._file.write('\n')
+        self.records += 1
+
+    def flush(self):
+        '''写到磁盘，返回保存到检查点的状态
+        '''
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'records': self.records, 'size': self._file.tell()}
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_COLUMNS = ('ids', 'times', 'ends', 'flags')
+_FORMATS = ('q', 'q', 'q', 'B')   # 各列的struct格式
+_SIZES = tuple(struct.calcsize(fmt) for fmt in _FORMATS)
+
+# flags: 从heap中去掉的字段
+_ID, _IDSTR, _MID, _CREATED_AT, _TIMESTAMP, _BARE = 1, 2, 4, 8, 16, 32  # _BARE: 条目本身就是id(ids接口)
+_DAYS = 'Mon Tue Wed Thu Fri Sat Sun'.split()
+_MONTH_NAMES = 'Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec'.split()
+
+
+def _format_time(timestamp):
+    # 新浪、网易的created_at格式(东八区)，如：Tue May 31 17:46:55 +0800 2011
+    t = time.gmtime(timestamp + 8 * 3600)
+    return '%s %s %02d %02d:%02d:%02d +0800 %d' % (_DAYS[t.tm_wday], _MONTH_NAMES[t.tm_mon - 1], t.tm_mday,
+                                                  t.tm_hour, t.tm_min, t.tm_sec, t.tm_year)
+
+
+def _pack(item):
+    # 返回(id, 时间戳, flags, 写到heap的内容)
+    id, timestamp = record_id(item), record_time(item)
+    if isinstance(item, (int, long)):
+        return id, 0, _BARE, ''
+    if not isinstance(item, (dict, jsonobj.Record)):
+        return id, timestamp, 0, _dumps(item)
+    record = item.as_dict() if isinstance(item, jsonobj.Record) else dict(item)
+    flags = 0
+    if isinstance(record.get('id'), (int, long)):
+        del record['id']
+        flags |= _ID
+        for name, flag in (('idstr', _IDSTR), ('mid', _MID)):
+            if record.get(name) == str(id):
+                del record[name]
+                flags |= flag
+    if isinstance(record.get('timestamp'), (int, long)) and record['timestamp'] == timestamp:
+        del record['timestamp']
+        flags |= _TIMESTAMP
+    elif record.get('created_at') and timestamp and record['created_at'] == _format_time(timestamp):
+        del record['created_at']
+        flags |= _CREATED_AT
+    return id, timestamp, flags, _dumps(record)
+
+
+def _unpack(id, timestamp, flags, data):
+    # _pack的逆过程
+    if flags & _BARE:
+        return id
+    record = json.loads(data)
+    if flags & _ID:
+        record[u'id'] = id
+    if flags & _IDSTR:
+        record[u'idstr'] = unicode(id)
+    if flags & _MID:
+        record[u'mid'] = unicode(id)
+    if flags & _TIMESTAMP:
+        record[u'timestamp'] = timestamp
+    if flags & _CREATED_AT:
+        record[u'created_at'] = unicode(_format_time(timestamp))
+    return record
+
+
+class ColumnarWriter(object):
+    '''定长的列(ids, times, ends, flags) + 字符串堆(heap)，参考模块说明
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._files = None
+        self._heap = None
+        self._size = 0  # heap的大小
+        self._columns = None    # 当前页还没有写出的列数据
+
+    def open(self, state = None):
+        if not exists(self.path):
+            os.makedirs(self.path)
+        mode = 'wb' if state is None else 'r+b'
+        self._files = [open(join(self.path, name), mode) for name in _COLUMNS]
+        self._heap = open(join(self.path, 'heap'), mode)
+        self.records = self._size = 0
+        if state is not None:
+            self.records, self._size = state['records'], state['size']
+            for f, size in zip(self._files, _SIZES):
+                f.truncate(self.records * size)
+                f.seek(0, os.SEEK_END)
+            self._heap.truncate(self._size)
+            self._heap.seek(0, os.SEEK_END)
+        self._columns = tuple([ ] for _ in _COLUMNS)
+
+    def write(self, item):
+        id, timestamp, flags, data = _pack(item)
+        self._heap.write(data)
+        self._size += len(data)
+        ids, times, ends, flag_column = self._columns
+        ids.append(id)
+        times.append(timestamp)
+        ends.append(self._size)
+        flag_column.append(flags)
+        self.records += 1
+
+    def flush(self):
+        for f, column, fmt in zip(self._files, self._columns, _FORMATS):
+            f.write(struct.pack('<%d%s' % (len(column), fmt), *column))
+            del column[:]
+        for f in self._files + [self._heap]:
+            f.flush()
+            os.fsync(f.fileno())
+        return {'records': self.records, 'size': self._size}
+
+    def close(self):
+        if self._files is not None:
+            for f in self._files + [self._heap]:
+                f.close()
+            self._files = self._heap = None
+
+
+def read_columnar(path, chunk = 1024):
+    '''逐条读取ColumnarWriter写出的文件，返回(id, 时间戳, 记录). 记录与写入时的内容相同
+
+    @param chunk: 每次从列文件读取的条数
+    '''
+    files = [open(join(path, name), 'rb') for name in _COLUMNS]
+    heap = open(join(path, 'heap'), 'rb')
+    try:
+        start = 0
+        while True:
+            data = [f.read(chunk * size) for f, size in zip(files, _SIZES)]
+            count = min(len(d) // size for d, size in zip(data, _SIZES))
+            if not count:
+                return
+            ids, times, ends, flags = [struct.unpack('<%d%s' % (count, fmt), d[:count * size]) for d, fmt, size in zip(data, _FORMATS, _SIZES)]
+            for i in xrange(count):
+                yield ids[i], times[i], _unpack(ids[i], times[i], flags[i], heap.read(ends[i] - start))
+                start = ends[i]
+    finally:
+        for f in files + [heap]:
+            f.close()
+
+
+def _load_checkpoint(path):
+    if not path or not exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp, path)
+
+
+def export(api, token, api_uri, writer, checkpoint = None, prefetch = True, **kwargs):
+    '''翻页读取api_uri的所有结果，逐条写到writer. 返回写入的总条数
+
+    @param api: OAuth2Api(weibo2, qweibo2, tweibo2)
+    @param api_uri: 分页接口，如：statuses/user_timeline, friendships/friends
+    @param writer: NdjsonWriter或者ColumnarWriter
+    @param checkpoint: 检查点文件路径. 文件存在时从检查点继续. None表示不保存检查点
+    @param prefetch: 是否在后台预取下一页
+    @param kwargs: 第一页的请求参数
+    '''
+    platform = api.platform
+    cursor = platform.cursor(api_uri)
+    params = kwargs
+    state = _load_checkpoint(checkpoint)
+    if state is not None:
+        if state['api'] != api_uri:
+            raise ValueError('checkpoint "%s" is for "%s", not "%s"' % (checkpoint, state['api'], api_uri))
+        cursor.__dict__.update((str(key), val) for key, val in state['cursor'].items())  # json读回的key是unicode
+        params = state['params'] and dict((str(key), val) for key, val in state['params'].items())
+    writer.open(state and state['writer'])
+    if params is None:  # 上次已经导出完成
+        writer.close()
+        return writer.records
+
+    fetch = lambda params: platform.call('GET', api_uri, token, **params)
+    iterator = pager.pages(fetch, params, cursor, prefetch)
+    try:
+        for items, next_params in iterator:
+            for item in items:
+                writer.write(item)
+            writer_state = writer.flush()
+            if checkpoint:
+                _save_checkpoint(checkpoint, {'api': api_uri, 'params': next_params, 'cursor': cursor.__dict__,
+                                              'writer': writer_state})
+        return writer.records
+    finally:
+        iterator.close()    # 出错时取消预取
+        writer.close()
+
+
+def _benchmark(statuses = 20000, count = 100):
+    '''导出statuses条微博，比较两种格式的速度和文件大小. 通过transport.Player回放(不联网)
+    '''
+    import shutil
+    import urlparse
+    import tempfile
+    import transport
+    import weibo2
+
+    def user_timeline(http_method, scheme, netloc, path, body = None):
+        # 按max_id翻页的statuses/user_timeline, 共statuses条
+        query = dict(urlparse.parse_qsl(path.partition('?')[2]))
+        max_id = int(query.get('max_id', statuses))
+        page = [{'id': id, 'created_at': _format_time(1300000000), 'text': u'第%d条微博' % id, 'user': {'id': 1, 'screen_name': 'user'}}
+                for id in xrange(max_id, max(max_id - int(query.get('count', 20)), 0), -1)]
+        return 200, 'OK', json.dumps({'statuses': page})
+
+    tmp = tempfile.mkdtemp()
+    try:
+        with transport.use(transport.Player(transport.Cassette(), user_timeline)) as player:
+            api = weibo2.OAuth2Api('', '', '')
+            token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+            for name, writer, size in (('ndjson', NdjsonWriter(join(tmp, 'timeline.ndjson')), lambda: os.path.getsize(join(tmp, 'timeline.ndjson'))),
+                                       ('columnar', ColumnarWriter(join(tmp, 'columnar')), lambda: sum(os.path.getsize(join(tmp, 'columnar', f)) for f in _COLUMNS + ('heap', )))):
+                player.requests = 0
+                start = time.time()
+                records = export(api, token, 'statuses/user_timeline', writer, join(tmp, name + '.ckpt'), count = count)
+                print '%s: %d records, %d requests, %d bytes, %.3fs' % (name, records, player.requests, size(), time.time() - start)
+        assert sum(1 for _ in read_columnar(join(tmp, 'columnar'))) == statuses
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: httpool.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        各微博模块共用的http keep-alive连接池.
+        每次api调用都新建HTTPConnection/HTTPSConnection，tcp(以及ssl)握手的开销往往比api本身的响应时间还长，
+        连接池按(scheme, host)缓存空闲连接，供各模块的_request复用。
+        说明：
+            . 每个host最多保留maxsize个空闲连接，多余的连接直接关闭
+            . 空闲超过idle_timeout秒的连接不再使用(服务器端一般早已关闭)
+            . 复用的连接如果已被服务器关闭，自动重建连接并重发一次请求
+            . 线程安全，同一个连接同一时刻只会被一个线程使用
+            . 打开metrics统计时，分别记录tcp连接、ssl握手、发送请求、等待响应头和读取响应体的耗时
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        import httpool
+        status, reason, html = httpool.default_pool.request('GET', 'https', 'api.weibo.com', '/2/statuses/public_timeline.json?access_token=xxx')
+        print httpool.default_pool.stats()
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import httplib
+import socket
+import threading
+import time
+
+import metrics
+
+
+class ConnectionPool(object):
+    def __init__(self, maxsize = 64, idle_timeout = 30):
+        '''
+
+        @param maxsize: 每个host最多保留的空闲连接数
+        @param idle_timeout: 连接空闲超过该时间(秒)后不再复用
+        '''
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = { }    # key: (scheme, netloc), value: [(conn, 最后使用时间), ...]
+        self._lock = threading.Lock()
+        self.hits = 0   # 复用空闲连接的次数
+        self.misses = 0 # 新建连接的次数
+        self.evictions = 0  # 因过期、超出maxsize而关闭的连接数
+        self.reconnects = 0 # 复用的连接已失效，重建连接的次数
+
+    def _new_conn(self, scheme, netloc, timeout):
+        if scheme == 'http':
+            return httplib.HTTPConnection(netloc, timeout = timeout)
+        return httplib.HTTPSConnection(netloc, timeout = timeout)
+
+    def _get(self, scheme, netloc, timeout):
+        '''取一个连接, 返回元组(conn, 是否为复用的连接)
+        '''
+        now = time.time()
+        stale = [ ]
+        conn = None
+        with self._lock:
+            conns = self._idle.get((scheme, netloc))
+            while conns:
+                item, last_used = conns.pop()   # 后进先出: 最近用过的连接最可能仍然有效
+                if item.sock is not None and now - last_used < self.idle_timeout:
+                    conn = item
+                    self.hits += 1
+                    break
+                stale.append(item)
+                self.evictions += 1
+            if conn is None:
+                self.misses += 1
+        for item in stale:
+            item.close()
+        if conn is None:
+            return self._new_conn(scheme, netloc, timeout), False
+        conn.timeout = timeout
+        conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _put(self, scheme, netloc, conn):
+        if conn.sock is None:   # 服务器返回了Connection: close, 连接已经关闭
+            return
+        with self._lock:
+            conns = self._idle.setdefault((scheme, netloc), [ ])
+            if len(conns) < self.maxsize:
+                conns.append((conn, time.time()))
+                return
+            self.evictions += 1
+        conn.close()
+
+    def _connect(self, conn, span):
+        # 建立连接，分别记录tcp连接和ssl握手的耗时(与HTTPSConnection.connect相同). 不采样时由httplib在发送请求时连接
+        start = metrics.timer()
+        httplib.HTTPConnection.connect(conn)
+        start = span.lap('connect', start)
+        if isinstance(conn, httplib.HTTPSConnection):
+            if hasattr(conn, '_context'):   # python2.7.9+
+                conn.sock = conn._context.wrap_socket(conn.sock, server_hostname = conn.host)
+            else:
+                import ssl
+                conn.sock = ssl.wrap_socket(conn.sock, conn.key_file, conn.cert_file)
+            span.lap('tls', start)
+
+    def _traced_send(self, conn, span, http_method, path, body, headers):
+        if conn.sock is None:
+            self._connect(conn, span)
+        start = metrics.timer()
+        conn.request(http_method, path, body = body, headers = headers)
+        start = span.lap('send', start)
+        resp = conn.getresponse()
+        span.lap('first_byte', start)
+        return resp
+
+    def request(self, http_method, scheme, netloc, path, body = None, headers = None, timeout = 10):
+        '''通过连接池发送一个http request
+
+        @param http_method: 请求方法
+        @param scheme: http或https
+        @param netloc: 服务器地址, 如：api.weibo.com
+        @param path: 请求路径(包括query string)
+        @param body: 请求的内容
+        @param headers: http头
+        @return: 元组(response status, reason, response html)
+        '''
+        span = metrics.current() if metrics.tracer is not None else None
+        headers = headers or { }
+        conn, reused = self._get(scheme, netloc, timeout)
+        try:
+            try:
+                if span is None:
+                    conn.request(http_method, path, body = body, headers = headers)
+                    resp = conn.getresponse()
+                else:
+                    span.reused = reused
+                    resp = self._traced_send(conn, span, http_method, path, body, headers)
+            except (httplib.BadStatusLine, socket.error) as ex:
+                # 空闲连接可能已被服务器关闭，新建连接重发一次. 超时不重发，请求可能已经被服务器处理
+                if not reused or isinstance(ex, socket.timeout):
+                    raise
+                conn.close()
+                with self._lock:
+                    self.reconnects += 1
+                if hasattr(body, 'seek'):   # 流式的body(如multipart.MultipartBody)需要从头发送
+                    body.seek(0)
+                conn = self._new_conn(scheme, netloc, timeout)
+                if span is None:
+                    conn.request(http_method, path, body = body, headers = headers)
+                    resp = conn.getresponse()
+                else:
+                    span.reused = False
+                    resp = self._traced_send(conn, span, http_method, path, body, headers)
+            if span is None:
+                result = (resp.status, resp.reason, resp.read())
+            else:
+                start = metrics.timer()
+                result = (resp.status, resp.reason, resp.read())
+                span.lap('read', start)
+        except:
+            conn.close()
+            raise
+        if headers.get('Connection', '').lower() == 'close':
+            conn.close()
+        else:
+            self._put(scheme, netloc, conn)
+        return result
+
+    def clear(self):
+        '''关闭所有空闲连接
+        '''
+        with self._lock:
+            idle, self._idle = self._idle, { }
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+    def stats(self):
+        '''连接池的统计信息
+        '''
+        with self._lock:
+            idle = sum(len(conns) for conns in self._idle.values())
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'reconnects': self.reconnects,
+                'idle': idle,
+            }
+
+
+# 各微博模块默认共用的连接池
+default_pool = ConnectionPool()
+
+
+if __name__ == '__main__':
+    pass
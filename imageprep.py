@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: imageprep.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        上传图片的预处理：发送请求之前按平台的限制(新浪5M, 腾讯4M, 网易1K-2M)检查图片大小，超出时压缩.
+        原先图片大小在_request里才检查，任务已经进入队列(如：syndicate同时发到多个平台)之后才报错。
+        说明：
+            . 不超出限制的图片原样上传，不做任何处理. 传入文件路径时只检查文件大小，不读取文件，
+              返回原来的路径(上传时流式读取，参考multipart)
+            . 标准库可以处理的格式(无损)：
+                jpeg: 去掉EXIF(保留方向)、XMP、Photoshop、注释等元数据段
+                png: 去掉文本、时间等辅助块，图像数据用最高压缩级别重新压缩
+            . 仍然超出限制或者其他格式(gif等)时调用codec(media, max_size)，返回缩小后的multipart.Media，
+              或者None表示无法处理. 默认没有codec(不依赖第三方库)，无法处理时抛出WeiBoError
+            . 处理结果按(图片内容的sha1, 大小限制)缓存，同一张图片发到多个平台或者多次发表只处理一次
+            . fit_all: 超出限制的平台共用按其中最小的限制处理的结果
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        media = default_preprocessor.fit('/tmp/big.jpg', *limits(weibo))
+        weibo.OAuthApi(appkey, appsecret).statuses.upload.post(token, status = u'测试', pic = media)
+
+        # 使用PIL缩小图片
+        def pil_codec(media, max_size):
+            image = Image.open(StringIO(media.data))
+            quality = 85
+            while quality > 20:
+                out = StringIO()
+                image.save(out, 'JPEG', quality = quality)
+                if out.tell() <= max_size:
+                    return multipart.Media(os.path.splitext(media.file_path)[0] + '.jpg', out.getvalue())
+                quality -= 15
+        imageprep.default_preprocessor.codec = pil_codec
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import zlib
+import struct
+import hashlib
+import threading
+from os.path import isfile, getsize
+
+import multipart
+import respcache
+from errors import WeiBoError
+
+
+_JPEG_KEEP = frozenset([0xe0, 0xe2, 0xee])  # APP0(JFIF), APP2(ICC颜色配置), APP14(Adobe颜色变换). 其他APPn和注释去掉
+_EXIF = 'Exif\x00\x00'
+_ORIENTATION = 0x0112
+
+
+def _exif_orientation(payload):
+    # APP1段中EXIF的方向(1 ~ 8)，没有时返回None
+    if not payload.startswith(_EXIF):
+        return None
+    tiff = payload[len(_EXIF):]
+    endian = {'II': '<', 'MM': '>'}.get(tiff[:2])
+    if endian is None:
+        return None
+    try:
+        offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+        count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+        for i in xrange(count):
+            entry = tiff[offset + 2 + i * 12:offset + 14 + i * 12]
+            if struct.unpack(endian + 'H', entry[:2])[0] == _ORIENTATION:
+                return struct.unpack(endian + 'H', entry[8:10])[0]
+    except struct.error:
+        pass
+    return None
+
+
+def _orientation_segment(orientation):
+    # 只包含方向的APP1段
+    tiff = 'MM\x00\x2a' + struct.pack('>IHHHIHHI', 8, 1, _ORIENTATION, 3, 1, orientation, 0, 0)
+    return '\xff\xe1' + struct.pack('>H', len(_EXIF) + len(tiff) + 2) + _EXIF + tiff
+
+
+def strip_jpeg(data):
+    '''去掉jpeg的元数据段，图像数据不变. 不是jpeg或者格式错误时返回None
+    '''
+    if not data.startswith('\xff\xd8'):
+        return None
+    out = ['\xff\xd8']
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != '\xff':
+            return None
+        marker = ord(data[pos + 1])
+        if marker == 0xff:  # 填充字节
+            pos += 1
+            continue
+        if marker == 0xda:  # SOS: 之后是图像数据
+            out.append(data[pos:])
+            return ''.join(out)
+        if 0xd0 <= marker <= 0xd7 or marker == 0x01:    # 没有长度的标记
+            out.append(data[pos:pos + 2])
+            pos += 2
+            continue
+        end = pos + 2 + struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker == 0xe1:
+            orientation = _exif_orientation(data[pos + 4:end])
+            if orientation and orientation != 1:    # 去掉方向之后图片会显示成旋转的
+                out.append(_orientation_segment(orientation))
+        elif marker < 0xe0 or marker in _JPEG_KEEP or 0xf0 <= marker <= 0xfd:   # 去掉其他APPn和COM(注释)
+            out.append(data[pos:end])
+        pos = end
+    return None
+
+
+_PNG_SIGNATURE = '\x89PNG\r\n\x1a\n'
+# 保留的块. 其他辅助块(tEXt, zTXt, iTXt, tIME, pHYs等)不影响显示，去掉
+_PNG_KEEP = frozenset(['IHDR', 'PLTE', 'tRNS', 'gAMA', 'cHRM', 'sRGB', 'iCCP', 'sBIT', 'IDAT', 'IEND'])
+
+
+def _png_chunk(tp, data):
+    return struct.pack('>I', len(data)) + tp + data + struct.pack('>I', zlib.crc32(tp + data) & 0xffffffff)
+
+
+def strip_png(data, level = 9):
+    '''去掉png的辅助块，并用最高压缩级别重新压缩图像数据(无损). 不是png、格式错误或者是apng时返回None
+    '''
+    if not data.startswith(_PNG_SIGNATURE):
+        return None
+    chunks = [ ]    # [(类型, 数据), ...], 连续的IDAT合并成一个
+    decompressor = zlib.decompressobj()
+    compressor = zlib.compressobj(level)
+    idat = [ ]
+    pos = len(_PNG_SIGNATURE)
+    try:
+        while pos + 8 <= len(data):
+            length, tp = struct.unpack('>I4s', data[pos:pos + 8])
+            chunk = data[pos + 8:pos + 8 + length]
+            pos += 12 + length
+            if tp == 'acTL':    # apng, 动画的帧不在IDAT里
+                return None
+            if tp == 'IDAT':
+                if not idat:
+                    chunks.append(('IDAT', idat))
+                idat.append(compressor.compress(decompressor.decompress(chunk)))
+            elif tp in _PNG_KEEP:
+                chunks.append((tp, chunk))
+            if tp == 'IEND':
+                break
+        else:
+            return None
+        idat.append(compressor.compress(decompressor.flush()))
+        idat.append(compressor.flush())
+    except zlib.error:
+        return None
+    return _PNG_SIGNATURE + ''.join(_png_chunk(tp, ''.join(chunk) if tp == 'IDAT' else chunk) for tp, chunk in chunks)
+
+
+# key: mimetype, value: 标准库的无损处理函数
+STRIPPERS = {'image/jpeg': strip_jpeg, 'image/png': strip_png}
+
+
+def limits(target):
+    '''平台的图片大小限制(min_size, max_size)
+
+    @param target: oauth2.Platform, OAuth2Api(weibo2, qweibo2, tweibo2)或者OAuth1.0的模块(weibo, qweibo, tweibo)
+    '''
+    platform = getattr(target, 'platform', target)
+    if hasattr(platform, 'pic_max_size'):
+        return platform.pic_min_size, platform.pic_max_size
+    return target.PIC_MIN_SIZE, target.PIC_MAX_SIZE
+
+
+def _size_error(media, min_size, max_size):
+    if min_size:
+        return WeiBoError('Size of file "%s" must be between %dK and %dM.' % (media.file_path, min_size // 1024, max_size // (1024 * 1024)))
+    return WeiBoError('Size of file "%s" must be less than %dM.' % (media.file_path, max_size // (1024 * 1024)))
+
+
+class Preprocessor(object):
+    def __init__(self, codec = None, max_bytes = 64 * 1024 * 1024, ttl = 3600):
+        '''
+
+        @param codec: 标准库无法处理时的压缩函数: codec(media, max_size), 返回multipart.Media或者None
+        @param max_bytes: 缓存的处理结果的最大字节数
+        @param ttl: 处理结果缓存的有效期(秒)
+        '''
+        self.codec = codec
+        self.ttl = ttl
+        self.cache = respcache.MemoryBackend(max_entries = 256, max_bytes = max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def load(self, pic):
+        '''图片文件路径 => multipart.Media
+        '''
+        if isinstance(pic, multipart.Media):
+            return pic
+        if not isfile(pic):
+            raise WeiBoError(u'File "%s" not exist' % pic)
+        return multipart.Media(pic)
+
+    def shrink(self, media, max_size):
+        '''压缩到max_size以内，返回multipart.Media. 无法处理时返回None
+        '''
+        strip = STRIPPERS.get(media.mimetype)
+        if strip is not None:
+            data = strip(media.data)
+            if data is not None and len(data) < len(media):
+                media = multipart.Media(media.file_path, data)
+        if len(media) <= max_size:
+            return media
+        if self.codec is not None:
+            return self.codec(media, max_size)
+        return None
+
+    def fit(self, pic, min_size = 0, max_size = 1024 * 1024 * 5):
+        '''返回符合大小限制的图片: 不超出限制的文件路径原样返回，其他情况返回multipart.Media. 无法处理时抛出WeiBoError
+
+        @param pic: 图片文件路径或者multipart.Media
+        '''
+        if not isinstance(pic, multipart.Media) and isfile(pic) and min_size <= getsize(pic) <= max_size:
+            return pic
+        media = self.load(pic)
+        if len(media) < min_size:   # 太小的图片无法处理
+            raise _size_error(media, min_size, max_size)
+        if len(media) <= max_size:
+            return media
+        key = '%s:%d' % (hashlib.sha1(media.data).hexdigest(), max_size)
+        ret = self.cache.get(key)
+        with self._lock:
+            if ret is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if ret is None:
+            ret = self.shrink(media, max_size)
+            if ret is None or len(ret) > max_size:
+                raise _size_error(media, min_size, max_size)
+            self.cache.set(key, ret, self.ttl)
+        if len(ret) < min_size:
+            raise _size_error(media, min_size, max_size)
+        return ret
+
+    def fit_all(self, pic, targets):
+        '''按各平台的限制处理同一张图片，返回与targets顺序相同的multipart.Media列表.
+        有任何一个平台无法处理时抛出WeiBoError(此时还没有发送任何请求)
+
+        @param targets: 平台列表，参考limits
+        '''
+        media = self.load(pic)
+        sizes = [limits(target) for target in targets]
+        over = [max_size for _, max_size in sizes if len(media) > max_size]
+        smallest = min(over) if over else None
+        ret = [ ]
+        for min_size, max_size in sizes:
+            if len(media) > max_size > smallest:
+                try:
+                    ret.append(self.fit(media, min_size, smallest))
+                    continue
+                except WeiBoError:  # 压缩不到最小的限制，按该平台自己的限制处理
+                    pass
+            ret.append(self.fit(media, min_size, max_size))
+        return ret
+
+    def stats(self):
+        ret = self.cache.stats()
+        ret.update(hits = self.hits, misses = self.misses)
+        return ret
+
+
+# post_status, post_all, syndicate.Syndicator默认使用的预处理
+default_preprocessor = Preprocessor()
+
+
+if __name__ == '__main__':
+    pass
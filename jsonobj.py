@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: jsonobj.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        api返回结果的包装：通过属性访问json对象，如：ret.statuses[0].user.name
+        原先的DictObject每次访问嵌套的dict都新建一个DictObject，访问list时每次都把所有元素重新检查、包装一遍。
+        现在嵌套的节点在第一次访问时包装一次，并写回原来的位置，以后的访问直接返回。
+        说明：
+            . DictObject仍然是dict的子类，可以当作普通dict使用(json.dumps, items()等)
+            . 嵌套的list包装后是DictList(list的子类)，用于标记已经包装过
+            . 只在访问时才包装，没有访问的节点保持原样
+            . 各模块的_call通过default_decoder解析api的返回结果. 可以替换成更快的json解析函数，
+              或者打开typed模式：statuses, users, comments数组转换成Status, User, Comment(使用__slots__的记录类型)
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        ret = DictObject('{"statuses": [{"user": {"name": "darkbull"}}]}')
+        for s in ret.statuses:
+            print s.user.name
+
+        # 使用第三方的json库解析，并打开typed模式
+        import ujson
+        jsonobj.default_decoder = jsonobj.Decoder(ujson.loads, typed = True)
+
+        python jsonobj.py   # 运行属性访问的性能测试
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import json
+
+
+class DictList(list):
+    '''元素已经包装过的list
+    '''
+    __slots__ = ()
+
+
+def _wrap(val):
+    # 包装一个节点. 不经过DictObject.__init__，省掉字符串的判断
+    tp = type(val)
+    if tp is dict:
+        obj = _new_dict_object(DictObject)
+        _dict_update(obj, val)
+        return obj
+    if tp is list:
+        return DictList([_wrap(item) for item in val])
+    return val
+
+
+class DictObject(dict):
+    __slots__ = ()
+
+    def __init__(self, d):
+        if isinstance(d, basestring):
+            d = json.loads(d)
+        dict.__init__(self, d)
+
+    def __getattr__(self, attr):
+        try:
+            ret = self[attr]
+        except KeyError:
+            raise AttributeError, attr
+        tp = type(ret)
+        if tp is dict or tp is list:
+            ret = self[attr] = _wrap(ret)
+        return ret
+
+
+_new_dict_object = dict.__new__
+_dict_update = dict.update
+
+
+class Record(object):
+    '''typed模式下的记录类型. 只保留_fields中列出的字段，返回结果中没有的字段为None
+    '''
+    __slots__ = ()
+    _fields = ()
+    _nested = { }   # key: 字段名, value: 该字段的记录类型
+
+    def __init__(self, d):
+        nested = self._nested
+        for name in self._fields:
+            val = d.get(name)
+            tp = type(val)
+            if tp is dict:
+                val = nested[name](val) if name in nested else _wrap(val)
+            elif tp is list:
+                val = _wrap(val)
+            setattr(self, name, val)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def get(self, name, default = None):
+        return getattr(self, name, default)
+
+    def as_dict(self):
+        ret = { }
+        for name in self._fields:
+            val = getattr(self, name)
+            ret[name] = val.as_dict() if isinstance(val, Record) else val
+        return ret
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, getattr(self, 'id', ''))
+
+
+class User(Record):
+    __slots__ = ('id', 'idstr', 'screen_name', 'name', 'province', 'city', 'location', 'description', 'url',
+                 'profile_image_url', 'avatar_large', 'domain', 'gender', 'followers_count', 'friends_count',
+                 'statuses_count', 'favourites_count', 'bi_followers_count', 'created_at', 'verified', 'verified_reason')
+    _fields = __slots__
+
+
+class Status(Record):
+    __slots__ = ('id', 'idstr', 'mid', 'created_at', 'text', 'source', 'favorited', 'truncated',
+                 'in_reply_to_status_id', 'in_reply_to_user_id', 'in_reply_to_screen_name',
+                 'thumbnail_pic', 'bmiddle_pic', 'original_pic', 'pic_urls', 'geo',
+                 'reposts_count', 'comments_count', 'attitudes_count', 'user', 'retweeted_status')
+    _fields = __slots__
+
+
+class Comment(Record):
+    __slots__ = ('id', 'idstr', 'mid', 'created_at', 'text', 'source', 'user', 'status', 'reply_comment')
+    _fields = __slots__
+
+
+def compile_record(cls):
+    '''为记录类型生成专用的__init__(展开字段循环)，构造速度比Record.__init__快一半左右
+    '''
+    src = ['def __init__(self, d):', '    get = d.get']
+    ns = {'_wrap': _wrap, '_containers': (dict, list)}
+    for name in cls._fields:
+        src.append('    v = get(%r)' % name)
+        if name in cls._nested:
+            ns['_record_' + name] = cls._nested[name]
+            src.append('    self.%s = _record_%s(v) if type(v) is dict else v' % (name, name))
+        else:
+            src.append('    self.%s = v if type(v) not in _containers else _wrap(v)' % name)
+    exec '\n'.join(src) in ns
+    cls.__init__ = ns['__init__']
+    return cls
+
+
+User._nested = {'status': Status}
+Status._nested = {'user': User, 'retweeted_status': Status}
+Comment._nested = {'user': User, 'status': Status, 'reply_comment': Comment}
+for _cls in (User, Status, Comment):
+    compile_record(_cls)
+
+
+class Decoder(object):
+    # typed模式下转换成记录类型的数组. key: 字段名, value: 记录类型
+    RECORDS = {'statuses': Status, 'users': User, 'comments': Comment}
+
+    def __init__(self, loads = json.loads, typed = False):
+        '''
+
+        @param loads: json解析函数, 参数是api返回的utf-8编码的字符串
+        @param typed: 是否把statuses, users, comments数组转换成记录类型
+        '''
+        self.loads = loads
+        self.typed = typed
+
+    def wrap(self, obj):
+        '''包装loads的结果: dict => DictObject, list => DictList
+        '''
+        obj = _wrap(obj)
+        if self.typed and type(obj) is DictObject:
+            for key, cls in self.RECORDS.iteritems():
+                items = obj.get(key)
+                if type(items) is list:
+                    obj[key] = DictList([cls(item) if type(item) is dict else item for item in items])
+        return obj
+
+    def decode(self, html):
+        return self.wrap(self.loads(html))
+
+
+# 各模块的_call使用的解析器
+default_decoder = Decoder()
+
+
+def _benchmark(statuses = 200, rounds = 200):
+    '''模拟一次200条微博的timeline，比较属性访问的开销
+    '''
+    import timeit
+
+    class OldDictObject(dict):  # 原来的实现
+        def __init__(self, d):
+            if isinstance(d, basestring):
+                d = json.loads(d)
+            dict.__init__(self, d)
+
+        def __getattr__(self, attr):
+            if attr in self:
+                ret = self[attr]
+                if type(ret) is dict:
+                    return OldDictObject(ret)
+                elif type(ret) is list:
+                    for idx, item in enumerate(ret):
+                        if type(item) is dict:
+                            ret[idx] = OldDictObject(item)
+                return ret
+            else:
+                raise AttributeError, attr
+
+    user = {'id': 2617375872, 'screen_name': u'darkbull', 'name': u'darkbull', 'location': u'福建 厦门',
+            'description': u'python', 'followers_count': 1024, 'friends_count': 256, 'verified': False}
+    status = {'id': 3530307470262386, 'mid': '3530307470262386', 'created_at': 'Mon Jan 07 10:00:00 +0800 2013',
+              'text': u'选择python，选择简洁' * 5, 'source': u'<a href="http://darkbull.net">weibosdk</a>',
+              'reposts_count': 3, 'comments_count': 5, 'user': user,
+              'pic_urls': [{'thumbnail_pic': 'http://ww1.sinaimg.cn/thumbnail/abc.jpg'}],
+              'retweeted_status': {'id': 3530307470262385, 'text': u'转发', 'user': user}}
+    payload = json.dumps({'statuses': [status] * statuses, 'total_number': 10000, 'next_cursor': 0})
+
+    def access(ret):
+        for s in ret.statuses:
+            s.user.name, s.user.id, s.text
+            s.retweeted_status.user.name
+            for pic in s.pic_urls:
+                pic.thumbnail_pic
+
+    print '%d statuses per timeline, us per timeline:' % statuses
+    for name, cls in (('old DictObject', OldDictObject), ('DictObject', DictObject)):
+        rets = [cls(json.loads(payload)) for _ in xrange(rounds)]
+        start = timeit.default_timer()
+        for ret in rets:    # 第一次访问, 包括包装的开销
+            access(ret)
+        first = timeit.default_timer() - start
+        ret = rets[0]
+        start = timeit.default_timer()
+        for _ in xrange(rounds):    # 重复访问同一个结果
+            access(ret)
+        again = timeit.default_timer() - start
+        print '    %-16s first access: %8.1f    repeated access: %8.1f' % (name, first / rounds * 1e6, again / rounds * 1e6)
+
+    html = payload.encode('utf-8')
+    print 'decode + first access, us per timeline:'
+    for name, decoder in (('untyped', Decoder()), ('typed', Decoder(typed = True))):
+        start = timeit.default_timer()
+        for _ in xrange(rounds):
+            access(decoder.decode(html))
+        print '    %-16s %8.1f' % (name, (timeit.default_timer() - start) / rounds * 1e6)
+
+if __name__ == '__main__':
+    _benchmark()
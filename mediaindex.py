@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: mediaindex.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        已上传图片的索引：按图片内容的sha1记录各平台返回的图片引用(url或者pic_id)，同一张图片再次发表时不再上传.
+        原先每次发表带图片的微博(statuses/upload, t/add_pic)都要重新读取、上传整个文件。
+        各平台复用的方式(oauth2.Platform.post_media, post_ref)：
+            . 新浪: statuses/upload返回的original_pic, 通过statuses/upload_url_text(url参数)发表
+            . 网易: statuses/upload返回的upload_image_url, 直接附在微博内容后面发表(不需要上传)
+            . 腾讯: t/add_pic返回imgurl时通过t/add_pic_url发表；没有返回时不复用
+        说明：
+            . 索引文件是只追加的二进制记录：sha1(20字节) + 平台名称 + 引用，加载时后面的记录覆盖前面的
+            . 复用失败(ApiError, 如：图片已被删除)时删除记录，重新上传；
+              平台从来没有复用成功过时(如：没有upload_url_text的权限)，本进程不再尝试复用该平台
+            . 鉴权、网络、限流等错误与图片无关，直接抛出
+            . 设置default_index之后，OAuth2Api.post_status, post_all, syndicate.Syndicator自动复用
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        mediaindex.default_index = mediaindex.MediaIndex('/tmp/weibo-media.idx')
+        api.post_status(token, u'第一次上传', '/tmp/test.jpg')
+        api.post_status(token, u'不再上传', '/tmp/test.jpg')
+        print mediaindex.default_index.stats()
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import os
+import struct
+import hashlib
+import threading
+from os.path import exists
+
+import errors
+
+
+_MAGIC = 'WBMI\x01'
+_HEADER = struct.Struct('>20sBH')   # sha1, 平台名称的长度, 引用的长度(0表示删除)
+
+
+class MediaIndex(object):
+    def __init__(self, path = None):
+        '''
+
+        @param path: 索引文件路径. 文件存在时加载. None表示只保存在内存中
+        '''
+        self.path = path
+        self._refs = { }    # key: (平台名称, sha1), value: 引用
+        self._reused = set()    # 复用成功过的平台
+        self._unsupported = set()   # 不再尝试复用的平台
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0   # 复用失败，重新上传的次数
+        if path and exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._refs)
+
+    def _record(self, platform, digest, ref):
+        return _HEADER.pack(digest, len(platform), len(ref)) + platform + ref
+
+    def _append(self, data):
+        if self.path:
+            with open(self.path, 'ab') as f:
+                if not f.tell():
+                    f.write(_MAGIC)
+                f.write(data)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(_MAGIC):
+            raise ValueError('"%s" is not a media index file' % path)
+        pos = len(_MAGIC)
+        with self._lock:
+            while pos + _HEADER.size <= len(data):
+                digest, name_size, ref_size = _HEADER.unpack_from(data, pos)
+                start = pos + _HEADER.size
+                if start + name_size + ref_size > len(data):
+                    break
+                platform = data[start:start + name_size]
+                ref = data[start + name_size:start + name_size + ref_size]
+                pos = start + name_size + ref_size
+                if ref:
+                    self._refs[(platform, digest)] = ref
+                else:
+                    self._refs.pop((platform, digest), None)
+            if pos < len(data) and path == self.path:   # 写了一半的记录(如：进程在写入时退出)，截掉之后再追加
+                with open(path, 'r+b') as f:
+                    f.truncate(pos)
+
+    def compact(self):
+        '''重写索引文件，去掉被覆盖、删除的记录. 只保存在内存中时不做任何处理
+        '''
+        if not self.path:
+            return
+        with self._lock:
+            data = _MAGIC + ''.join(self._record(platform, digest, ref) for (platform, digest), ref in self._refs.iteritems())
+            tmp = self.path + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.rename(tmp, self.path)
+
+    def get(self, platform, digest):
+        return self._refs.get((platform, digest))
+
+    def put(self, platform, digest, ref):
+        ref = ref.encode('utf-8') if type(ref) is unicode else str(ref)
+        with self._lock:
+            if self._refs.get((platform, digest)) == ref:
+                return
+            self._refs[(platform, digest)] = ref
+            self._append(self._record(platform, digest, ref))
+
+    def forget(self, platform, digest):
+        with self._lock:
+            if self._refs.pop((platform, digest), None) is not None:
+                self._append(self._record(platform, digest, ''))
+
+    def post(self, platform, token, text, media):
+        '''发一条带图片的微博. 图片在该平台上传过时复用，否则上传并记录返回的引用
+
+        @param platform: oauth2.Platform
+        @param media: multipart.Media
+        @return: 统一格式的微博，参考oauth2.Platform.status
+        '''
+        digest = hashlib.sha1(media.data).digest()
+        name = platform.name
+        ref = None if name in self._unsupported else self.get(name, digest)
+        if ref is not None:
+            try:
+                status = platform.post_ref(token, text, ref)
+            except errors.ApiError:
+                with self._lock:
+                    self.failures += 1
+                    if name not in self._reused:
+                        self._unsupported.add(name)
+                self.forget(name, digest)
+            else:
+                with self._lock:
+                    self.hits += 1
+                    self._reused.add(name)
+                return status
+        with self._lock:
+            self.misses += 1
+        status, ref = platform.post_media(token, text, media)
+        if ref and name not in self._unsupported:
+            self.put(name, digest, ref)
+        return status
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._refs), 'hits': self.hits, 'misses': self.misses, 'failures': self.failures,
+                    'unsupported': sorted(self._unsupported)}
+
+
+# OAuth2Api.post_status使用的索引. None表示不复用
+default_index = None
+
+
+if __name__ == '__main__':
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), 'media.idx')
+    digest = hashlib.sha1('test.jpg').digest()
+    index = MediaIndex(path)
+    index.put('weibo', digest, 'http://ww1.sinaimg.cn/large/test.jpg')
+    index.put('tweibo', digest, 'http://img.t.163.com/test.jpg')
+    index.forget('tweibo', digest)
+    with open(path, 'ab') as f:     # 模拟写入时进程退出
+        f.write(_HEADER.pack(digest, 6, 40) + 'qweibo')
+    index = MediaIndex(path)
+    print index.get('weibo', digest), index.get('tweibo', digest), os.path.getsize(path)
+    index.compact()
+    print index.stats(), os.path.getsize(path)
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: metrics.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        api调用的耗时统计：每次_call分成几个阶段计时，按接口记录到HDR风格的直方图，可以导出为json或prometheus文本格式.
+        阶段：
+            . connect: tcp连接(复用连接池中的连接时没有)
+            . tls: ssl握手(https的新连接)
+            . send: 发送请求(包括请求体，如上传的图片)
+            . first_byte: 发送完请求到收到响应头(服务器处理时间)
+            . read: 读取响应体
+            . decode: json解析(jsonobj.default_decoder.loads)
+            . wrap: 包装成DictObject(jsonobj.default_decoder.wrap)
+            . total: 整个_call(包括重试、限流等待和签名)
+        说明：
+            . 默认关闭(tracer为None)，各模块只多一次tracer是否为None的判断，没有其他开销
+            . enable(sample)打开统计，sample为采样比例；没有采样到的调用不计时
+            . 重试时各阶段的耗时累加；失败的调用也记录耗时，并按异常类型计数
+            . 接口路径中的数字id替换成:id，避免接口数量无限增长
+            . tracer.hooks: 每次采样的调用结束后调用hook(span)，可以自行上报(如：慢请求日志)
+            . enable()替换了jsonobj.default_decoder(用于decode, wrap计时)，自定义的decoder请在enable()之前设置
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        import metrics
+        metrics.enable(sample = 0.1)
+        api.statuses.home_timeline.get(token)
+        print metrics.tracer.to_prometheus()
+        metrics.disable()
+
+        python metrics.py   # 比较关闭、打开统计时_call的开销
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import re
+import json
+import math
+import random
+import timeit
+import threading
+
+import jsonobj
+
+
+timer = timeit.default_timer
+
+PHASES = ('connect', 'tls', 'send', 'first_byte', 'read', 'decode', 'wrap', 'total')
+
+# prometheus直方图的桶(秒)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_ID = re.compile(r'/\d{5,}(?=/|\.|$)')  # 微博、用户等的id. 不包括api的版本号(如：/2/)
+
+
+class Histogram(object):
+    def __init__(self, sub_bits = 7):
+        '''HDR风格的对数-线性直方图，以微秒为单位记录. 每个2的幂区间分成2 ** (sub_bits - 1)个桶，
+        相对误差不超过1 / 2 ** (sub_bits - 1)(sub_bits = 7时约1.6%). 桶按需创建，没有记录过的区间不占内存
+
+        @param sub_bits: 精度
+        '''
+        self.sub_bits = sub_bits
+        self._sub = 1 << sub_bits
+        self._half = self._sub >> 1
+        self.counts = { }   # key: 桶序号, value: 次数
+        self.count = 0
+        self.sum = 0.0  # 秒
+        self.min = None
+        self.max = 0.0
+
+    def _index(self, us):
+        if us < self._sub:
+            return us
+        shift = math.frexp(us)[1] - self.sub_bits
+        return self._sub + (shift - 1) * self._half + (us >> shift) - self._half
+
+    def _bounds(self, index):
+        '''桶的范围[low, high)，微秒
+        '''
+        if index < self._sub:
+            return index, index + 1
+        shift, offset = divmod(index - self._sub, self._half)
+        top = offset + self._half
+        return top << (shift + 1), (top + 1) << (shift + 1)
+
+    def record(self, seconds):
+        index = self._index(int(seconds * 1000000))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        '''第p(0 ~ 1)分位的值(秒). 没有记录时返回0
+        '''
+        if not self.count:
+            return 0.0
+        rank = max(1, int(math.ceil(self.count * p)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = self._bounds(index)
+                return min(max((low + high - 1) / 2000000.0, self.min), self.max)
+        return self.max
+
+    def cumulative(self, bounds = BUCKETS):
+        '''prometheus格式的累计计数: [(上限(秒), 小于等于上限的次数), ...]
+        '''
+        ret = [ ]
+        items = sorted(self.counts.items())
+        i = seen = 0
+        for le in bounds:
+            limit = le * 1000000
+            while i < len(items) and self._bounds(items[i][0])[1] - 1 <= limit:
+                seen += items[i][1]
+                i += 1
+            ret.append((le, seen))
+        return ret
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min or 0.0,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'p999': self.percentile(0.999),
+        }
+
+
+class Span(object):
+    __slots__ = ('method', 'endpoint', 'phases', 'error', 'reused', 'start', 'parent')
+
+    def __init__(self, method, endpoint, parent = None):
+        '''一次采样的调用
+        '''
+        self.method = method
+        self.endpoint = endpoint
+        self.phases = { }   # key: 阶段, value: 耗时(秒)
+        self.error = None   # 失败时为异常的类名
+        self.reused = None  # 最后一次请求是否复用了连接池中的连接
+        self.start = timer()
+        self.parent = parent
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def lap(self, phase, start):
+        '''记录从start到现在的耗时，返回现在的时间(作为下一个阶段的start)
+        '''
+        now = timer()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - start
+        return now
+
+    def __repr__(self):
+        phases = ' '.join('%s=%.3fms' % (phase, self.phases[phase] * 1000) for phase in PHASES if phase in self.phases)
+        return '<Span %s %s %s%s>' % (self.method, self.endpoint, phases, ' error=' + self.error if self.error else '')
+
+
+_local = threading.local()
+
+def current():
+    '''当前线程正在采样的调用，没有时返回None
+    '''
+    return getattr(_local, 'span', None)
+
+
+def _escape(val):
+    return val.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Tracer(object):
+    def __init__(self, sample = 1.0, sub_bits = 7):
+        '''
+
+        @param sample: 采样比例(0 ~ 1)
+        @param sub_bits: 直方图的精度，参考Histogram
+        '''
+        self.sample = sample
+        self.sub_bits = sub_bits
+        self.hooks = [ ]    # 每次采样的调用结束后调用hook(span)
+        self._histograms = { }  # key: (method, endpoint, phase), value: Histogram
+        self._errors = { }  # key: (method, endpoint, 异常类名), value: 次数
+        self._lock = threading.Lock()
+
+    def start(self, http_method, uri):
+        '''开始一次调用. 没有采样到时返回None
+        '''
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return None
+        endpoint = _ID.sub('/:id', uri.split('://', 1)[-1].split('?', 1)[0])
+        span = _local.span = Span(http_method, endpoint, current())
+        return span
+
+    def finish(self, span):
+        span.phases['total'] = timer() - span.start
+        _local.span = span.parent
+        span.parent = None
+        with self._lock:
+            for phase, seconds in span.phases.iteritems():
+                key = (span.method, span.endpoint, phase)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(self.sub_bits)
+                histogram.record(seconds)
+            if span.error:
+                key = (span.method, span.endpoint, span.error)
+                self._errors[key] = self._errors.get(key, 0) + 1
+        for hook in self.hooks:
+            hook(span)
+
+    def call(self, http_method, uri, func, *args):
+        '''采样并调用func(*args)，供各模块的_call使用
+        '''
+        span = self.start(http_method, uri)
+        if span is None:
+            return func(*args)
+        try:
+            return func(*args)
+        except Exception as ex:
+            span.error = type(ex).__name__
+            raise
+        finally:
+            self.finish(span)
+
+    def histogram(self, http_method, endpoint, phase = 'total'):
+        return self._histograms.get((http_method, endpoint, phase))
+
+    def reset(self):
+        with self._lock:
+            self._histograms = { }
+            self._errors = { }
+
+    def snapshot(self):
+        '''按接口汇总: [{'method': , 'endpoint': , 'errors': {异常类名: 次数}, 'phases': {阶段: Histogram.summary()}}, ...]
+        '''
+        endpoints = { }
+        with self._lock:
+            for (method, endpoint, phase), histogram in self._histograms.iteritems():
+                item = endpoints.setdefault((method, endpoint), {'method': method, 'endpoint': endpoint, 'errors': { }, 'phases': { }})
+                item['phases'][phase] = histogram.summary()
+            for (method, endpoint, error), count in self._errors.iteritems():
+                endpoints[(method, endpoint)]['errors'][error] = count
+        return [endpoints[key] for key in sorted(endpoints)]
+
+    def to_json(self, indent = None):
+        return json.dumps({'sample': self.sample, 'endpoints': self.snapshot()}, indent = indent, sort_keys = True)
+
+    def to_prometheus(self, prefix = 'weibosdk'):
+        '''prometheus文本格式(text/plain; version=0.0.4)
+        '''
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            errors = sorted(self._errors.items())
+        name = prefix + '_call_phase_seconds'
+        lines = ['# HELP %s Time spent in each phase of an api call.' % name, '# TYPE %s histogram' % name]
+        for (method, endpoint, phase), histogram in histograms:
+            labels = 'method="%s",endpoint="%s",phase="%s"' % (method, _escape(endpoint), phase)
+            for le, count in histogram.cumulative():
+                lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, repr(le), count))
+            lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, histogram.count))
+            lines.append('%s_sum{%s} %s' % (name, labels, repr(histogram.sum)))
+            lines.append('%s_count{%s} %d' % (name, labels, histogram.count))
+        name = prefix + '_call_errors_total'
+        lines.extend(['# HELP %s Failed api calls by exception type.' % name, '# TYPE %s counter' % name])
+        for (method, endpoint, error), count in errors:
+            lines.append('%s{method="%s",endpoint="%s",error="%s"} %d' % (name, method, _escape(endpoint), error, count))
+        return '\n'.join(lines) + '\n'
+
+
+class _TracedDecoder(object):
+    # 代替jsonobj.default_decoder，采样时记录decode, wrap的耗时
+    def __init__(self, decoder):
+        self.decoder = decoder
+
+    def __getattr__(self, attr):
+        return getattr(self.decoder, attr)
+
+    def loads(self, html):
+        span = current()
+        if span is None:
+            return self.decoder.loads(html)
+        start = timer()
+        ret = self.decoder.loads(html)
+        span.lap('decode', start)
+        return ret
+
+    def wrap(self, obj):
+        span = current()
+        if span is None:
+            return self.decoder.wrap(obj)
+        start = timer()
+        ret = self.decoder.wrap(obj)
+        span.lap('wrap', start)
+        return ret
+
+    def decode(self, html):
+        return self.wrap(self.loads(html))
+
+
+# 各模块的_call, httpool使用的tracer. None表示关闭
+tracer = None
+
+def enable(sample = 1.0, reuse = None):
+    '''打开统计，返回使用的Tracer
+
+    @param sample: 采样比例
+    @param reuse: 继续使用的Tracer(如：disable()返回的，保留之前的统计结果). 指定该参数时忽略sample
+    '''
+    global tracer
+    if not isinstance(jsonobj.default_decoder, _TracedDecoder):
+        jsonobj.default_decoder = _TracedDecoder(jsonobj.default_decoder)
+    tracer = reuse or Tracer(sample)
+    return tracer
+
+
+def disable():
+    '''关闭统计，返回之前使用的Tracer(可以继续导出)
+    '''
+    global tracer
+    if isinstance(jsonobj.default_decoder, _TracedDecoder):
+        jsonobj.default_decoder = jsonobj.default_decoder.decoder
+    ret, tracer = tracer, None
+    return ret
+
+
+def _benchmark(n = 20000, rounds = 3):
+    '''通过transport.Player回放(不联网)，比较关闭、采样为0、全部采样时weibo2._call的耗时(取rounds次中最快的一次)
+    '''
+    import metrics  # 作为脚本运行时本模块是__main__，各模块使用的是metrics
+    import transport
+    import weibo2
+
+    page = json.dumps({'statuses': [{'id': i, 'text': 'python', 'user': {'id': 1}} for i in xrange(20)], 'next_cursor': 0})
+    token = weibo2.OAuthToken('appkey', 'appsecret', 'access_token', 3600, 'uid')
+    with transport.use(transport.Player(transport.Cassette(), lambda *args: (200, 'OK', page))):
+        for name, sample in (('off', None), ('sample=0', 0.0), ('sample=1', 1.0)):
+            best = None
+            for _ in xrange(rounds):
+                if sample is not None:
+                    metrics.enable(sample)
+                start = timer()
+                for _ in xrange(n):
+                    weibo2._call('GET', 'statuses/home_timeline', token, count = 20)
+                elapsed = timer() - start
+                best = min(best or elapsed, elapsed)
+                last = metrics.disable()
+            print '%-9s %8.2fus/call' % (name, best / n * 1000000)
+    print last.to_prometheus()
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: mockserver.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        本地的模拟api服务器(只使用标准库)，模拟新浪、腾讯、网易的授权接口和常用接口，不联网也可以对连接池、重试、并发做压力测试.
+        按请求的Host头区分平台，客户端通过transport.Redirect把请求转发到这个服务器(Host头不变)。
+        支持的接口：
+            . 新浪: oauth/request_token, oauth/access_token, oauth2/access_token,
+                    statuses/home_timeline, statuses/update, statuses/upload (Oauth1.0和Oauth2.0)
+            . 腾讯: cgi-bin/request_token, cgi-bin/access_token, cgi-bin/oauth2/access_token,
+                    statuses/home_timeline, t/add, t/add_pic
+            . 网易: oauth/request_token, oauth/access_token, oauth2/access_token,
+                    statuses/home_timeline, statuses/update, statuses/upload
+        说明：
+            . latency: 每个请求的响应延迟(秒), 或者(最小值, 最大值)之间随机
+            . error_rate: 接口返回服务器错误的概率(新浪、网易: error_code 10003 + http 500; 腾讯: ret = 4)
+            . rate_limit: 每个token每window秒最多调用的次数，超过时返回频次超限(新浪、网易: error_code 10023 + http 403; 腾讯: ret = 2)
+            . revoke(token): 之后使用该token的调用返回认证失败(新浪、网易: error_code 21327 + http 401; 腾讯: ret = 3)
+            . 发表的微博保存在内存中，timeline按max_id(腾讯按pageflag, lastid)翻页
+            . stats()返回请求数、注入的错误数、频次超限数等
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        server = MockServer(latency = (0.01, 0.05), error_rate = 0.05, rate_limit = 150).start()
+        with transport.use(transport.Redirect(server.address)):
+            print api.statuses.home_timeline.get(token)
+        print server.stats()
+        server.stop()
+
+        python mockserver.py -p 8000 --latency 0.02 --error-rate 0.05  # 运行服务器
+        python mockserver.py --load 20   # 20个线程的压力测试
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import re
+import cgi
+import json
+import time
+import uuid
+import random
+import urlparse
+import threading
+import SocketServer
+import BaseHTTPServer
+from StringIO import StringIO
+
+
+SINA1, SINA2, QQ, NETEASE = 'api.t.sina.com.cn', 'api.weibo.com', 'open.t.qq.com', 'api.t.163.com'
+
+_AUTH_HEADER_TOKEN = re.compile(r'oauth_token="([^"]*)"')
+
+
+def _new_key():
+    return uuid.uuid4().hex
+
+
+class _Request(object):
+    def __init__(self, method, host, path, params, headers, size):
+        self.method = method
+        self.host = host
+        self.path = path
+        self.params = params    # query string和表单的参数
+        self.headers = headers
+        self.size = size    # 请求体的字节数
+
+    @property
+    def token(self):
+        token = self.params.get('access_token') or self.params.get('oauth_token')
+        if not token:
+            match = _AUTH_HEADER_TOKEN.search(self.headers.get('Authorization', ''))
+            token = match and match.group(1)
+        return token
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # 响应头和内容分开写，开启Nagle时keep-alive连接上每个请求都要等待约40ms的延迟确认
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else ''
+        path, _, query = self.path.partition('?')
+        params = dict(urlparse.parse_qsl(query, keep_blank_values = True))
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/'):
+            form = cgi.FieldStorage(fp = StringIO(body), headers = self.headers,
+                                    environ = {'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type})
+            for key in form.keys():
+                if not form[key].filename:
+                    params[key] = form.getfirst(key)
+        elif body:
+            params.update(urlparse.parse_qsl(body, keep_blank_values = True))
+        host = self.headers.get('Host', '').split(':')[0]
+        request = _Request(self.command, host, path, params, self.headers, len(body))
+        status, content_type, html = self.server.dispatch(request)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(html)))
+        self.end_headers()
+        self.wfile.write(html)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, address = ('127.0.0.1', 0), latency = 0, error_rate = 0.0, rate_limit = None, window = 3600,
+                 expires_in = 86400, statuses = 200):
+        '''
+
+        @param address: 监听的地址. 端口为0时自动分配，实际地址见self.address
+        @param latency: 响应延迟(秒), 或者(最小值, 最大值)
+        @param error_rate: 接口返回服务器错误的概率(授权接口不注入错误)
+        @param rate_limit: 每个token每window秒最多调用的次数. None表示不限制
+        @param window: 频次限制的时间窗口(秒)
+        @param expires_in: Oauth2.0的token的有效期(秒)
+        @param statuses: 每个平台预先生成的微博数
+        '''
+        BaseHTTPServer.HTTPServer.__init__(self, address, _Handler)
+        self.address = '%s:%d' % self.server_address[:2]
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.window = window
+        self.expires_in = expires_in
+        self._lock = threading.Lock()
+        self._thread = None
+        self._revoked = set()
+        self._counters = { }    # key: (host, token), value: [窗口开始时间, 调用次数]
+        self._statuses = { }    # key: host, value: 微博列表(新的在前)
+        self._next_id = 3512345678900000
+        self._stats = dict.fromkeys(('requests', 'auth', 'injected_errors', 'rate_limited', 'unauthorized', 'not_found', 'posted', 'uploaded_bytes'), 0)
+        for host in (SINA1, SINA2, QQ, NETEASE):
+            self._statuses[host] = [ ]
+            for i in xrange(statuses):
+                self._add_status(host, u'模拟的微博 #%d' % i, 'mock_user_%d' % (i % 10))
+        self._routes = {
+            (SINA1, '/oauth/request_token'): self._oauth1_request_token,
+            (SINA1, '/oauth/access_token'): self._oauth1_access_token,
+            (SINA2, '/oauth2/access_token'): self._oauth2_access_token,
+            (QQ, '/cgi-bin/request_token'): self._oauth1_request_token,
+            (QQ, '/cgi-bin/access_token'): self._oauth1_access_token,
+            (QQ, '/cgi-bin/oauth2/access_token'): self._oauth2_access_token,
+            (NETEASE, '/oauth/request_token'): self._oauth1_request_token,
+            (NETEASE, '/oauth/access_token'): self._oauth1_access_token,
+            (NETEASE, '/oauth2/access_token'): self._oauth2_access_token,
+        }
+        for host, prefix in ((SINA1, '/'), (SINA2, '/2/'), (NETEASE, '/')):
+            self._routes[(host, prefix + 'statuses/home_timeline.json')] = self._timeline
+            self._routes[(host, prefix + 'statuses/update.json')] = self._update
+            self._routes[(host, prefix + 'statuses/upload.json')] = self._update
+        self._routes[(QQ, '/api/statuses/home_timeline')] = self._qq_timeline
+        self._routes[(QQ, '/api/t/add')] = self._qq_add
+        self._routes[(QQ, '/api/t/add_pic')] = self._qq_add
+
+    def start(self):
+        self._thread = threading.Thread(target = self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def revoke(self, token):
+        '''之后使用token的调用返回认证失败
+        '''
+        with self._lock:
+            self._revoked.add(token)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name, n = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _add_status(self, host, text, user):
+        # 调用时持有self._lock, 或者在__init__中
+        self._next_id += 1
+        status = {
+            'id': self._next_id, 'text': text, 'created_at': time.strftime('%a %b %d %H:%M:%S +0800 %Y'),
+            'user': {'id': hash(user) & 0xffffffff, 'screen_name': user, 'name': user},
+        }
+        if host == QQ:
+            status = {'id': str(self._next_id), 'text': text, 'name': user, 'nick': user.title(), 'timestamp': int(time.time())}
+        elif host == NETEASE:
+            status['id'] = str(self._next_id)
+        self._statuses[host].insert(0, status)
+        return status
+
+    # ------------------------------------------------------------ 响应
+
+    def _json(self, obj, status = 200):
+        return status, 'application/json; charset=utf-8', json.dumps(obj)
+
+    def _error(self, request, error_code, message, status):
+        if request.host == QQ:     # 腾讯出错时http状态码也是200
+            ret = {10023: 2, 21327: 3}.get(error_code, 4)
+            return self._json({'ret': ret, 'errcode': error_code, 'msg': message, 'data': None})
+        return self._json({'request': request.path, 'error_code': error_code, 'error': message}, status)
+
+    def dispatch(self, request):
+        '''处理一个请求，返回(http状态码, Content-Type, 响应内容)
+        '''
+        latency = self.latency
+        if isinstance(latency, tuple):
+            latency = random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+        self._count('requests')
+        handler = self._routes.get((request.host, request.path))
+        if handler is None:
+            self._count('not_found')
+            return self._json({'request': request.path, 'error_code': 404, 'error': 'no such api'}, 404)
+        if request.path.startswith(('/oauth', '/cgi-bin')):
+            self._count('auth')
+            return handler(request)
+
+        token = request.token
+        now = time.time()
+        with self._lock:
+            revoked = not token or token in self._revoked
+            limited = False
+            if not revoked and self.rate_limit is not None:
+                counter = self._counters.get((request.host, token))
+                if counter is None or counter[0] <= now - self.window:
+                    counter = self._counters[(request.host, token)] = [now, 0]
+                counter[1] += 1
+                limited = counter[1] > self.rate_limit
+        if revoked:
+            self._count('unauthorized')
+            return self._error(request, 21327, 'expired_token', 401)
+        if limited:
+            self._count('rate_limited')
+            return self._error(request, 10023, 'User requests out of rate limit!', 403)
+        if self.error_rate and random.random() < self.error_rate:
+            self._count('injected_errors')
+            return self._error(request, 10003, 'Remote service error', 500)
+        return handler(request)
+
+    def _oauth1_request_token(self, request):
+        html = 'oauth_token=%s&oauth_token_secret=%s' % (_new_key(), _new_key())
+        if request.host == QQ:
+            html += '&oauth_callback_confirmed=true'
+        return 200, 'text/plain', html
+
+    def _oauth1_access_token(self, request):
+        html = 'oauth_token=%s&oauth_token_secret=%s' % (_new_key(), _new_key())
+        if request.host == SINA1:
+            html += '&user_id=2617375872'
+        elif request.host == QQ:
+            html += '&name=mock_user'
+        return 200, 'text/plain', html
+
+    def _oauth2_access_token(self, request):
+        grant_type = request.params.get('grant_type')
+        if grant_type not in ('authorization_code', 'refresh_token'):
+            return self._json({'error': 'unsupported_grant_type', 'error_code': 21323}, 400)
+        access_token, refresh_token = _new_key(), _new_key()
+        if request.host == QQ:   # 顺序与qweibo2.OAuth2Api.create_token解析的顺序相同
+            html = 'access_token=%s&expires_in=%d&refresh_token=%s&openid=%s&name=mock_user&nick=MockUser&state=' % (
+                access_token, self.expires_in, refresh_token, uuid.uuid5(uuid.NAMESPACE_DNS, QQ).hex)
+            return 200, 'text/plain', html
+        ret = {'access_token': access_token, 'expires_in': self.expires_in, 'refresh_token': refresh_token, 'uid': '2617375872'}
+        if request.host == NETEASE:
+            ret['expires_in'] = str(self.expires_in)
+        return self._json(ret)
+
+    def _page(self, host, count, max_id):
+        # 不大于max_id的最多count条微博
+        with self._lock:
+            statuses = list(self._statuses[host])
+        if max_id is not None:
+            statuses = [status for status in statuses if int(status['id']) <= max_id]
+        return statuses[:count]
+
+    def _timeline(self, request):
+        count = int(request.params.get('count', 20))
+        max_id = request.params.get('max_id')
+        statuses = self._page(request.host, count, int(max_id) if max_id else None)
+        if request.host == SINA2:
+            return self._json({'statuses': statuses, 'total_number': len(self._statuses[request.host]), 'next_cursor': 0})
+        return self._json(statuses)
+
+    def _qq_timeline(self, request):
+        count = int(request.params.get('reqnum', 20))
+        max_id = None
+        if request.params.get('pageflag') == '1' and request.params.get('lastid'):
+            max_id = int(request.params['lastid']) - 1
+        statuses = self._page(QQ, count + 1, max_id)
+        return self._json({'ret': 0, 'errcode': 0, 'msg': 'ok',
+                           'data': {'info': statuses[:count], 'hasnext': 0 if len(statuses) > count else 1, 'timestamp': int(time.time())}})
+
+    def _update(self, request):
+        if request.path.endswith('upload.json'):
+            self._count('uploaded_bytes', request.size)
+            if request.host == NETEASE:     # 网易的statuses/upload只上传图片
+                return self._json({'upload_image_url': 'http://126.fm/%s' % _new_key()[:8]})
+        text = request.params.get('status', '').decode('utf-8')
+        with self._lock:
+            self._stats['posted'] += 1
+            status = self._add_status(request.host, text, 'mock_user')
+        return self._json(status)
+
+    def _qq_add(self, request):
+        if request.path.endswith('add_pic'):
+            self._count('uploaded_bytes', request.size)
+        text = request.params.get('content', '').decode('utf-8')
+        with self._lock:
+            self._stats['posted'] += 1
+            status = self._add_status(QQ, text, 'mock_user')
+        return self._json({'ret': 0, 'errcode': 0, 'msg': 'ok', 'data': {'id': status['id'], 'time': status['timestamp']}})
+
+
+def _load_test(server, threads, seconds):
+    '''多个线程通过weibo2调用模拟服务器, 打印吞吐量、重试和连接池的统计信息
+    '''
+    import httpool
+    import errors
+    import weibo2
+    import transport
+
+    api = weibo2.OAuth2Api('appkey', 'appsecret', 'http://localhost/callback')
+    redirect = transport.Redirect(server.address, httpool.ConnectionPool(maxsize = threads))
+    policy = errors.RetryPolicy(max_attempts = 3, backoff = 0.01, budget = errors.RetryBudget(0.2))
+    counts = {'calls': 0, 'failures': 0}
+    lock = threading.Lock()
+
+    def work(deadline):
+        token = api.create_token('code')
+        calls = failures = 0
+        while time.time() < deadline:
+            try:
+                api.statuses.home_timeline.get(token, count = 20)
+            except errors.WeiBoError:
+                failures += 1
+            calls += 1
+        with lock:
+            counts['calls'] += calls
+            counts['failures'] += failures
+
+    weibo2.retry_policy, retry_policy = policy, weibo2.retry_policy
+    try:
+        with transport.use(redirect):
+            deadline = time.time() + seconds
+            workers = [threading.Thread(target = work, args = (deadline, )) for _ in xrange(threads)]
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+    finally:
+        weibo2.retry_policy = retry_policy
+    print 'threads: %d, calls: %d (%.0f/s), failures: %d' % (threads, counts['calls'], counts['calls'] / float(seconds), counts['failures'])
+    print 'retry:', policy.stats()
+    print 'pool:', redirect.transport.stats()
+    print 'server:', server.stats()
+
+
+def main(argv = None):
+    import optparse
+    parser = optparse.OptionParser(usage = 'python mockserver.py [options]')
+    parser.add_option('-H', '--host', default = '127.0.0.1')
+    parser.add_option('-p', '--port', type = 'int', default = 0)
+    parser.add_option('--latency', type = 'float', default = 0, help = 'response latency in seconds')
+    parser.add_option('--error-rate', type = 'float', default = 0, help = 'probability of an injected server error')
+    parser.add_option('--rate-limit', type = 'int', help = 'calls per token per window')
+    parser.add_option('--window', type = 'int', default = 3600, help = 'rate limit window in seconds')
+    parser.add_option('--load', type = 'int', metavar = 'THREADS', help = 'run a load test with THREADS threads and exit')
+    parser.add_option('--seconds', type = 'float', default = 5, help = 'load test duration')
+    options, _ = parser.parse_args(argv)
+    server = MockServer((options.host, options.port), options.latency, options.error_rate, options.rate_limit, options.window)
+    if options.load:
+        server.start()
+        try:
+            _load_test(server, options.load, options.seconds)
+        finally:
+            server.stop()
+        return
+    print 'mock server listening on %s' % server.address
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
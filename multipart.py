@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: multipart.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        流式multipart/form-data请求体，用于statuses/upload, t/add_pic等上传图片的接口.
+        原先的实现先f.read()整个图片，再把所有字段'\r\n'.join成一个字符串，一张图片在内存里要存两三份。
+        MultipartBody事先算好Content-Length，发送时依次读出表单字段、图片内容(尽量mmap)和结束分隔符，
+        httplib按块读取并直接写入socket。
+        说明：
+            . MultipartBody是只读的file-like对象(read, seek(0), close), 可以直接作为httplib的body
+            . 连接失效重发时，调用seek(0)从头再读一遍
+            . Media: 读入内存的文件. 同一张图片上传到多个平台时只读一次文件，各平台的MultipartBody共用同一份内容
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        body = MultipartBody({'status': u'测试'}, 'pic', '/tmp/test.jpg')
+        headers = {'Content-Type': body.content_type, 'Content-Length': str(len(body))}
+        try:
+            httpool.default_pool.request('POST', 'https', 'api.weibo.com', '/2/statuses/upload.json', body, headers)
+        finally:
+            body.close()
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import mmap
+import uuid
+import mimetypes
+from os.path import getsize, basename
+
+
+utf8 = lambda u: u.encode('utf-8')
+
+
+class Media(object):
+    def __init__(self, file_path, data = None):
+        '''读入内存的文件. 内容只读，可以在多个线程的MultipartBody之间共用
+
+        @param file_path: 文件路径. 用作上传时的文件名和猜测mimetype
+        @param data: 文件内容. None表示从file_path读取
+        '''
+        if data is None:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        self.file_path = file_path
+        self.data = data
+        self.mimetype = mimetypes.guess_type(file_path)[0]
+
+    def __len__(self):
+        return len(self.data)
+
+
+class MultipartBody(object):
+    def __init__(self, fields, file_field, file_path, boundary = None, final = '--'):
+        '''
+
+        @param fields: 普通表单字段. dict: key: 表单域名称, value: 域值
+        @param file_field: 文件字段的名称, 如：pic
+        @param file_path: 文件路径或者Media对象
+        @param boundary: 分隔符，默认随机生成
+        @param final: 结束分隔符的后缀. 标准的写法是'--'
+        '''
+        self.boundary = boundary or '------' + str(uuid.uuid4())
+        if isinstance(file_path, Media):
+            self._media = file_path
+            file_path = self._media.file_path
+            self.file_size = len(self._media)
+            mimetype = self._media.mimetype
+        else:
+            self._media = None
+            self.file_size = getsize(file_path)
+            mimetype = mimetypes.guess_type(file_path)[0]
+        self.file_path = file_path
+
+        lines = [ ]
+        for field_name, val in (fields or { }).items():
+            lines.append('--' + self.boundary)
+            lines.append('Content-Disposition: form-data; name="%s"' % field_name)
+            lines.append('Content-Type: text/plain; charset=US-ASCII')
+            lines.append('Content-Transfer-Encoding: 8bit')
+            lines.append('')
+            lines.append(utf8(val) if type(val) is unicode else str(val))
+        lines.append('--' + self.boundary)
+        lines.append('Content-Disposition: form-data; name="%s"; filename="%s"' % (file_field, basename(file_path)))
+        if mimetype:
+            lines.append('Content-Type: ' + mimetype)
+        lines.append('Content-Transfer-Encoding: binary')
+        lines.append('')
+        lines.append('')    # 文件内容之前的"\r\n"
+        self._preamble = '\r\n'.join(lines)
+        self._epilogue = '\r\n--%s%s\r\n' % (self.boundary, final)
+
+        self._file = None
+        self._data = None   # mmap或者文件对象
+        self._segment = 0   # 0: preamble, 1: 文件内容, 2: epilogue, 3: 结束
+        self._offset = 0
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=' + self.boundary
+
+    def __len__(self):
+        return len(self._preamble) + self.file_size + len(self._epilogue)
+
+    def _open(self):
+        self._file = open(self.file_path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        except (mmap.error, ValueError, EnvironmentError):    # 空文件或者不支持mmap的文件系统
+            self._data = self._file
+
+    def read(self, size = 8192):
+        '''读取最多size字节. 返回空字符串表示已经读完
+        '''
+        while self._segment < 3:
+            if self._segment == 1 and self._media is not None:
+                chunk = self._media.data[self._offset:self._offset + size]
+                self._offset += len(chunk)
+            elif self._segment == 1:
+                if self._data is None:
+                    self._open()
+                if self._data is self._file:
+                    chunk = self._file.read(size)
+                else:
+                    chunk = self._data[self._offset:self._offset + size]
+                self._offset += len(chunk)
+            else:
+                text = self._preamble if self._segment == 0 else self._epilogue
+                chunk = text[self._offset:self._offset + size]
+                self._offset += len(chunk)
+            if chunk:
+                return chunk
+            self._segment += 1
+            self._offset = 0
+        return ''
+
+    def seek(self, pos):
+        '''只支持回到开头，用于失效连接的重发
+        '''
+        if pos != 0:
+            raise ValueError('MultipartBody can only seek to 0')
+        if self._data is self._file and self._file is not None:
+            self._file.seek(0)
+        self._segment = 0
+        self._offset = 0
+
+    def close(self):
+        if self._data is not None and self._data is not self._file:
+            self._data.close()
+        if self._file is not None:
+            self._file.close()
+        self._data = self._file = None
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: oauth1.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        Oauth1.0(weibo.py, qweibo.py, tweibo.py)的HMAC-SHA1签名.
+        原先每次请求都重新拼接hmac的key、重新对所有参数(包括不变的oauth_*参数)做urlencode，
+        Signer为每个token预先计算好这些不变的部分：
+            . hmac的key只处理一次，每次签名复制已经初始化的hmac对象
+            . oauth_consumer_key, oauth_token等不变的参数预先urlencode好，Authorization头中不变的部分预先拼好
+            . 请求的url的编码结果缓存起来(api的数量有限)
+        签名结果与原来的实现完全相同。
+        nonce: 随机串. 原先是random.randint(1000000, 9999999)，只有900万个取值，而且时间戳的精度是秒，
+        多线程、多进程并发签名时会出现重复的nonce被服务器拒绝。现在的nonce由两部分组成：
+            . 每个进程启动(或fork)之后从os.urandom取的64位随机前缀
+            . 进程内递增的计数器(itertools.count, 在多线程下也不会重复)
+            前缀和计数器在第一次调用(或fork之后)时加锁初始化，之后的调用不需要加锁
+
+        Sender: 三个模块共用的发送、限流和重试(与oauth2.Platform.send, fetch相同)，各模块只提供自己的_request.
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        signer = Signer(appkey, appsecret, oauth_token, oauth_token_secret)
+        oauth = signer.sign('POST', 'http://api.t.sina.com.cn/statuses/update.json', {'status': 'hello'}, nonce(), tm())
+        headers['Authorization'] = signer.authorization(oauth)
+
+        python oauth1.py    # 运行签名、nonce的性能测试和nonce的多进程重复测试
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import os
+import hmac
+import threading
+import urllib
+import hashlib
+import binascii
+import itertools
+
+import errors
+import jsonobj
+
+
+urlencode = lambda p: urllib.quote_plus(p, safe = '~')
+
+
+_nonce_state = (None, None, None)   # (pid, 随机前缀, 计数器), 整体替换，其他线程不会读到一半初始化的状态
+_nonce_lock = threading.Lock()
+
+
+def nonce():
+    '''生成一个不会重复的随机串(24个字符以内的16进制字符串)
+    '''
+    global _nonce_state
+    state = _nonce_state
+    pid = os.getpid()
+    if state[0] != pid:    # 第一次调用，或者fork出的子进程: 重新取随机前缀
+        with _nonce_lock:
+            state = _nonce_state
+            if state[0] != pid:   # 其他线程可能已经初始化
+                state = _nonce_state = (pid, binascii.hexlify(os.urandom(8)), itertools.count())
+    return '%s%x' % (state[1], next(state[2]))
+
+
+class Signer(object):
+    _MAX_CACHE = 1024   # 缓存的url编码结果的最大数目
+
+    def __init__(self, appkey, appsecret, oauth_token, oauth_token_secret, extra = None):
+        '''
+
+        @param extra: 每个请求都带上的其他参数, 如：腾讯的{'format': 'json'}
+        '''
+        self.key = (appkey, appsecret, oauth_token, oauth_token_secret)
+        self._mac = hmac.new(str('%s&%s' % (appsecret, oauth_token_secret)), digestmod = hashlib.sha1)
+        static = {
+            'oauth_consumer_key': appkey,
+            'oauth_token': oauth_token,
+            'oauth_signature_method': 'HMAC-SHA1',
+            'oauth_version': '1.0',
+        }
+        static.update(extra or { })
+        self._static = static
+        # (key, 编码后的key=value), 按key排序. 签名时与请求参数合并后重新排序
+        self._static_pairs = sorted((key, '%s=%s' % (urlencode(key), urlencode(val))) for key, val in static.items())
+        self._header = ', '.join(['OAuth realm=""'] + ['%s="%s"' % (urlencode(key), urlencode(val))
+                                                       for key, val in sorted(static.items()) if key.startswith('oauth_')])
+        self._urls = { }
+
+    def _quote_url(self, url):
+        try:
+            return self._urls[url]
+        except KeyError:
+            pass
+        if len(self._urls) >= Signer._MAX_CACHE:
+            self._urls = { }
+        ret = self._urls[url] = urlencode(url)
+        return ret
+
+    def signature(self, http_method, url, params, nonce, timestamp):
+        '''计算签名
+
+        @param params: 参与签名的请求参数(不包括oauth_*参数). dict: key, value都是str
+        @param nonce: 随机串
+        @param timestamp: 时间戳
+        '''
+        pairs = self._static_pairs + [('oauth_nonce', 'oauth_nonce=' + urlencode(nonce)),
+                                      ('oauth_timestamp', 'oauth_timestamp=' + timestamp)]
+        for key, val in params.iteritems():
+            pairs.append((key, '%s=%s' % (urlencode(key), urlencode(val))))
+        pairs.sort()
+        base = '%s&%s&%s' % (http_method, self._quote_url(url), urlencode('&'.join([pair for _, pair in pairs])))
+        mac = self._mac.copy()
+        mac.update(base)
+        return binascii.b2a_base64(mac.digest())[:-1]
+
+    def sign(self, http_method, url, params, nonce, timestamp, signed = None):
+        '''签名并返回需要附加到请求上的参数(oauth_*参数, extra参数, oauth_signature)
+
+        @param signed: 参与签名的参数, 默认为params
+        '''
+        sig = self.signature(http_method, url, params if signed is None else signed, nonce, timestamp)
+        ret = dict(self._static)
+        ret['oauth_nonce'] = nonce
+        ret['oauth_timestamp'] = timestamp
+        ret['oauth_signature'] = sig
+        return ret
+
+    def authorization(self, oauth):
+        '''sign返回的参数对应的Authorization头
+        '''
+        return '%s, oauth_nonce="%s", oauth_timestamp="%s", oauth_signature="%s"' % (
+            self._header, urlencode(oauth['oauth_nonce']), oauth['oauth_timestamp'], urlencode(oauth['oauth_signature']))
+
+
+class Sender(object):
+    def __init__(self, settings, request):
+        '''
+
+        @param settings: 平台模块. 调用时读取模块的rate_limiter(参考ratelimit.RateLimiter), retry_policy(参考errors.RetryPolicy)变量
+        @param request: 模块的_request(http_method, url, query, timeout = 10, token = None)，负责签名和发送
+        '''
+        self.settings = settings
+        self.request = request
+
+    def send(self, http_method, uri, params, token):
+        '''发送一次请求，返回(html, 解析后的json对象). 出错时抛出errors中对应类型的异常
+        '''
+        rate_limiter = self.settings.rate_limiter
+        if rate_limiter is not None and not rate_limiter.acquire(token, http_method, uri):
+            raise errors.RateLimitError('rate limit exceeded when request "%s"' % uri, request = uri, rejected = True)
+        try:    # _request会修改参数(签名、取出pic), 重试时需要原来的参数
+            errcode, reason, html = self.request(http_method, uri, dict(params), token = token)
+        except errors.NETWORK_ERRORS as ex:
+            raise errors.from_network(ex, uri)
+        if errcode != 200:
+            raise errors.from_response(errcode, reason, html, uri)
+        json_obj = jsonobj.default_decoder.loads(html)    # json可以直接解析utf-8编码的字符串，不需要先decode成unicode
+        if type(json_obj) is dict and json_obj.get('error_code'):
+            raise errors.from_json(json_obj, errcode, uri)
+        return html, json_obj
+
+    def fetch(self, http_method, uri, params, token):
+        '''发送请求(失败时按retry_policy重试)，返回包装后的结果
+        '''
+        retry_policy = self.settings.retry_policy
+        if retry_policy is not None:
+            html, json_obj = retry_policy.call(http_method, self.send, http_method, uri, params, token)
+        else:
+            html, json_obj = self.send(http_method, uri, params, token)
+        return jsonobj.default_decoder.wrap(json_obj)
+
+
+def _rate(func, seconds):
+    import timeit
+    count = 0
+    start = timeit.default_timer()
+    while timeit.default_timer() - start < seconds:
+        for _ in xrange(1000):
+            func()
+        count += 1000
+    return count / (timeit.default_timer() - start)
+
+
+def _benchmark(seconds = 2.0):
+    '''比较原来的签名实现和Signer每秒的签名次数，原来的nonce和现在的nonce每秒的生成次数
+    '''
+    import time
+    import random
+
+    hmac_sha1 = lambda key, val: binascii.b2a_base64(hmac.new(str(key), val, hashlib.sha1).digest())[:-1]
+    appkey, appsecret = '1234567890', 'a8caa50e0b6612778b3c849e27e398b2'
+    token, token_secret = '55729344a581f9acd24ad1551a7cc3cb', '2617375872abcdef2617375872abcdef'
+    url = 'http://api.t.sina.com.cn/statuses/update.json'
+    params = {'status': u'选择python，选择简洁 http://darkbull.net'.encode('utf-8'), 'lat': '24.48', 'long': '118.08'}
+    randint_nonce = lambda: str(random.randint(1000000, 9999999))   # 原来的nonce
+    make_nonce = randint_nonce
+    tm = lambda: str(int(time.time()))
+
+    def old():  # 原来_request中的实现
+        query = dict(params)
+        query.update({'oauth_consumer_key': appkey, 'oauth_token': token, 'oauth_signature_method': 'HMAC-SHA1',
+                      'oauth_timestamp': tm(), 'oauth_nonce': make_nonce(), 'oauth_version': '1.0'})
+        items = query.items()
+        items.sort()
+        t = '&'.join(('%s=%s' % (urlencode(key), urlencode(val)) for key, val in items))
+        sig_base_str = '%s&%s&%s' % ('POST', urlencode(url), urlencode(t))
+        query['oauth_signature'] = hmac_sha1('%s&%s' % (appsecret, token_secret), sig_base_str)
+        auth_header = ['OAuth realm=""']
+        for key in query:
+            if key.startswith('oauth_'):
+                auth_header.append('%s="%s"' % (urlencode(key), urlencode(query[key])))
+        return query['oauth_signature']
+
+    signer = Signer(appkey, appsecret, token, token_secret)
+
+    def new():
+        oauth = signer.sign('POST', url, params, make_nonce(), tm())
+        signer.authorization(oauth)
+        return oauth['oauth_signature']
+
+    fixed = (make_nonce, tm)
+    make_nonce, tm = lambda: '1234567', lambda: '1357538400'
+    assert old() == new(), 'signature mismatch'
+    make_nonce, tm = fixed
+
+    print 'signatures per second:'
+    for name, func in (('old', old), ('Signer', new)):
+        print '    %-8s %10.0f' % (name, _rate(func, seconds))
+    print 'nonces per second:'
+    for name, func in (('randint', randint_nonce), ('nonce', nonce)):
+        print '    %-8s %10.0f' % (name, _rate(func, seconds))
+
+
+def _nonce_worker(args):
+    # 每个进程用多个线程生成nonce
+    import threading
+    threads, count = args
+    result = [ ]
+    def run():
+        result.extend([nonce() for _ in xrange(count)])
+    workers = [threading.Thread(target = run) for _ in xrange(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return result
+
+
+def _collision_test(total = 1000000, processes = 8, threads = 4):
+    '''在多个进程(每个进程多个线程)中生成total个nonce，检查是否有重复
+    '''
+    import multiprocessing
+    nonce()     # 父进程先生成随机前缀, 检查fork出的子进程不会沿用
+    pool = multiprocessing.Pool(processes)
+    try:
+        per_thread = total // (processes * threads)
+        seen = set()
+        generated = 0
+        for result in pool.imap_unordered(_nonce_worker, [(threads, per_thread)] * processes):
+            generated += len(result)
+            seen.update(result)
+    finally:
+        pool.close()
+        pool.join()
+    print 'nonce collision test: %d nonces from %d processes x %d threads, %d duplicates' % (
+        generated, processes, threads, generated - len(seen))
+    assert generated == len(seen)
+
+
+if __name__ == '__main__':
+    _benchmark()
+    _collision_test()
@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: oauth2.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        Oauth2.0模块(weibo2.py, qweibo2.py, tweibo2.py)共用的调用引擎.
+        三个模块的_request, _call, OAuth2Api原先几乎逐行重复，现在由Platform实现一次，
+        各模块只定义Platform的子类，设置各平台不同的部分：
+            . uri_common: api的基础url; suffix: url后缀(如：.json)
+            . auth_params: 鉴权参数(新浪、网易只有access_token; 腾讯还有openid, oauth_version=2.a, format等)
+            . upload_api: 上传图片的接口; pic_min_size, pic_max_size: 图片大小限制
+            . aliases: 路径别名(del是python关键字，使用delete代替)
+            . cursor: 分页接口的翻页方式
+            . media_ref, post_ref: 复用已经上传的图片，参考mediaindex
+            . batch_apis, split_batch: 单个查询合并成批量接口，参考coalesce
+            . check: 按返回结果判断是否出错(新浪、网易带有error_code; 腾讯出错时http状态码仍然是200，按ret判断)
+        连接池、缓存、限流、重试等都在Platform中实现，对三个平台同时生效。
+        统一的发微博、读timeline接口：
+            . api.post_status(token, text, pic = None): 发一条微博(可以带图片)
+            . api.timeline(token, count = 20): 读首页timeline
+            返回结果转换成相同的格式: DictObject(platform, id, text, user, created_at, raw), raw是平台返回的原始结果
+            . post_all([(api, token), ...], text, pic): 同一条微博同时发到多个平台，参考syndicate.Syndicator
+        AsyncOAuth2Api: 调用立即返回executor.Future. python2没有asyncio，这里是线程池而不是非阻塞io：
+            每个正在网络上的请求占用一个工作线程，同时在网络上的请求数最多是max_workers(默认64)，
+            其余的调用只是队列中的Future. 用完之后调用close()(或者使用with语句)关闭自己创建的线程池
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        report = post_all([(weibo2_api, weibo2_token), (qweibo2_api, qweibo2_token), (tweibo2_api, tweibo2_token)], u'同时发到三个平台')
+        for result in report:
+            print result.platform, result.status.id if result.ok else result.error
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import urllib
+import functools
+from os.path import getsize, isfile
+from urlparse import urlparse
+
+import httpool
+import apipath
+import multipart
+import executor
+import pager
+import jsonobj
+from jsonobj import DictObject
+import errors
+import metrics
+import imageprep
+import mediaindex
+import syndicate
+from errors import WeiBoError
+
+
+utf8 = lambda u: u.encode('utf-8')
+
+
+class Platform(object):
+    name = ''
+    uri_common = ''
+    suffix = ''
+    scheme = None   # None表示使用url中的scheme
+    user_agent = 'WeiBo-Python-Client; Created by darkbull(http://darkbull.net)'
+    colon_params = False    # 参数名以"__"开始时换成":", 如：__id => :id
+    aliases = None
+    upload_api = 'statuses/upload'
+    pic_min_size = 0
+    pic_max_size = 1024 * 1024 * 5
+    upload_connection = 'keep-alive'
+    multipart_final = '--'
+    next_cursor_apis = frozenset()  # 使用next_cursor翻页的接口，其他接口按max_id翻页
+    # 可以合并成批量接口的单个查询. key: 单个查询的接口, value: (批量接口, {单个查询的参数名: 批量接口的参数名}, 每批最多个数)
+    batch_apis = { }
+
+    def __init__(self, settings):
+        '''
+
+        @param settings: 平台模块. 调用时读取模块的rate_limiter, retry_policy变量
+        '''
+        self.settings = settings
+        self.host = urlparse(self.uri_common).netloc
+        self.parse_path = apipath.PathParser(self.aliases).parse
+
+    def auth_params(self, params, token):
+        '''在请求参数中加上鉴权参数
+        '''
+        params['access_token'] = token.access_token
+
+    def cursor(self, api_uri):
+        return pager.NextCursor() if api_uri in self.next_cursor_apis else pager.MaxIdCursor()
+
+    def request(self, http_method, url, query = None, timeout = 10):
+        '''向远程服务器发送一个http request
+
+        @param http_method: 请求方法
+        @param url: 网址
+        @param query: 提交的参数. dict: key: 表单域名称, value: 域值
+        @return: 元组(response status, reason, response html)
+        '''
+        scheme, netloc, path, params, args = urlparse(url)[:5]
+        upload_pic = path.endswith('/' + self.upload_api + self.suffix)  # 不能用in判断: statuses/upload_url_text, t/add_pic_url
+        if args:
+            path += '?' + args
+        headers = {
+            'User-Agent': self.user_agent,
+            'Host': netloc,
+        }
+
+        if upload_pic:    # 需要上传图片
+            assert http_method == 'POST'
+            assert 'pic' in query
+            pic = query.pop('pic')   # 文件路径或者multipart.Media
+
+            if isinstance(pic, multipart.Media):
+                pic_path, pic_size = pic.file_path, len(pic)
+            elif isfile(pic):
+                pic_path, pic_size = pic, getsize(pic)
+            else:
+                raise WeiBoError(u'File "%s" not exist' % pic)
+            if not (self.pic_min_size <= pic_size <= self.pic_max_size):
+                if self.pic_min_size:
+                    raise WeiBoError('Size of file "%s" must be between %dK and %dM.' % (pic_path, self.pic_min_size // 1024, self.pic_max_size // (1024 * 1024)))
+                raise WeiBoError('Size of file "%s" must be less than %dM.' % (pic_path, self.pic_max_size // (1024 * 1024)))
+
+            body = multipart.MultipartBody(query, 'pic', pic, final = self.multipart_final)
+            headers['Content-Type'] = body.content_type
+            headers['Content-Length'] = str(len(body))
+            headers['Connection'] = self.upload_connection
+        else:
+            body = urllib.urlencode(query) if query else ''
+            if http_method == 'POST':
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+                headers['Content-Length'] = str(len(body))
+            else:
+                if body:
+                    if args:
+                        path += '&' + body
+                    else:
+                        path += '?' + body
+                    body = ''
+
+        try:
+            return httpool.default_pool.request(http_method, self.scheme or scheme, netloc, path, body, headers, timeout)
+        finally:
+            if upload_pic:
+                body.close()
+
+    def send(self, http_method, uri, params, token):
+        '''发送一次请求，返回(html, 解析后的json对象). 出错时抛出errors中对应类型的异常
+        '''
+        rate_limiter = self.settings.rate_limiter
+        if rate_limiter is not None and not rate_limiter.acquire(token, http_method, uri):
+            raise errors.RateLimitError('rate limit exceeded when request "%s"' % uri, request = uri, rejected = True)
+        try:    # request会修改参数(取出pic), 重试时需要原来的参数
+            errcode, reason, html = self.request(http_method, uri, dict(params))
+        except errors.NETWORK_ERRORS as ex:
+            raise errors.from_network(ex, uri)
+        if errcode != 200:
+            raise errors.from_response(errcode, reason, html, uri)
+        json_obj = jsonobj.default_decoder.loads(html)    # json可以直接解析utf-8编码的字符串，不需要先decode成unicode
+        self.check(json_obj, uri)
+        return html, json_obj
+
+    def check(self, json_obj, uri):
+        '''http状态码为200时检查返回结果，出错时抛出errors中对应类型的异常(重试、限流、token调度都依据异常的类型)
+        '''
+        if type(json_obj) is dict and json_obj.get('error_code'):
+            raise errors.from_json(json_obj, 200, uri)
+
+    def call(self, http_method, uri, token, _cache = None, **kwargs):
+        '''调用接口
+
+        @param uri: api路径(如：statuses/update)或完整的url
+        @param _cache: 只读接口的返回结果缓存，参考respcache.ResponseCache
+        '''
+        api_uri = uri
+        if not uri.startswith('http'):
+            uri = self.uri_common + uri
+        if self.suffix and not uri.endswith(self.suffix):
+            uri += self.suffix
+        http_method = http_method.upper()
+
+        params = { }
+        for key, val in kwargs.items():
+            if self.colon_params and key.startswith('__'):    # 很恶心的参数，如：:id, 这里用 __id代替
+                key = ':' + key[2:]
+            if type(key) is unicode:
+                key = utf8(key)
+            if type(val) is unicode:
+                val = utf8(val)
+            params[key] = val
+
+        if token:
+            self.auth_params(params, token)
+
+        cache_key = None
+        if _cache is not None:  # 参考respcache.ResponseCache
+            ttl = _cache.ttl(http_method, api_uri)
+            if ttl:
+                cache_key = _cache.make_key(http_method, uri, params)
+                html = _cache.get(cache_key)
+                if html is not None:
+                    decoder = jsonobj.default_decoder
+                    return decoder.wrap(decoder.loads(html))
+
+        tracer = metrics.tracer
+        if tracer is not None:  # 耗时统计，参考metrics.Tracer
+            html, ret = tracer.call(http_method, uri, self.fetch, http_method, uri, params, token)
+        else:
+            html, ret = self.fetch(http_method, uri, params, token)
+        if cache_key is not None:   # 出错的响应(包括腾讯ret不为0的200响应)在fetch中已经由check抛出异常，不会写入缓存
+            _cache.set(cache_key, html, ttl)
+        return ret
+
+    def fetch(self, http_method, uri, params, token):
+        '''发送请求(失败时按retry_policy重试)，返回(html, 包装后的结果)
+        '''
+        retry_policy = self.settings.retry_policy
+        if retry_policy is not None:
+            html, json_obj = retry_policy.call(http_method, self.send, http_method, uri, params, token)
+        else:
+            html, json_obj = self.send(http_method, uri, params, token)
+        return html, jsonobj.default_decoder.wrap(json_obj)
+
+    def status(self, **fields):
+        '''统一格式的微博
+        '''
+        fields['platform'] = self.name
+        return DictObject(fields)
+
+    def post_status(self, token, text, pic = None):
+        '''发一条微博. 新浪、网易的实现相同(网易见子类)
+        '''
+        if pic:
+            ret = self.call('POST', 'statuses/upload', token, status = text, pic = pic)
+        else:
+            ret = self.call('POST', 'statuses/update', token, status = text)
+        return self.normalize(ret)
+
+    def call_batch(self, api_uri, param, values, token, _cache = None, **kwargs):
+        '''把单个查询api_uri合并成批量接口调用，返回{参数值: 与单个查询相同格式的结果}
+
+        @param param: 单个查询的参数名
+        @param values: 参数值列表
+        '''
+        batch_api, names, _ = self.batch_apis[api_uri]
+        kwargs[names[param]] = ','.join(values)
+        return self.split_batch(api_uri, param, self.call('GET', batch_api, token, _cache, **kwargs))
+
+    def split_batch(self, api_uri, param, ret):
+        '''按参数值拆分批量接口的结果
+        '''
+        raise NotImplementedError
+
+    def post_media(self, token, text, pic):
+        '''发一条带图片的微博，返回(统一格式的微博, 图片的引用). 引用用于post_ref复用已经上传的图片，不支持时为None
+        '''
+        status = self.post_status(token, text, pic)
+        return status, self.media_ref(status.raw)
+
+    def media_ref(self, ret):
+        '''上传图片的返回结果中可以复用的图片引用(url或者pic_id). None表示不支持复用
+        '''
+        return None
+
+    def post_ref(self, token, text, ref):
+        '''使用已经上传的图片发一条微博，参考mediaindex
+        '''
+        raise NotImplementedError
+
+    def timeline(self, token, count = 20, _cache = None, **kwargs):
+        ret = self.call('GET', 'statuses/home_timeline', token, _cache, count = count, **kwargs)
+        items = ret if isinstance(ret, list) else ret.get('statuses') or [ ]
+        return [self.normalize(item) for item in items]
+
+    def normalize(self, item):
+        user = item.get('user') or { }
+        return self.status(id = item.get('id'), text = item.get('text'), user = user.get('screen_name'),
+                           created_at = item.get('created_at'), raw = item)
+
+
+class OAuth2Api(object):
+    platform = None # 子类设置为各平台的Platform对象
+
+    def __init__(self, appkey, appsecret, callback, cache = None, coalescer = None, singleflight = None):
+        """
+
+        @param cache: 只读接口的返回结果缓存，参考respcache.ResponseCache
+        @param coalescer: 把并发的单个查询(如：users/show)合并成批量接口调用，参考coalesce.Coalescer
+        @param singleflight: 相同的GET请求同时只发送一个，参考singleflight.Group
+        """
+        self.appkey = appkey
+        self.appsecret = appsecret
+        self.callback = callback    # callback与后台设置的不一致好像也可以正常回调
+        self.cache = cache
+        self.coalescer = coalescer
+        self.singleflight = singleflight
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError, attr
+        return apipath.ApiPath(self, (attr, ))
+
+    def _invoke(self, attrs, token, kwargs):
+        """调用接口，如：api.statuses.public_timeline.get(token) # 以get方式提交请求
+        """
+        http_method, api_uri = self.platform.parse_path(attrs)
+        future = self._coalesce(http_method, api_uri, token, kwargs)
+        if future is not None:
+            return future.result()
+        key = self._flight_key(http_method, api_uri, token, kwargs)
+        if key is not None:
+            return self.singleflight.do(key, self._call, http_method, api_uri, token, kwargs)
+        return self._call(http_method, api_uri, token, kwargs)
+
+    def _call(self, http_method, api_uri, token, kwargs):
+        return self.platform.call(http_method, api_uri, token, _cache = self.cache, **kwargs)
+
+    def _flight_key(self, http_method, api_uri, token, kwargs):
+        # 可以合并相同请求时返回请求的key. 否则返回None
+        if self.singleflight is None or http_method != 'GET':
+            return None
+        return self.singleflight.make_key(self.platform.name, http_method, api_uri, token, kwargs)
+
+    def _coalesce(self, http_method, api_uri, token, kwargs):
+        # 可以合并成批量接口时提交给coalescer，返回Future. 否则返回None
+        if self.coalescer is None:
+            return None
+        matched = self.coalescer.match(self.platform, http_method, api_uri, kwargs)
+        if matched is None:
+            return None
+        param, value, params = matched
+        return self.coalescer.submit(self.platform, token, api_uri, param, value, params, self.cache)
+
+    def _iterate(self, attrs, token, kwargs):
+        """自动翻页，逐条返回结果，如：
+            for status in api.statuses.home_timeline.iter(token, count = 100):
+                print status.text
+        """
+        platform = self.platform
+        http_method, api_uri = platform.parse_path(attrs)
+        fetch = lambda params: platform.call(http_method, api_uri, token, _cache = self.cache, **params)
+        return pager.iterate(fetch, kwargs, platform.cursor(api_uri))
+
+    def batch(self, max_workers = 8):
+        """批量调用，调用在后台线程池中执行，按完成的先后顺序取回结果。如：
+            with api.batch() as b:
+                for uid in uids:
+                    b.users.show.get(token, uid = uid)
+                for slot in b.as_completed():
+                    print slot.result()
+
+        @param max_workers: 最多同时执行的请求数
+        """
+        return executor.Batch(functools.partial(OAuth2Api._invoke, self), max_workers)
+
+    def post_status(self, token, text, pic = None):
+        """发一条微博，返回统一格式的结果: DictObject(platform, id, text, user, created_at, raw)
+
+        @param pic: 图片文件路径或者multipart.Media. 超出平台的大小限制时先压缩，参考imageprep
+        """
+        if pic:
+            preprocessor = imageprep.default_preprocessor
+            index = mediaindex.default_index
+            if index is not None:   # 上传过的图片不再上传. 索引按内容查找，需要读取文件
+                pic = preprocessor.fit(preprocessor.load(pic), *imageprep.limits(self.platform))
+                return index.post(self.platform, token, text, pic)
+            pic = preprocessor.fit(pic, *imageprep.limits(self.platform))   # 没有超出限制时仍然是文件路径
+        return self.platform.post_status(token, text, pic)
+
+    def timeline(self, token, count = 20, **kwargs):
+        """读首页timeline，返回统一格式的微博列表
+        """
+        return self.platform.timeline(token, count, self.cache, **kwargs)
+
+
+class AsyncOAuth2Api(OAuth2Api):
+    """异步调用接口：调用立即返回executor.Future，请求在后台线程中执行(通过httpool复用连接)。如：
+        f = api.statuses.user_timeline.get(token)
+        print f.result()
+    请求仍然通过httplib阻塞地收发，每个正在执行的请求占用一个工作线程：同时在网络上的请求数最多是max_workers
+    (一个平台的所有接口都在同一个host上，设置max_per_host时最多是max_per_host)，其余的调用在队列中等待，
+    只占用一个Future. 需要更高的并发时增大max_workers(和httpool.default_pool.maxsize)，或者使用多个进程。
+    用完之后调用close()，或者：
+        with AsyncOAuth2Api(appkey, appsecret, callback) as api:
+            futures = [api.users.show.get(token, uid = uid) for uid in uids]
+    """
+    def __init__(self, appkey, appsecret, callback, max_workers = 64, max_per_host = None, workers = None, cache = None, coalescer = None,
+                 singleflight = None):
+        """
+
+        @param max_workers: 最多同时执行的请求数(工作线程数)
+        @param max_per_host: 同一个host最多同时执行的请求数. None表示不限制(每个平台只有一个host，由max_workers限制)
+        @param workers: 共用的executor.Executor, 指定该参数时忽略max_workers和max_per_host
+        @param cache: 只读接口的返回结果缓存，参考respcache.ResponseCache
+        @param coalescer: 把并发的单个查询合并成批量接口调用，参考coalesce.Coalescer
+        @param singleflight: 相同的GET请求同时只发送一个，参考singleflight.Group
+        """
+        OAuth2Api.__init__(self, appkey, appsecret, callback, cache, coalescer, singleflight)
+        self._own_workers = workers is None    # 共用的workers由创建它的一方关闭
+        self.workers = workers or executor.Executor(max_workers, max_per_host)
+
+    def close(self, wait = True):
+        '''关闭自己创建的工作线程池，不再接受新的调用. 已经提交的调用会继续执行完
+
+        @param wait: 是否等待所有工作线程退出
+        '''
+        if self._own_workers:
+            self.workers.shutdown(wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def _invoke(self, attrs, token, kwargs):
+        http_method, api_uri = self.platform.parse_path(attrs)
+        future = self._coalesce(http_method, api_uri, token, kwargs)   # 合并的查询等待期间不占用工作线程
+        if future is not None:
+            return future
+        key = self._flight_key(http_method, api_uri, token, kwargs)
+        if key is not None:    # 相同的请求正在执行时返回它的Future
+            return self.singleflight.submit(key, self.workers.submit_keyed, self.platform.host, self._call, http_method, api_uri, token, kwargs)
+        return self.workers.submit_keyed(self.platform.host, self._call, http_method, api_uri, token, kwargs)
+
+
+def post_all(targets, text, pic = None):
+    '''同一条微博同时发到多个平台
+
+    @param targets: [(api, token), ...], api为各平台的OAuth2Api
+    @param pic: 图片文件路径. 只读一次文件，各平台共用同一份内容. 提交之前按各平台的大小限制检查、压缩
+    @return: syndicate.Report, 等待所有平台完成后返回. 各平台的错误记录在Report中，不抛出
+    '''
+    syndicator = syndicate.Syndicator(targets)
+    try:
+        return syndicator.post(text, pic)
+    finally:
+        syndicator.shutdown(wait = False)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: pager.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        分页接口的自动翻页，如：
+            for status in api.statuses.home_timeline.iter(token, count = 100):
+                print status.text
+        逐条返回结果，当前页还在处理时，后台线程已经开始取下一页。需要按页处理时(如：exporter每页保存检查点)使用pages。
+        各平台的分页方式不同，由各模块为每个api选择对应的Cursor：
+            . MaxIdCursor: 新浪/网易的timeline, 以上一页最后一条的id作为max_id
+            . NextCursor: 新浪/网易的好友、粉丝列表，使用返回的next_cursor
+            . QQTimelineCursor: 腾讯的timeline, pageflag/pagetime/lastid
+            . QQIndexCursor: 腾讯的收听、听众列表，startindex/nextstartpos
+
+        python版本要求：python2.6+，不支持python3.x
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import executor
+import jsonobj
+
+
+# 返回结果中条目所在的字段，按顺序查找
+_ITEM_KEYS = ('statuses', 'comments', 'users', 'favorites', 'ids', 'reposts')
+
+
+def _find_items(page):
+    if isinstance(page, list):
+        return page
+    for key in _ITEM_KEYS:
+        items = getattr(page, key, None)    # 通过属性访问，条目会被包装成DictObject
+        if items is not None:
+            return items
+    return [ ]
+
+
+class Cursor(object):
+    '''分页方式. 每次翻页都新建一个Cursor，可以保存翻页过程中的状态
+    '''
+    def items(self, page):
+        '''从一页结果中取出条目
+        '''
+        return _find_items(page)
+
+    def next_params(self, page, items, params):
+        '''计算下一页的请求参数. 返回None表示已经是最后一页
+
+        @param page: 当前页的结果
+        @param items: 当前页的条目(self.items的返回值)
+        @param params: 当前页的请求参数
+        '''
+        raise NotImplementedError
+
+
+class MaxIdCursor(Cursor):
+    def __init__(self):
+        self._last_id = None
+
+    def items(self, page):
+        items = _find_items(page)
+        if items and self._last_id is not None and items[0]['id'] == self._last_id:
+            items = items[1:]   # max_id是闭区间，去掉与上一页重复的一条
+        return items
+
+    def next_params(self, page, items, params):
+        params = dict(params)
+        params.pop('page', None)
+        last_id = items[-1]['id']
+        if isinstance(last_id, (int, long)):
+            params['max_id'] = last_id - 1
+        else:   # 字符串形式的id(如网易)，用闭区间再去掉重复的一条
+            params['max_id'] = self._last_id = last_id
+        return params
+
+
+class NextCursor(Cursor):
+    def next_params(self, page, items, params):
+        next_cursor = page.get('next_cursor')
+        if next_cursor in (None, 0, '0', -1, '-1', ''):
+            return None
+        params = dict(params)
+        params['cursor'] = next_cursor
+        return params
+
+
+def _qq_data(page):
+    data = getattr(page, 'data', None)
+    return data if data else jsonobj.DictObject({ })
+
+
+class QQTimelineCursor(Cursor):
+    def items(self, page):
+        return getattr(_qq_data(page), 'info', None) or [ ]
+
+    def next_params(self, page, items, params):
+        if _qq_data(page).get('hasnext') != 0:   # 0: 还有数据可以拉取
+            return None
+        params = dict(params)
+        params['pageflag'] = 1  # 向下翻页
+        params['pagetime'] = items[-1]['timestamp']
+        params['lastid'] = items[-1]['id']
+        return params
+
+
+class QQIndexCursor(Cursor):
+    def items(self, page):
+        return getattr(_qq_data(page), 'info', None) or [ ]
+
+    def next_params(self, page, items, params):
+        data = _qq_data(page)
+        if data.get('hasnext') != 0:
+            return None
+        params = dict(params)
+        params['startindex'] = data['nextstartpos']
+        return params
+
+
+def pages(fetch, params, cursor, prefetch = True):
+    '''逐页返回分页接口的结果: (当前页的条目, 下一页的请求参数). 最后一页的下一页参数为None
+
+    @param fetch: 取一页结果的函数: fetch(params)
+    @param params: 第一页的请求参数
+    @param cursor: Cursor对象
+    @param prefetch: 是否在后台预取下一页
+    '''
+    workers = executor.Executor(1) if prefetch else None
+    future = None
+    try:
+        page = fetch(params)
+        while True:
+            items = cursor.items(page)
+            next_params = cursor.next_params(page, items, params) if items else None
+            if next_params is not None and workers:
+                future = workers.submit(fetch, next_params)
+            yield items, next_params
+            if next_params is None:
+                return
+            page = future.result() if future else fetch(next_params)
+            future = None
+            params = next_params
+    finally:
+        if future:  # 调用方提前结束了遍历
+            future.cancel()
+        if workers:
+            workers.shutdown(wait = False)
+
+
+def iterate(fetch, params, cursor, prefetch = True):
+    '''逐条返回分页接口的结果，参数与pages相同
+    '''
+    for items, _ in pages(fetch, params, cursor, prefetch):
+        for item in items:
+            yield item
+
+
+if __name__ == '__main__':
+    pass
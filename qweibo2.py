@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-''' 
+'''
     file: qweibo2.py
     author：darkbull(http://darkbull.net)
     date: 2013-01-03
@@ -10,9 +10,11 @@
         QQ微博 OAuth2.0 参考：http://wiki.open.t.qq.com/index.php/OAuth2.0%E9%89%B4%E6%9D%83
         QQ微博 微博在线api文档参考：http://wiki.open.t.qq.com/index.php/API%E6%96%87%E6%A1%A3
         说明：
-            
+            请求的发送、缓存、限流、重试由oauth2.Platform实现，本模块只定义腾讯的差异部分
+            腾讯出错时http状态码仍然是200，返回结果中ret不为0时抛出errors中的异常(2: RateLimitError, 3: AuthError,
+            4: ServerError, 其他: ApiError)，与其他平台一样可以重试、隔离token
         python版本要求：python2.6+，不支持python3.x
-    
+
     example:
         api = OAuth2Api('appkey', 'appsecret', 'callback_url')
         url = api.get_auth_url()
@@ -24,54 +26,29 @@
         print api.t.add.post(token, status = u'测试数据2')
         # print api.t.add_pic.post(token, content = u'春节放假安，排新快乐！', pic = "/Users/kim/Desktop/test.JPG")
         # print api.t.delete.post(token, id = 203960130148698)
+        # print api.post_status(token, u'测试数据3').id  # 与weibo2, tweibo2相同的统一接口
 '''
 
 __version__ = '0.1a'
 __author__ = 'darkbull(http://darkbull.net)'
 
-import urllib
+import sys
 import time
-import json
-import httplib
-import uuid
-import mimetypes
-from os.path import getsize, isfile, basename
-from urlparse import urlparse
-
+import urllib
 
-utf8 = lambda u: u.encode('utf-8')
+import oauth2
+import pager
+import errors
+from jsonobj import DictObject
+from errors import WeiBoError
 
 
 class OAuth2Error(IOError):
     pass
-    
-    
-class WeiBoError(Exception):
-    pass
 
-    
-class DictObject(dict):  
-    def __init__(self, d): 
-        if isinstance(d, basestring):
-            d = json.loads(d)
-        dict.__init__(self, d)  
-      
-    def __getattr__(self, attr):  
-        if attr in self:  
-            ret = self[attr]  
-            if type(ret) is dict:  
-                return DictObject(ret)  
-            elif type(ret) is list:  
-                for idx, item in enumerate(ret):  
-                    if type(item) is dict:  
-                        ret[idx] = DictObject(item)  
-            return ret  
-        else:
-            raise AttributeError, attr
-        
-        
+
 class OAuthToken(object):
-    def __init__(self, appkey, appsecret, access_token, expires_in, open_id, name, nick, state, original_data = ''):
+    def __init__(self, appkey, appsecret, access_token, expires_in, open_id, name, nick, state, original_data = '', refresh_token = '', expires_at = None):
         self.appkey = appkey
         self.appsecret = appsecret
         self.access_token = access_token
@@ -81,109 +58,37 @@ class OAuthToken(object):
         self.nick = nick
         self.state = state
         self.original_data = original_data
-        
+        self.refresh_token = refresh_token
+        # 过期的绝对时间(time.time()). expires_in是相对于取得token时的秒数
+        self.expires_at = expires_at if expires_at is not None else time.time() + int(expires_in)
+
+    @property
+    def expired(self):
+        return time.time() >= self.expires_at
+
     def __str__(self):
         if self.original_data:
             return self.original_data
         return '{access_token: %s, expires_in: %s}' % (self.access_token, self.expires_in)
-    
-    
-def _request(http_method, url, query = None, timeout = 10):
-    '''向远程服务器发送一个http request
-    
-    @param http_method: 请求方法
-    @param url: 网址
-    @param query: 提交的参数. dict: key: 表单域名称, value: 域值
-    @return: 元组(response status, reason, response html)
-    '''
-    scheme, netloc, path, params, args = urlparse(url)[:5]
-    if args:
-        path += '?' + args
-    conn = httplib.HTTPSConnection(netloc, timeout = timeout) if scheme == 'http' else httplib.HTTPSConnection(netloc, timeout = timeout)
-    headers = {
-        'User-Agent': 'QQWeiBo-Python-Client; Created by darkbull(http://darkbull.net)',
-        'Host': netloc,
-    }
-    
-    if 't/add_pic' in url:    # 需要上传图片
-        assert http_method == 'POST'
-        assert 'pic' in query
-        pic_path = query.pop('pic')
-        
-        if not isfile(pic_path):
-            raise WeiBoError(u'File "{0}" not exist' % pic_path)
-        if getsize(pic_path) > 1024 * 1024 * 4: # QQ微博上传图片大小限制是4M.
-            raise WeiBoError('Size of file "{0}" must be less than 4M.' % pic_path)
-            
-        boundary = '------' + str(uuid.uuid4())
-        body = [ ]
-        
-        if query:
-            for field_name, val in query.items():
-                body.append('--' + boundary)
-                body.append('Content-Disposition: form-data; name="%s"' % field_name)
-                body.append('Content-Type: text/plain; charset=US-ASCII')
-                body.append('Content-Transfer-Encoding: 8bit')
-                body.append('')
-                if type(val) is unicode:
-                    body.append(utf8(val))
-                else:
-                    body.append(val)
-        
-        mimetype = mimetypes.guess_type(pic_path)[0]
-        with open(pic_path, 'rb') as f:
-            data = f.read()
-        filename = basename(pic_path)
-        body.append('--' + boundary)
-        body.append('Content-Disposition: form-data; name="%s"; filename="%s"' % ('pic', filename))
-        if mimetype:
-            body.append('Content-Type: ' + mimetype)
-        body.append('Content-Transfer-Encoding: binary')
-        body.append('')
-        body.append(data)
-        
-        body.append('--' + boundary)
-        body.append('')
-        body = '\r\n'.join(body)
-        
-        headers['Content-Type'] = 'multipart/form-data; boundary=' + boundary
-        headers['Content-Length'] = str(len(body))
-        headers['Connection'] = 'close'
-    else:
-        body = urllib.urlencode(query) if query else ''
-        if http_method == 'POST':
-            headers['Content-Type'] = 'application/x-www-form-urlencoded'
-            headers['Content-Length'] = str(len(body))
-        else:
-            if body:
-                if args:
-                    path += '&' + body
-                else:
-                    path += '?' + body
-                body = ''
-            
-    conn.request(http_method, path, body = body, headers = headers)  
-    resp = conn.getresponse()
-    result = (resp.status, resp.reason, resp.read())
-    conn.close()
-    return result
-
-
-_URI_COMMON = 'https://open.t.qq.com/api/'
-def _call(http_method, uri, token, **kwargs):
-    if not uri.startswith('http'):
-        uri = _URI_COMMON + uri
-    http_method = http_method.upper()
-        
-    params = { }
-    for key, val in kwargs.items():
-        if type(key) is unicode:
-            key = utf8(key)
-        if type(val) is unicode:
-            val = utf8(val)
-        params[key] = val
-        
-    if token:
+
+
+# 返回结果中ret不为0时的错误类型: 1: 参数错误, 2: 频率受限, 3: 鉴权失败, 4: 服务器内部错误
+_RET_ERRORS = {2: errors.RateLimitError, 3: errors.AuthError, 4: errors.ServerError}
+
+
+class _Platform(oauth2.Platform):
+    name = 'qweibo'
+    uri_common = 'https://open.t.qq.com/api/'
+    scheme = 'https'
+    user_agent = 'QQWeiBo-Python-Client; Created by darkbull(http://darkbull.net)'
+    # del是python关键字，使用delete代替
+    aliases = {'delete': 'del'}
+    upload_api = 't/add_pic'
+    pic_max_size = 1024 * 1024 * 4  # QQ微博上传图片大小限制是4M.
+    upload_connection = 'close'
+    multipart_final = ''    # 结束分隔符沿用原来的写法(不带'--')
+
+    def auth_params(self, params, token):
         params['oauth_consumer_key'] = token.appkey
         params['access_token'] = token.access_token
         params['openid'] = token.open_id
@@ -191,40 +96,84 @@ def _call(http_method, uri, token, **kwargs):
         # params['clientip'] = '' # 以命名参数的形式传递该参数，如：api.t.add(token, content = u'', clientip = '192.168.1.1')
         params['scope'] = 'all'
         params['format'] = 'json'
-    
-    try:
-        errcode, reason, html = _request(http_method, uri, params)
-    except IOError as ex:
-        raise WeiBoError(ex)
-    if errcode != 200:
-        try:
-            json_obj = json.loads(html)
-            raise WeiBoError(u'[error:%s occur when request "%s"]:%s' % (json_obj['error_code'],  json_obj['request'], json_obj['error']))
-        except WeiBoError:
-            raise
-        except Exception:
-            raise WeiBoError('errcode: %d, reason: %s, html: %s' % (errcode, reason, html))
-    
-    response = html.decode('utf-8') # utf-8 => unicode
-    json_obj = json.loads(response)
-    if type(json_obj) is dict and json_obj.get('error_code'):
-        # 错误具体信息查询: http://open.weibo.com/wiki/Error_code
-        raise WeiBoError(u'[error:%s occur when request "%s"]:%s' % (json_obj['error_code'],  json_obj['request'], json_obj['error']))
-    return DictObject(json_obj)
-
-
-class OAuth2Api(object):
-    def __init__(self, appkey, appsecret, callback):
-        self.appkey = appkey
-        self.appsecret = appsecret
-        self.callback = callback    # callback与后台设置的不一致好像也可以正常回调
-        self._attrs = [ ]
-        
+
+    def cursor(self, api_uri):
+        # 收听、听众列表(friends/xxx)按startindex翻页，timeline按pageflag/pagetime/lastid翻页
+        return pager.QQIndexCursor() if api_uri.startswith('friends/') else pager.QQTimelineCursor()
+
+    def check(self, json_obj, uri):
+        # 腾讯出错时http状态码仍然是200, 按ret判断
+        if type(json_obj) is dict and json_obj.get('ret'):
+            cls = _RET_ERRORS.get(json_obj['ret'], errors.ApiError)
+            message = u'[error:%s occur when request "%s"]:%s' % (json_obj.get('errcode'), uri, json_obj.get('msg'))
+            raise cls(message, json_obj.get('errcode'), 200, uri, cls is errors.RateLimitError)
+
+    def _data(self, ret):
+        return ret.get('data') or { }
+
+    def post_status(self, token, text, pic = None):
+        if pic:
+            api_uri = 't/add_pic'
+            ret = self.call('POST', api_uri, token, content = text, pic = pic)
+        else:
+            api_uri = 't/add'
+            ret = self.call('POST', api_uri, token, content = text)
+        data = self._data(ret)
+        return self.status(id = data.get('id'), text = text, user = token.name, created_at = data.get('time'), raw = ret)
+
+    # 每批最多30个
+    batch_apis = {
+        'user/other_info': ('user/infos', {'name': 'names', 'fopenid': 'fopenids'}, 30),
+        't/show': ('t/list', {'id': 'ids'}, 30),
+    }
+    _BATCH_KEYS = {'name': 'name', 'fopenid': 'openid', 'id': 'id'}
+
+    def split_batch(self, api_uri, param, ret):
+        data = self._data(ret)
+        field = self._BATCH_KEYS[param]
+        ret = { }
+        for item in data.get('info') or [ ]:
+            val = item.get(field)
+            ret[oauth2.utf8(val) if type(val) is unicode else str(val)] = DictObject({'ret': 0, 'msg': 'ok', 'errcode': 0, 'data': item})
+        return ret
+
+    def media_ref(self, ret):
+        return (ret.get('data') or { }).get('imgurl')
+
+    def post_ref(self, token, text, ref):
+        ret = self.call('POST', 't/add_pic_url', token, content = text, pic_url = ref)
+        data = self._data(ret)
+        return self.status(id = data.get('id'), text = text, user = token.name, created_at = data.get('time'), raw = ret)
+
+    def timeline(self, token, count = 20, _cache = None, **kwargs):
+        ret = self.call('GET', 'statuses/home_timeline', token, _cache, reqnum = count, **kwargs)
+        return [self.normalize(item) for item in self._data(ret).get('info') or [ ]]
+
+    def normalize(self, item):
+        return self.status(id = item.get('id'), text = item.get('text'), user = item.get('nick') or item.get('name'),
+                           created_at = item.get('timestamp'), raw = item)
+
+
+_platform = _Platform(sys.modules[__name__])
+
+# 客户端限流, 参考ratelimit.RateLimiter. None表示不限流
+rate_limiter = None
+# 失败重试策略, 参考errors.RetryPolicy. None表示不重试
+retry_policy = None
+
+_request = _platform.request
+_call = _platform.call
+_HOST = _platform.host
+
+
+class OAuth2Api(oauth2.OAuth2Api):
+    platform = _platform
+
     def get_auth_url(self):
         '''获取用户授权url
         '''
         return 'https://open.t.qq.com/cgi-bin/oauth2/authorize?client_id=%s&response_type=code&redirect_uri=%s' % (self.appkey, urllib.quote(self.callback))
-        
+
     def create_token(self, code):
         '''获取AccessToken
         '''
@@ -233,31 +182,36 @@ class OAuth2Api(object):
         # eg: access_token=55707e5e8df00254888acd26e5e329b9&expires_in=604800&refresh_token=051dc636c73a6f0cfd00855b2ca4772e&openid=1427826f724bcb2a94bd449d8940795e&name=darkbull&nick=DarkBull&state=
         if errcode == 200:
             access_token, expires_in, refresh_token, open_id, name, nick, state = (item.split('=')[1] for item in html.split('&'))
-            return OAuthToken(self.appkey, self.appsecret, access_token, int(expires_in), open_id, name, nick, state, html)
+            return OAuthToken(self.appkey, self.appsecret, access_token, int(expires_in), open_id, name, nick, state, html, refresh_token)
+        else:
+            raise OAuth2Error(errcode, reason, html)
+
+    def refresh(self, token):
+        '''用refresh_token换取新的AccessToken
+        '''
+        if not token.refresh_token:
+            raise OAuth2Error, ('oauth2 error', 'token has no refresh_token.')
+        url = 'https://open.t.qq.com/cgi-bin/oauth2/access_token?client_id=%s&grant_type=refresh_token&refresh_token=%s' % (self.appkey, token.refresh_token)
+        errcode, reason, html = _request('GET', url)
+        # eg: access_token=ACCESS_TOKEN&expires_in=604800&refresh_token=REFRESH_TOKEN&openid=OPENID&name=NAME&nick=NICK
+        if errcode == 200:
+            ret = dict(item.split('=', 1) for item in html.split('&'))
+            return OAuthToken(self.appkey, self.appsecret, ret['access_token'], int(ret['expires_in']), ret.get('openid', token.open_id),
+                              ret.get('name', token.name), ret.get('nick', token.nick), token.state, html, ret.get('refresh_token', token.refresh_token))
         else:
             raise OAuth2Error(errcode, reason, html)
-    
-    def __getattr__(self, attr):  
-        self._attrs.append(attr)  
-        return self  
-          
-    def __call__(self, token = None, **kwargs):  
-        """调用接口，如：api.statuses.public_timeline.get(token) # 以get方式提交请求
-        """
-        http_method = self._attrs[-1]
-        # del是python关键字，使用delete代替
-        attrs = ['del' if part == 'delete' else part for part in self._attrs[:-1]]
-        api_uri = '/'.join(attrs)  
-        self._attrs = [ ]
-        return _call(http_method, api_uri, token, **kwargs)
+
+
+class AsyncOAuth2Api(oauth2.AsyncOAuth2Api, OAuth2Api):
+    """异步调用接口：调用立即返回executor.Future，请求在后台线程中执行(通过httpool复用连接)。如：
+        f = api.statuses.user_timeline.get(token)
+        print f.result()
+    """
 
 
 # 通过授权的token，不需要instance OAuthApi，可以直接通过 qweibo2.api.进行调用
-api = OAuth2Api('', '', '')  
+api = OAuth2Api('', '', '')
+
 
-        
 if __name__ == '__main__':
     pass
-
-    
-    
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: ratelimit.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        客户端限流：按(appkey, token)和接口类别(读、发微博、评论、关注...)分别维护令牌桶，
+        在请求发出之前等待，而不是等服务器返回频次超限的错误之后再重试。
+        说明：
+            . 每个模块都有一个rate_limiter变量(默认None，不限流)，设置之后该模块的_call在发送请求前先调用acquire
+            . 同一个桶的调用方按到达的先后顺序排队：先预留令牌，再睡眠到令牌补足
+            . 等待时间超过timeout时不预留令牌，acquire返回False，_call抛出errors.RateLimitError
+            . remaining查询剩余的额度；sync用服务器返回的剩余次数(如：新浪的account/rate_limit_status)校正
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        limiter = RateLimiter(per_token = {'read': (150, 3600), 'post': (30, 3600)}, per_app = (10000, 3600))
+        weibo2.rate_limiter = limiter
+        qweibo2.rate_limiter = limiter
+        print limiter.remaining(token)
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import time
+import threading
+
+
+# 接口类别. 按顺序匹配(http_method, url中包含的路径)，都不匹配时GET为read, 其他为write
+_CLASSES = (
+    ('POST', 'statuses/update', 'post'),
+    ('POST', 'statuses/upload', 'post'),
+    ('POST', 'statuses/repost', 'post'),
+    ('POST', 't/add', 'post'),  # 包括t/add_pic
+    ('POST', 't/re_add', 'post'),
+    ('POST', 'comments/create', 'comment'),
+    ('POST', 'comments/reply', 'comment'),
+    ('POST', 't/comment', 'comment'),
+    ('POST', 't/reply', 'comment'),
+    ('POST', 'friendships/create', 'follow'),
+    ('POST', 'friends/add', 'follow'),
+)
+
+
+def classify(http_method, uri):
+    '''接口类别: read, write, post(发微博), comment, follow
+    '''
+    for method, path, cls in _CLASSES:
+        if method == http_method and path in uri:
+            return cls
+    return 'read' if http_method == 'GET' else 'write'
+
+
+def token_id(token):
+    '''token的标识: Oauth2.0为access_token, Oauth1.0为oauth_token
+    '''
+    if token is None:
+        return None
+    return getattr(token, 'access_token', None) or getattr(token, 'oauth_token', None)
+
+
+class TokenBucket(object):
+    def __init__(self, calls, period):
+        '''
+
+        @param calls: period秒内允许的调用次数, 也是桶的容量
+        @param period: 时间段(秒)
+        '''
+        self.capacity = float(calls)
+        self.rate = float(calls) / period
+        self.tokens = self.capacity
+        self.last = time.time()
+
+    def _refill(self, now):
+        if now > self.last:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def wait_time(self, now):
+        '''还需要等待多久才有一个令牌. 调用时必须持有RateLimiter的锁
+        '''
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def remaining(self, now):
+        self._refill(now)
+        return max(0, int(self.tokens))
+
+
+class RateLimiter(object):
+    def __init__(self, per_token = None, per_app = None, timeout = None):
+        '''
+
+        @param per_token: 每个token的额度. dict: key: 接口类别, value: (调用次数, 时间段秒数). 没有配置的类别不限流
+        @param per_app: 每个应用(appkey)所有token合计的额度: (调用次数, 时间段秒数)
+        @param timeout: 最多等待的秒数. None表示一直等待, 0表示不等待
+        '''
+        self.per_token = per_token or { }
+        self.per_app = per_app
+        self.timeout = timeout
+        self.waited = 0.0   # 累计等待的时间
+        self.rejected = 0   # 因等待超时而拒绝的调用次数
+        self._buckets = { }
+        self._lock = threading.Lock()
+
+    def _bucket(self, key, limit):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*limit)
+        return bucket
+
+    def _buckets_for(self, token, cls):
+        # 调用时必须持有self._lock
+        buckets = [ ]
+        appkey = getattr(token, 'appkey', '')
+        if self.per_app:
+            buckets.append(self._bucket((appkey, None, None), self.per_app))
+        limit = self.per_token.get(cls)
+        if limit:
+            buckets.append(self._bucket((appkey, token_id(token), cls), limit))
+        return buckets
+
+    def acquire(self, token, http_method, uri, timeout = None):
+        '''等待直到可以调用该接口
+
+        @param token: 调用接口的token
+        @param timeout: 最多等待的秒数，默认使用RateLimiter的timeout
+        @return: 等待超时返回False
+        '''
+        if timeout is None:
+            timeout = self.timeout
+        cls = classify(http_method, uri)
+        with self._lock:
+            now = time.time()
+            buckets = self._buckets_for(token, cls)
+            wait = max([bucket.wait_time(now) for bucket in buckets] or [0.0])
+            if timeout is not None and wait > timeout:
+                self.rejected += 1
+                return False
+            for bucket in buckets:  # 先预留令牌，后来的调用方排在后面
+                bucket.tokens -= 1
+            self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def remaining(self, token, cls = None):
+        '''剩余的额度
+
+        @param cls: 接口类别. None时返回所有配置了额度的类别, dict: key: 类别, value: 剩余次数
+        '''
+        with self._lock:
+            now = time.time()
+            if cls is not None:
+                buckets = self._buckets_for(token, cls)
+                return min([bucket.remaining(now) for bucket in buckets] or [None])
+            ret = { }
+            for name in self.per_token:
+                ret[name] = min(bucket.remaining(now) for bucket in self._buckets_for(token, name))
+            return ret
+
+    def sync(self, token, cls, remaining):
+        '''用服务器返回的剩余次数校正本地的令牌桶
+        '''
+        with self._lock:
+            limit = self.per_token.get(cls)
+            if limit:
+                bucket = self._bucket((getattr(token, 'appkey', ''), token_id(token), cls), limit)
+                bucket._refill(time.time())
+                bucket.tokens = min(bucket.capacity, float(remaining))
+
+    def stats(self):
+        with self._lock:
+            return {'buckets': len(self._buckets), 'waited': self.waited, 'rejected': self.rejected}
+
+
+if __name__ == '__main__':
+    pass
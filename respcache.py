@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: respcache.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        只读接口(users/show, statuses/show, emotions等)的返回结果缓存.
+        同样的参数在很多worker里被反复调用，缓存命中时不发送http请求。
+        说明：
+            . 只缓存GET请求，而且只缓存在ttls里配置了有效期的接口
+            . 缓存的key由http方法、url和排序后的参数(包括access_token等鉴权参数)计算sha1得到，
+              不同token的结果不会混用，token本身也不会以明文保存
+            . 缓存的是接口返回的原始内容，命中时重新解析，调用方拿到的是独立的对象
+            . 只缓存通过了Platform.check的响应，出错的响应(如：腾讯ret不为0的200响应)不会在有效期内被重复返回
+            . MemoryBackend: 进程内缓存，按条目数和字节数做LRU淘汰
+            . FileBackend: 目录下每个key一个文件，多个进程可以共用同一个目录
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        cache = ResponseCache(ttls = {'users/show': 300, 'statuses/show': 60, 'emotions': 3600})
+        api = weibo2.OAuth2Api('appkey', 'appsecret', 'callback_url', cache = cache)
+        api.users.show.get(token, uid = 2617375872)
+        print cache.stats()
+
+        # 多进程共用
+        cache = ResponseCache(FileBackend('/tmp/weibo-cache', max_bytes = 256 * 1024 * 1024), ttls = {'users/show': 300})
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import os
+import time
+import hashlib
+import tempfile
+import threading
+
+
+class MemoryBackend(object):
+    def __init__(self, max_entries = 10000, max_bytes = 64 * 1024 * 1024):
+        '''
+
+        @param max_entries: 最多缓存的条目数
+        @param max_bytes: 缓存内容的最大字节数
+        '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._bytes = 0
+        self._map = { } # key: 缓存key, value: 链表节点[prev, next, key, value, expire_at]
+        self._root = root = [ ]   # 双向循环链表的哨兵节点, root[1]是最久没有使用的节点
+        root[:] = [root, root, None, None, 0]
+        self._lock = threading.Lock()
+
+    def _unlink(self, node):
+        prev, next = node[0], node[1]
+        prev[1] = next
+        next[0] = prev
+
+    def _append(self, node):
+        # 放到链表末尾(最近使用)
+        root = self._root
+        last = root[0]
+        node[0], node[1] = last, root
+        last[1] = root[0] = node
+
+    def _remove(self, node):
+        self._unlink(node)
+        del self._map[node[2]]
+        self._bytes -= len(node[3])
+
+    def get(self, key):
+        with self._lock:
+            node = self._map.get(key)
+            if node is None:
+                return None
+            if node[4] < time.time():
+                self._remove(node)
+                return None
+            self._unlink(node)
+            self._append(node)
+            return node[3]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            node = self._map.get(key)
+            if node is not None:
+                self._remove(node)
+            if len(value) > self.max_bytes:   # 不缓存，但是旧的内容也不能再返回
+                return
+            node = [None, None, key, value, time.time() + ttl]
+            self._append(node)
+            self._map[key] = node
+            self._bytes += len(value)
+            root = self._root
+            while len(self._map) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(root[1])
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._map.clear()
+            self._root[:] = [self._root, self._root, None, None, 0]
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._map), 'bytes': self._bytes, 'evictions': self.evictions}
+
+
+class FileBackend(object):
+    def __init__(self, directory, max_entries = 100000, max_bytes = 256 * 1024 * 1024, purge_every = 1000):
+        '''
+
+        @param directory: 缓存目录, 多个进程可以共用
+        @param max_entries: 最多缓存的条目数
+        @param max_bytes: 缓存内容的最大字节数
+        @param purge_every: 每写入多少次清理一次过期和超出限制的文件
+        '''
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.purge_every = purge_every
+        self.evictions = 0
+        self._writes = 0
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # 其他进程已经创建
+                if not os.path.isdir(directory):
+                    raise
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expire_at = float(f.readline())
+                value = f.read()
+        except (IOError, ValueError):
+            return None
+        if expire_at < time.time():
+            return None
+        try:
+            os.utime(path, None)    # 文件修改时间作为最近使用时间，用于LRU淘汰
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value, ttl):
+        # 先写临时文件再rename，其他进程不会读到写了一半的文件
+        fd, tmp = tempfile.mkstemp(dir = self.directory, prefix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write('%.3f\n' % (time.time() + ttl))
+                f.write(value)
+            os.rename(tmp, self._path(key))
+        except:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge()
+
+    def purge(self):
+        '''删除过期的文件，超出条目数、字节数限制时删除最久没有使用的文件
+        '''
+        now = time.time()
+        files = [ ]
+        for name in os.listdir(self.directory):
+            if name.startswith('.tmp'):
+                continue
+            path = self._path(name)
+            try:
+                st = os.stat(path)
+                with open(path, 'rb') as f:
+                    expire_at = float(f.readline())
+            except (OSError, IOError, ValueError):
+                continue
+            if expire_at < now:
+                self._unlink(path)
+            else:
+                files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        count = len(files)
+        for _, size, path in files:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._unlink(path)
+            self.evictions += 1
+            count -= 1
+            total -= size
+
+    def _unlink(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            self._unlink(self._path(name))
+
+    def stats(self):
+        return {'evictions': self.evictions}
+
+
+class ResponseCache(object):
+    def __init__(self, backend = None, ttls = None, default_ttl = 0):
+        '''
+
+        @param backend: MemoryBackend或者FileBackend，默认MemoryBackend()
+        @param ttls: 每个接口的缓存有效期(秒). dict: key: api路径，如：users/show, value: 有效期
+        @param default_ttl: 没有在ttls中配置的接口的有效期. 0表示不缓存
+        '''
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttls = ttls or { }
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def ttl(self, http_method, api_uri):
+        '''接口的缓存有效期. 返回0表示不缓存
+        '''
+        if http_method != 'GET':
+            return 0
+        return self.ttls.get(api_uri, self.default_ttl)
+
+    def make_key(self, http_method, url, params):
+        items = sorted((str(key), str(val)) for key, val in params.items())
+        raw = '%s %s?%s' % (http_method, url, '&'.join('%s=%s' % item for item in items))
+        return hashlib.sha1(raw).hexdigest()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl):
+        self.backend.set(key, value, ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        ret = self.backend.stats()
+        with self._lock:
+            ret['hits'] = self.hits
+            ret['misses'] = self.misses
+        return ret
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: scheduler.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        多token调度：一个应用有大量用户授权的token，每个token有各自的调用额度.
+        TokenScheduler的调用方式与OAuth2Api相同，但不需要指定token，每次调用自动分配一个负载最低的健康token：
+            sched = TokenScheduler(api, tokens, limiter = limiter)
+            sched.users.show.get(uid = 2617375872)
+        说明：
+            . 负载: 正在执行的调用数、最近的错误率(指数移动平均)、剩余额度(设置了ratelimit.RateLimiter时)
+            . 默认随机抽取2个健康token，取负载低的一个(power of two choices)，token很多时不需要每次遍历；
+              choices = None时遍历所有健康token
+            . 返回errors.AuthError的token被隔离quarantine秒，这次调用换一个token重试一次
+              (腾讯的鉴权失败是200响应中的ret=3，由qweibo2的Platform.check转换成AuthError)
+              (AsyncOAuth2Api也会重试：返回的Future在重试完成之后才完成)
+            . stats()返回整体的调用次数、错误数、最近window秒的吞吐量(次/秒)等指标
+            . api为AsyncOAuth2Api时调用返回Future，Future完成时才释放token的负载
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        sched = TokenScheduler(api, tokens)
+        for uid in uids:
+            print sched.users.show.get(uid = uid).screen_name
+        print sched.stats()
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import sys
+import time
+import heapq
+import random
+import threading
+from collections import deque
+
+import errors
+import apipath
+import executor
+import ratelimit
+
+
+class NoTokenError(errors.WeiBoError):
+    '''没有可用的token(全部被隔离)
+    '''
+
+
+class _TokenState(object):
+    __slots__ = ('token', 'key', 'inflight', 'error_rate', 'calls', 'errors', 'quarantined_until', 'index')
+
+    def __init__(self, token, key):
+        self.token = token
+        self.key = key
+        self.inflight = 0
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.quarantined_until = 0
+        self.index = -1     # 在健康列表中的位置, -1表示被隔离
+
+
+def _exception(future):
+    return None if future.cancelled() else future.exception()
+
+
+def _copy(source, target):
+    # 把已经完成的source的结果(或异常)设置到target
+    if target.done():   # 已经被取消
+        return
+    try:
+        target.set_result(source.result())
+    except:
+        target.set_exc_info(sys.exc_info())
+
+
+class TokenScheduler(object):
+    def __init__(self, api, tokens = (), limiter = None, quarantine = 600, choices = 2, window = 60, decay = 0.9):
+        '''
+
+        @param api: OAuth2Api或AsyncOAuth2Api对象
+        @param tokens: OAuthToken列表
+        @param limiter: ratelimit.RateLimiter, 用于读取每个token剩余的额度. 应与模块的rate_limiter相同
+        @param quarantine: 认证失败的token被隔离的时间(秒)
+        @param choices: 每次随机抽取比较的token数. None表示比较所有健康token
+        @param window: 统计吞吐量的时间窗口(秒)
+        @param decay: 错误率的衰减系数，越大越平滑
+        '''
+        self.api = api
+        self.limiter = limiter
+        self.quarantine = quarantine
+        self.choices = choices
+        self.window = window
+        self.decay = decay
+        self.calls = 0
+        self.errors = 0
+        self.auth_errors = 0
+        self._states = { }  # key: token的key, value: _TokenState
+        self._healthy = [ ] # 健康的_TokenState
+        self._quarantined = [ ] # 堆: (解除隔离的时间, key)
+        self._completed = deque()   # 最近完成的调用: [秒, 次数]
+        self._lock = threading.Lock()
+        for token in tokens:
+            self.add(token)
+
+    def add(self, token):
+        key = ratelimit.token_id(token)
+        with self._lock:
+            if key in self._states:
+                self._states[key].token = token
+                return
+            state = self._states[key] = _TokenState(token, key)
+            self._set_healthy(state)
+
+    def remove(self, token):
+        with self._lock:
+            state = self._states.pop(ratelimit.token_id(token), None)
+            if state is not None and state.index >= 0:
+                self._unset_healthy(state)
+
+    def _set_healthy(self, state):
+        state.index = len(self._healthy)
+        self._healthy.append(state)
+
+    def _unset_healthy(self, state):
+        # 与最后一个交换后删除, O(1)
+        last = self._healthy.pop()
+        if last is not state:
+            self._healthy[state.index] = last
+            last.index = state.index
+        state.index = -1
+
+    def _release_quarantined(self, now):
+        heap = self._quarantined
+        while heap and heap[0][0] <= now:
+            _, key = heapq.heappop(heap)
+            state = self._states.get(key)
+            if state is not None and state.index < 0 and state.quarantined_until <= now:
+                state.error_rate = 0.0
+                self._set_healthy(state)
+
+    def _load(self, state, cls):
+        remaining = 0
+        if self.limiter is not None:
+            remaining = self.limiter.remaining(state.token, cls) or 0
+        return (state.inflight, state.error_rate, -remaining)
+
+    def _acquire(self, http_method, api_uri):
+        cls = ratelimit.classify(http_method, api_uri)
+        while True:
+            with self._lock:
+                self._release_quarantined(time.time())
+                if not self._healthy:
+                    raise NoTokenError('no healthy token available')
+                if self.choices and len(self._healthy) > self.choices:
+                    candidates = random.sample(self._healthy, self.choices)
+                else:
+                    candidates = list(self._healthy)    # 比较在锁外面进行，不能直接使用会被其他线程修改的列表
+            # 读取剩余额度需要RateLimiter的锁，在自己的锁外面比较
+            state = min(candidates, key = lambda state: self._load(state, cls))
+            with self._lock:
+                if state.index >= 0:    # 比较期间可能已经被其他线程隔离，重新选择
+                    state.inflight += 1
+                    return state
+
+    def _release(self, state, exc):
+        now = time.time()
+        decay = self.decay
+        with self._lock:
+            state.inflight -= 1
+            state.calls += 1
+            self.calls += 1
+            failed = exc is not None and isinstance(exc, errors.WeiBoError)
+            state.error_rate = state.error_rate * decay + (1 - decay if failed else 0)
+            if failed:
+                state.errors += 1
+                self.errors += 1
+            if isinstance(exc, errors.AuthError):
+                self.auth_errors += 1
+                if state.index >= 0:
+                    self._unset_healthy(state)
+                    state.quarantined_until = now + self.quarantine
+                    heapq.heappush(self._quarantined, (state.quarantined_until, state.key))
+            second = int(now)
+            completed = self._completed
+            if completed and completed[-1][0] == second:
+                completed[-1][1] += 1
+            else:
+                completed.append([second, 1])
+                while completed[0][0] <= second - self.window:
+                    completed.popleft()
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError, attr
+        return apipath.ApiPath(self, (attr, ))
+
+    def _invoke(self, attrs, token, kwargs):
+        if token is not None:   # 指定了token，不调度
+            return self.api._invoke(attrs, token, kwargs)
+        http_method, api_uri = attrs[-1].upper(), '/'.join(attrs[:-1])
+        state = self._acquire(http_method, api_uri)
+        try:
+            ret = self.api._invoke(attrs, state.token, kwargs)
+        except errors.AuthError as ex:
+            self._release(state, ex)
+            return self._retry(attrs, kwargs, http_method, api_uri)
+        except:
+            self._release(state, sys.exc_info()[1])
+            raise
+        if isinstance(ret, executor.Future):    # AsyncOAuth2Api
+            return self._chain(ret, state, attrs, kwargs, http_method, api_uri)
+        self._release(state, None)
+        return ret
+
+    def _retry(self, attrs, kwargs, http_method, api_uri):
+        # 出错的token已经被隔离，换一个token重试一次
+        retry = self._acquire(http_method, api_uri)
+        try:
+            ret = self.api._invoke(attrs, retry.token, kwargs)
+        except:
+            self._release(retry, sys.exc_info()[1])
+            raise
+        if isinstance(ret, executor.Future):
+            ret.add_done_callback(lambda future: self._release(retry, _exception(future)))
+            return ret
+        self._release(retry, None)
+        return ret
+
+    def _chain(self, future, state, attrs, kwargs, http_method, api_uri):
+        # 异步调用: 返回的Future在第一次调用(认证失败时是重试)完成之后完成. 取消时同时取消正在等待的调用
+        outer = executor.Future()
+        current = [future]
+        outer.add_done_callback(lambda f: f.cancelled() and current[0].cancel())
+
+        def done(future):
+            exc = _exception(future)
+            self._release(state, exc)
+            if isinstance(exc, errors.AuthError) and not outer.done():
+                try:
+                    future = current[0] = self._retry(attrs, kwargs, http_method, api_uri)
+                except:
+                    outer.set_exc_info(sys.exc_info())
+                    return
+            future.add_done_callback(lambda future: _copy(future, outer))
+
+        future.add_done_callback(done)
+        return outer
+
+    def stats(self):
+        '''整体的指标
+        '''
+        now = time.time()
+        with self._lock:
+            self._release_quarantined(now)
+            recent = sum(count for second, count in self._completed if second > now - self.window)
+            return {
+                'tokens': len(self._states),
+                'healthy': len(self._healthy),
+                'quarantined': len(self._states) - len(self._healthy),
+                'inflight': sum(state.inflight for state in self._states.itervalues()),
+                'calls': self.calls,
+                'errors': self.errors,
+                'auth_errors': self.auth_errors,
+                'throughput': float(recent) / self.window,
+            }
+
+    def token_stats(self):
+        '''每个token的指标. dict: key: access_token, value: dict
+        '''
+        with self._lock:
+            return dict((key, {'inflight': state.inflight, 'calls': state.calls, 'errors': state.errors,
+                               'error_rate': state.error_rate, 'healthy': state.index >= 0})
+                        for key, state in self._states.iteritems())
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: singleflight.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        相同请求的合并(single-flight)：同一个请求正在执行时，其他调用方不再发送请求，等待并共用它的结果.
+        原先很多worker同时查同一条微博或者同一个用户(statuses/show, users/show)时，每个都要发一次请求。
+        说明：
+            . 请求的key由平台、http方法、api路径、排序后的参数和token(access_token)计算sha1得到，
+              不同token的请求不会合并，token本身不会以明文保存
+            . 只合并GET请求，POST等有副作用的请求每次都发送
+            . 同步调用(OAuth2Api)等待正在执行的请求的结果；AsyncOAuth2Api直接返回正在执行的请求的Future，
+              两种方式共用同一个Group时也可以互相合并
+            . 所有调用方拿到的是同一个结果对象(不要修改)；请求出错时所有调用方都抛出同样的异常
+            . 请求完成后立即删除，之后的调用重新发送请求(需要缓存时使用respcache)
+            . stats: calls(调用次数), collapsed(被合并、没有发送请求的调用次数), inflight(正在执行的请求数)
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        api = weibo2.OAuth2Api(appkey, appsecret, callback, singleflight = singleflight.Group())
+        # 在多个线程中
+        status = api.statuses.show.get(token, id = 3436240135184587)
+        print api.singleflight.stats()
+
+        python singleflight.py  # 并发的statuses/show合并后的请求数
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import sys
+import time
+import hashlib
+import threading
+
+import executor
+
+
+utf8 = lambda u: u.encode('utf-8')
+
+
+class Group(object):
+    def __init__(self):
+        self._flights = { } # key: 请求的key, value: 正在执行的请求的executor.Future
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.collapsed = 0
+
+    def make_key(self, platform, http_method, api_uri, token, params):
+        '''请求的key
+
+        @param platform: 平台名称
+        @param token: OAuthToken. 只使用access_token
+        @param params: 接口参数
+        '''
+        items = sorted((utf8(key) if type(key) is unicode else str(key), utf8(val) if type(val) is unicode else str(val))
+                       for key, val in params.items())
+        raw = '%s %s %s %s?%s' % (platform, getattr(token, 'access_token', None), http_method, api_uri,
+                                  '&'.join('%s=%s' % item for item in items))
+        return hashlib.sha1(raw).hexdigest()
+
+    def do(self, key, func, *args, **kwargs):
+        '''调用func(*args, **kwargs)并返回结果. 相同key的调用正在执行时，等待并返回它的结果
+        '''
+        with self._lock:
+            self.calls += 1
+            future = self._flights.get(key)
+            owner = future is None
+            if owner:
+                future = self._flights[key] = executor.Future()
+            else:
+                self.collapsed += 1
+        if not owner:
+            return future.result()
+
+        future.set_running()
+        try:
+            ret = func(*args, **kwargs)
+        except:
+            exc_info = sys.exc_info()
+            self._forget(key, future)
+            future.set_exc_info(exc_info)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        self._forget(key, future)
+        future.set_result(ret)
+        return ret
+
+    def submit(self, key, submit, *args, **kwargs):
+        '''异步调用: 相同key的调用正在执行时返回它的Future，否则返回submit(*args, **kwargs)提交的Future
+
+        @param submit: 提交任务并返回executor.Future的函数，如：executor.Executor.submit_keyed
+        '''
+        with self._lock:
+            self.calls += 1
+            future = self._flights.get(key)
+            if future is not None:
+                self.collapsed += 1
+                return future
+            future = self._flights[key] = submit(*args, **kwargs)
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'collapsed': self.collapsed, 'inflight': len(self._flights)}
+
+
+def _benchmark(calls = 500, statuses = 10, threads = 100):
+    '''threads个线程并发调用calls次statuses/show(id在statuses条微博中循环)，比较合并前后的请求数.
+    通过transport.Player回放(不联网)，每个请求模拟50ms的响应时间
+    '''
+    import json
+    import urlparse
+    import Queue
+    import transport
+    import weibo2
+
+    requests = [ ]
+
+    def show(http_method, scheme, netloc, path, body = None):
+        requests.append(path)
+        time.sleep(0.05)
+        query = dict(urlparse.parse_qsl(path.partition('?')[2]))
+        return 200, 'OK', json.dumps({'id': int(query['id']), 'text': 'status %s' % query['id']})
+
+    token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+    with transport.use(transport.Player(transport.Cassette(), show)):
+        for group in (None, Group()):
+            api = weibo2.OAuth2Api('', '', '', singleflight = group)
+            ids = Queue.Queue()
+            for i in xrange(calls):
+                ids.put(i % statuses + 1)
+
+            def work():
+                while True:
+                    try:
+                        id = ids.get_nowait()
+                    except Queue.Empty:
+                        return
+                    assert api.statuses.show.get(token, id = id).id == id
+
+            del requests[:]
+            start = time.time()
+            workers = [threading.Thread(target = work) for _ in xrange(threads)]
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+            print '%s: statuses/show calls: %d, http requests: %d, %.3fs' % ('singleflight' if group else 'direct',
+                                                                             calls, len(requests), time.time() - start)
+            if group:
+                print group.stats()
+
+
+if __name__ == '__main__':
+    _benchmark()
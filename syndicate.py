@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: syndicate.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        同一条微博(文字 + 图片)同时发到多个平台: 新浪(statuses/upload), 腾讯(t/add_pic), 网易(statuses/upload).
+        原先是依次调用三个平台的接口，每次都重新读一遍图片文件，总耗时是三个平台的耗时之和。
+        说明：
+            . 图片只读一次(multipart.Media)，各平台的请求体共用同一份内容
+            . 提交之前按各平台的大小限制检查、压缩图片(参考imageprep)，无法处理时直接抛出WeiBoError，不发送任何请求
+            . 各平台的请求在线程池中并行执行，总耗时取决于最慢的平台
+            . post返回Report: 每个平台的结果(成功时为统一格式的微博，失败时为异常)、耗时、尝试次数
+            . report.retry(): 只重发失败的平台，成功的结果保留
+            . 发表微博不是幂等的，自动重试只由各模块的retry_policy决定(只重试rejected的错误)；
+              report.retry()由调用方确认之后再调用
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        syndicator = Syndicator([(weibo2_api, weibo2_token), (qweibo2_api, qweibo2_token), (tweibo2_api, tweibo2_token)])
+        report = syndicator.post(u'同时发到三个平台', '/tmp/test.jpg')
+        print report
+        if not report.ok:
+            report = report.retry()
+
+        python syndicate.py # 运行串行发布和并行发布的耗时对比
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import sys
+import time
+
+import executor
+import imageprep
+
+
+class Result(object):
+    def __init__(self, target, status = None, error = None, latency = 0.0, attempts = 1):
+        '''一个平台的发布结果
+
+        @param target: (api, token)
+        @param status: 成功时为统一格式的微博，参考oauth2.Platform.status
+        @param error: 失败时的异常
+        @param latency: 耗时(秒)
+        @param attempts: 尝试的次数(report.retry()会增加)
+        '''
+        self.target = target
+        self.status = status
+        self.error = error
+        self.latency = latency
+        self.attempts = attempts
+
+    @property
+    def platform(self):
+        return self.target[0].platform.name
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return '<%s ok id=%s %.3fs>' % (self.platform, self.status.id, self.latency)
+        return '<%s failed %s: %s %.3fs>' % (self.platform, type(self.error).__name__, self.error, self.latency)
+
+
+class Report(object):
+    def __init__(self, syndicator, text, pic, results, elapsed):
+        '''
+
+        @param results: 与targets顺序相同的Result列表
+        @param elapsed: 从提交到所有平台完成的耗时(秒)
+        '''
+        self.syndicator = syndicator
+        self.text = text
+        self.pic = pic
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return all(result.ok for result in self.results)
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
+
+    def retry(self):
+        '''重发失败的平台，返回新的Report. 成功的平台不会重复发表
+        '''
+        failed = self.failed
+        if not failed:
+            return self
+        start = time.time()
+        retried = dict(zip([id(result) for result in failed], self.syndicator._fan_out([result.target for result in failed], self.text, self.pic)))
+        results = [ ]
+        for result in self.results:
+            if result.ok:
+                results.append(result)
+            else:
+                new = retried[id(result)].result()
+                new.attempts += result.attempts
+                results.append(new)
+        return Report(self.syndicator, self.text, self.pic, results, time.time() - start)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __repr__(self):
+        return '<Report %s %.3fs %r>' % ('ok' if self.ok else '%d failed' % len(self.failed), self.elapsed, self.results)
+
+
+class Syndicator(object):
+    def __init__(self, targets, max_workers = None, workers = None, preprocessor = None):
+        '''
+
+        @param targets: [(api, token), ...], api为各平台的OAuth2Api(weibo2, qweibo2, tweibo2)
+        @param max_workers: 最多同时执行的请求数，默认每个平台一个
+        @param workers: 共用的executor.Executor, 指定该参数时忽略max_workers
+        @param preprocessor: 图片预处理，默认为imageprep.default_preprocessor
+        '''
+        self.targets = list(targets)
+        self.workers = workers or executor.Executor(max_workers or max(1, len(self.targets)))
+        self.preprocessor = preprocessor or imageprep.default_preprocessor
+
+    def _post(self, target, text, pic):
+        api, token = target
+        start = time.time()
+        try:
+            status = api.post_status(token, text, pic)
+        except Exception:
+            return Result(target, error = sys.exc_info()[1], latency = time.time() - start)
+        return Result(target, status, latency = time.time() - start)
+
+    def _fan_out(self, targets, text, pic):
+        # 先处理完所有平台的图片再提交，处理失败时不发送任何请求. 处理结果有缓存，report.retry()时不会重复处理
+        pics = self.preprocessor.fit_all(pic, [api for api, _ in targets]) if pic else [None] * len(targets)
+        return [self.workers.submit_keyed(target[0].platform.host, self._post, target, text, pic) for target, pic in zip(targets, pics)]
+
+    def post(self, text, pic = None):
+        '''发到所有平台，等待全部完成后返回Report. 各平台的错误记录在Report中，不抛出
+
+        @param pic: 图片文件路径或者multipart.Media
+        '''
+        if pic:
+            pic = self.preprocessor.load(pic)   # 只读一次文件
+        start = time.time()
+        futures = self._fan_out(self.targets, text, pic)
+        results = [future.result() for future in futures]
+        return Report(self, text, pic, results, time.time() - start)
+
+    def shutdown(self, wait = True):
+        self.workers.shutdown(wait)
+
+
+def _benchmark():
+    '''模拟新浪0.3秒、腾讯0.5秒、网易0.2秒(上传和发表两次请求)的响应时间，比较串行发布和并行发布的耗时.
+    通过transport.Player回放(不联网)
+    '''
+    import os
+    import tempfile
+    import transport
+    import weibo2
+    import qweibo2
+    import tweibo2
+
+    latencies = {'api.weibo.com': 0.3, 'open.t.qq.com': 0.5, 'api.t.163.com': 0.2}
+
+    def respond(http_method, scheme, netloc, path, body = None):
+        time.sleep(latencies[netloc])
+        if 'upload' in path and netloc == 'api.t.163.com':
+            return 200, 'OK', '{"upload_image_url": "http://img.t.163.com/1.jpg"}'
+        if netloc == 'open.t.qq.com':
+            return 200, 'OK', '{"ret": 0, "data": {"id": "1", "time": 1}}'
+        return 200, 'OK', '{"id": 1, "text": "", "user": {"screen_name": ""}}'
+
+    fd, pic = tempfile.mkstemp(suffix = '.jpg')
+    os.write(fd, os.urandom(512 * 1024))
+    os.close(fd)
+    try:
+        with transport.use(transport.Player(transport.Cassette(), respond)):
+            targets = [
+                (weibo2.OAuth2Api('', '', ''), weibo2.OAuthToken('', '', 'token', 3600, 'uid')),
+                (qweibo2.OAuth2Api('', '', ''), qweibo2.OAuthToken('', '', 'token', 3600, 'openid', 'name', 'nick', '')),
+                (tweibo2.OAuth2Api('', '', ''), tweibo2.OAuthToken('', '', 'token', 3600, 'uid')),
+            ]
+            start = time.time()
+            for api, token in targets:
+                api.post_status(token, u'串行发布', pic)
+            print 'sequential: %.3fs' % (time.time() - start)
+
+            syndicator = Syndicator(targets)
+            try:
+                report = syndicator.post(u'并行发布', pic)
+            finally:
+                syndicator.shutdown()
+            print 'syndicate:  %.3fs' % report.elapsed
+            for result in report:
+                print '    %-8s %.3fs' % (result.platform, result.latency)
+    finally:
+        os.remove(pic)
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/support.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        各测试共用的辅助函数. 所有测试都不访问真实的api，请求由transport.Player在进程内回放。
+        说明：
+            . 在项目根目录运行: python -m unittest discover
+            . 并发的测试等待所有线程都进入被测的调用之后才返回结果，不依赖sleep的时长
+
+        python版本要求：python2.6+，不支持python3.x
+'''
+
+import json
+import time
+import threading
+
+import transport
+
+
+def wait(predicate, timeout = 5):
+    '''等待predicate()为真，最多timeout秒. 返回predicate()
+    '''
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.001)
+    return predicate()
+
+
+def run_threads(func, count):
+    '''在count个线程中同时调用func，等待全部结束
+    '''
+    threads = [threading.Thread(target = func) for _ in xrange(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def player(*responses):
+    '''按顺序返回responses的transport.Player(最后一个重复使用). 每个响应是(status, json对象)，
+    player.seen记录每个请求: (方法, host, 路径, 请求体)
+    '''
+    seen = [ ]
+    queue = list(responses)
+
+    def respond(http_method, scheme, netloc, path, body = None):
+        seen.append((http_method, netloc, path, body))
+        status, obj = queue.pop(0) if len(queue) > 1 else queue[0]
+        return status, 'OK' if status == 200 else 'Error', json.dumps(obj)
+    ret = transport.Player(transport.Cassette(), respond)
+    ret.seen = seen
+    return ret
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_apipath.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        apipath: 调用链不可变(多线程共享api对象时互不影响)，路径解析和别名
+'''
+
+import copy
+import threading
+import unittest
+
+import apipath
+from tests.support import run_threads
+
+
+class _Owner(object):
+    def __init__(self):
+        self.parser = apipath.PathParser({'delete': 'del'})
+
+    def __getattr__(self, attr):
+        return apipath.ApiPath(self, (attr, ))
+
+    def _invoke(self, attrs, token, kwargs):
+        return self.parser.parse(attrs), token, kwargs
+
+
+class ApiPathTest(unittest.TestCase):
+    def test_call(self):
+        api = _Owner()
+        self.assertEqual(api.statuses.update.post('token', status = 'test'),
+                         (('POST', 'statuses/update'), 'token', {'status': 'test'}))
+        self.assertEqual(api.favorites.delete.post()[0], ('POST', 'favorites/del'))
+        self.assertEqual(repr(api.statuses.update), '<ApiPath statuses.update>')
+
+    def test_immutable(self):
+        api = _Owner()
+        statuses = api.statuses
+        self.assertEqual(statuses.user_timeline.get()[0], ('GET', 'statuses/user_timeline'))
+        self.assertEqual(statuses.home_timeline.get()[0], ('GET', 'statuses/home_timeline'))   # 不会累积上一次的属性
+        errors = [ ]
+        lock = threading.Lock()
+
+        def work():
+            name = threading.current_thread().name
+            for _ in xrange(200):
+                ret = getattr(statuses, name).get()[0]
+                if ret != ('GET', 'statuses/' + name):
+                    with lock:
+                        errors.append(ret)
+        run_threads(work, 8)
+        self.assertEqual(errors, [ ])
+
+    def test_special_attrs(self):
+        path = _Owner().statuses
+        self.assertRaises(AttributeError, getattr, path, '__deepcopy__')
+        self.assertEqual(copy.copy(path)._attrs, ('statuses', ))
+
+    def test_iter_unsupported(self):
+        self.assertRaises(TypeError, _Owner().statuses.home_timeline.iter)
+
+
+class PathParserTest(unittest.TestCase):
+    def test_cache(self):
+        parser = apipath.PathParser()
+        self.assertTrue(parser.parse(('users', 'show', 'get')) is parser.parse(('users', 'show', 'get')))
+        for i in xrange(apipath.PathParser._MAX_CACHE + 1):     # 动态拼接的路径不会让缓存无限增长
+            parser.parse(('users', str(i), 'get'))
+        self.assertTrue(len(parser._cache) <= apipath.PathParser._MAX_CACHE)
+
+
+if __name__ == '__main__':
+    unittest.main()
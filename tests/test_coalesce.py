@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_coalesce.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        coalesce: 并发的users/show合并成一次users/show_batch，其他参数的值不能hash(list、dict)时也能合并
+'''
+
+import json
+import urlparse
+import unittest
+
+import errors
+import transport
+import coalesce
+import weibo2
+from tests.support import run_threads
+
+
+class CoalesceTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = [ ]
+        self.api = weibo2.OAuth2Api('', '', '', coalescer = coalesce.Coalescer(window = 0.2))
+        self.token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+
+    def _show_batch(self, http_method, scheme, netloc, path, body = None):
+        self.requests.append(path)
+        query = dict(urlparse.parse_qsl(path.partition('?')[2]))
+        users = [{'id': int(uid), 'screen_name': 'user%s' % uid} for uid in query['uids'].split(',') if uid != '404']
+        return 200, 'OK', json.dumps({'users': users})
+
+    def test_users_show(self):
+        uids = range(1, 11) + [404]
+        results = { }
+
+        def work():
+            uid = uids.pop()
+            try:
+                results[uid] = self.api.users.show.get(self.token, uid = uid).screen_name
+            except errors.ApiError:
+                results[uid] = None
+        with transport.use(transport.Player(transport.Cassette(), self._show_batch)):
+            run_threads(work, len(uids))
+        self.assertEqual(len(self.requests), 1)
+        self.assertTrue('users/show_batch' in self.requests[0], self.requests[0])
+        self.assertEqual(results.pop(404), None)
+        self.assertEqual(results, dict((uid, 'user%d' % uid) for uid in xrange(1, 11)))
+
+    def test_unhashable_params(self):
+        uids = range(1, 6)
+        results = { }
+
+        def work():
+            uid = uids.pop()
+            results[uid] = self.api.users.show.get(self.token, uid = uid, trim = [u'状态', 'status']).screen_name
+        with transport.use(transport.Player(transport.Cassette(), self._show_batch)):
+            run_threads(work, len(uids))
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(results, dict((uid, 'user%d' % uid) for uid in xrange(1, 6)))
+
+    def test_match(self):
+        platform = self.api.platform
+        self.assertEqual(self.api.coalescer.match(platform, 'GET', 'users/show', {'uid': u'1', 'extra': {'a': 1}}),
+                         ('uid', '1', {'extra': {'a': 1}}))
+        self.assertEqual(self.api.coalescer.match(platform, 'GET', 'users/show', {'uid': [1, 2]}), None)
+        self.assertEqual(self.api.coalescer.match(platform, 'POST', 'users/show', {'uid': 1}), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_errors.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        errors: 错误码到异常类型的映射，RetryPolicy和RetryBudget，各平台返回结果中的错误(包括腾讯200响应中的ret)
+'''
+
+import unittest
+
+import errors
+import transport
+import weibo
+import tweibo
+import weibo2
+import qweibo2
+from tests.support import player
+
+
+_WEIBO_TOKEN = weibo2.OAuthToken('appkey', 'appsecret', 'access_token', 3600, '2617375872')
+_QQ_TOKEN = qweibo2.OAuthToken('appkey', 'appsecret', 'access_token', 3600, 'openid', 'darkbull', 'DarkBull', '')
+
+
+class MakeErrorTest(unittest.TestCase):
+    def test_codes(self):
+        for code, status, cls, rejected in ((10023, 403, errors.RateLimitError, True),
+                                            (21327, 401, errors.AuthError, False),
+                                            (None, 401, errors.AuthError, False),
+                                            (10002, 200, errors.ServerError, True),
+                                            (None, 503, errors.ServerError, True),
+                                            (None, 500, errors.ServerError, False),
+                                            (20019, 400, errors.ApiError, False)):
+            ex = errors.make_error('message', code, status, 'statuses/update')
+            self.assertEqual((type(ex), ex.rejected), (cls, rejected), (code, status))
+            self.assertEqual(ex.request, 'statuses/update')
+
+    def test_http_code_as_error_code(self):
+        # 新浪Oauth1.0、网易的error_code就是http状态码
+        ex = errors.make_error('message', '401')
+        self.assertTrue(isinstance(ex, errors.AuthError))
+        self.assertEqual(ex.status, 401)
+
+    def test_from_response(self):
+        ex = errors.from_response(400, 'Bad Request', '{"error_code": 21327, "error": "expired_token", "request": "/users/show"}', 'url')
+        self.assertTrue(isinstance(ex, errors.AuthError))
+        self.assertEqual((ex.error_code, ex.request), (21327, '/users/show'))
+        ex = errors.from_response(502, 'Bad Gateway', '<html>', 'url')
+        self.assertTrue(isinstance(ex, errors.ServerError))
+        self.assertTrue(ex.retryable)
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def _failing(self, exceptions):
+        calls = [ ]
+
+        def func():
+            calls.append(1)
+            if len(calls) <= len(exceptions):
+                raise exceptions[len(calls) - 1]
+            return 'ok'
+        return func, calls
+
+    def test_retry_get(self):
+        policy = errors.RetryPolicy(max_attempts = 3, backoff = 0)
+        func, calls = self._failing([errors.ServerError('busy'), errors.NetworkError('timeout')])
+        self.assertEqual(policy.call('GET', func), 'ok')
+        self.assertEqual((len(calls), policy.stats()['retries']), (3, 2))
+
+    def test_post_only_rejected(self):
+        policy = errors.RetryPolicy(backoff = 0)
+        func, calls = self._failing([errors.ServerError('busy')])
+        self.assertRaises(errors.ServerError, policy.call, 'POST', func)
+        func, calls = self._failing([errors.ServerError('paused', rejected = True)])
+        self.assertEqual(policy.call('POST', func), 'ok')
+
+    def test_permanent_error(self):
+        policy = errors.RetryPolicy(backoff = 0)
+        func, calls = self._failing([errors.AuthError('expired')])
+        self.assertRaises(errors.AuthError, policy.call, 'GET', func)
+        self.assertEqual(len(calls), 1)
+
+    def test_budget(self):
+        policy = errors.RetryPolicy(backoff = 0, budget = errors.RetryBudget(ratio = 0, reserve = 1))
+        func, _ = self._failing([errors.ServerError('busy')])
+        self.assertEqual(policy.call('GET', func), 'ok')
+        func, _ = self._failing([errors.ServerError('busy')])
+        self.assertRaises(errors.ServerError, policy.call, 'GET', func)
+        self.assertEqual(policy.stats(), {'retries': 1, 'exhausted': 1})
+
+
+class PlatformErrorTest(unittest.TestCase):
+    def tearDown(self):
+        weibo.retry_policy = tweibo.retry_policy = weibo2.retry_policy = qweibo2.retry_policy = None
+
+    def test_error_code(self):
+        with transport.use(player((200, {'error_code': 21327, 'error': 'expired_token', 'request': '/users/show.json'}))):
+            self.assertRaises(errors.AuthError, weibo2.OAuth2Api('', '', '').users.show.get, _WEIBO_TOKEN, uid = 1)
+
+    def test_qq_ret(self):
+        # 腾讯出错时http状态码仍然是200，按ret映射成异常
+        api = qweibo2.OAuth2Api('', '', '')
+        for ret, cls in ((1, errors.ApiError), (2, errors.RateLimitError), (3, errors.AuthError), (4, errors.ServerError)):
+            with transport.use(player((200, {'ret': ret, 'errcode': 36, 'msg': 'error', 'data': None}))):
+                try:
+                    api.user.info.get(_QQ_TOKEN)
+                except errors.WeiBoError as ex:
+                    self.assertEqual((type(ex), ex.error_code, ex.status), (cls, 36, 200))
+                else:
+                    self.fail('ret=%d not raised' % ret)
+
+    def test_qq_ret_retried(self):
+        qweibo2.retry_policy = errors.RetryPolicy(backoff = 0)
+        transport_ = player((200, {'ret': 2, 'errcode': 0, 'msg': 'rate limited'}), (200, {'ret': 0, 'msg': 'ok', 'data': {'nick': 'DarkBull'}}))
+        with transport.use(transport_):
+            self.assertEqual(qweibo2.OAuth2Api('', '', '').user.info.get(_QQ_TOKEN).data.nick, 'DarkBull')
+        self.assertEqual(len(transport_.seen), 2)
+        self.assertEqual(qweibo2.retry_policy.stats()['retries'], 1)
+
+    def test_oauth1_retry(self):
+        # Oauth1.0的三个模块共用oauth1.Sender，读取各自模块的retry_policy
+        for module, token in ((weibo, weibo.OAuthToken('appkey', 'appsecret', 'oauth_token', 'oauth_token_secret', 2617375872)),
+                              (tweibo, tweibo.OAuthToken('appkey', 'appsecret', 'oauth_token', 'oauth_token_secret', 'verified'))):
+            module.retry_policy = errors.RetryPolicy(backoff = 0)
+            transport_ = player((503, {'error': 'service unavailable'}), (200, {'id': 1}))
+            with transport.use(transport_):
+                self.assertEqual(module._call('GET', 'users/show', token, id = '1').id, 1)
+            self.assertEqual(len(transport_.seen), 2, module.__name__)
+            module.retry_policy = None
+            with transport.use(player((401, {'error_code': 401, 'error': 'unauthorized'}))):
+                self.assertRaises(errors.AuthError, module._call, 'GET', 'users/show', token, id = '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_executor.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        executor: Future, Executor的并发限制、取消、线程的创建，api.batch的批量调用，AsyncOAuth2Api的调用和关闭
+'''
+
+import json
+import threading
+import unittest
+
+import errors
+import executor
+import transport
+import weibo2
+from tests.support import wait, player
+
+
+class FutureTest(unittest.TestCase):
+    def test_callbacks(self):
+        future = executor.Future()
+        done = [ ]
+        future.add_done_callback(done.append)
+        self.assertRaises(executor.TimeoutError, future.result, 0.01)
+        future.set_result(1)
+        future.add_done_callback(done.append)   # 已经完成时立即调用
+        self.assertEqual((future.result(), done), (1, [future, future]))
+
+    def test_cancel(self):
+        future = executor.Future()
+        self.assertTrue(future.cancel())
+        self.assertRaises(executor.CancelledError, future.result)
+        self.assertFalse(future.set_running())
+        running = executor.Future()
+        running.set_running()
+        self.assertFalse(running.cancel())
+
+
+class ExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.workers = executor.Executor(4, max_per_key = 2)
+
+    def tearDown(self):
+        self.workers.shutdown()
+
+    def test_result(self):
+        self.assertEqual(self.workers.submit(lambda x, y: x + y, 1, y = 2).result(5), 3)
+        future = self.workers.submit(lambda: 1 / 0)
+        self.assertRaises(ZeroDivisionError, future.result, 5)
+        self.assertTrue(isinstance(future.exception(), ZeroDivisionError))
+
+    def test_max_per_key(self):
+        lock = threading.Lock()
+        running = [0, 0]    # 当前数, 最大数
+
+        def task():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            wait(lambda: running[1] >= 2, 0.05)
+            with lock:
+                running[0] -= 1
+        futures = [self.workers.submit_keyed('api.weibo.com', task) for _ in xrange(8)]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(running[1], 2)
+
+    def test_cancel_waiting(self):
+        gate = threading.Event()
+        first = self.workers.submit_keyed('host', gate.wait)
+        second = self.workers.submit_keyed('host', gate.wait)
+        third = self.workers.submit_keyed('host', lambda: 3)   # 超过max_per_key，排队
+        self.assertTrue(third.cancel())
+        self.assertRaises(executor.CancelledError, third.result, 5)
+        self.assertTrue(wait(first.running))
+        self.assertFalse(first.cancel())
+        gate.set()
+        first.result(5)
+        second.result(5)
+
+    def test_spawn_behind_idle_worker(self):
+        # 已有一个空闲线程时同时提交的任务也要分配足够的线程，互相等待的任务不能串行执行
+        self.workers.submit(lambda: None).result(5)
+        self.assertTrue(wait(lambda: self.workers._idle == 1))
+        lock = threading.Lock()
+        arrived = [0]
+        everyone = threading.Event()
+
+        def task():
+            with lock:
+                arrived[0] += 1
+                if arrived[0] == 3:
+                    everyone.set()
+            everyone.wait(5)
+            return everyone.is_set()
+        futures = [self.workers.submit(task) for _ in xrange(3)]
+        self.assertEqual([future.result(10) for future in futures], [True] * 3)
+
+    def test_shutdown(self):
+        future = self.workers.submit(lambda: 1)
+        self.workers.shutdown()
+        self.assertEqual(future.result(), 1)
+        self.assertRaises(RuntimeError, self.workers.submit, lambda: 2)
+
+    def test_as_completed(self):
+        gate = threading.Event()
+        slow = self.workers.submit(gate.wait)
+        fast = self.workers.submit(lambda: 'fast')
+        completed = executor.as_completed([slow, fast])
+        self.assertTrue(next(completed) is fast)
+        gate.set()
+        self.assertTrue(next(completed) is slow)
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.api = weibo2.OAuth2Api('', '', '')
+        self.token = weibo2.OAuthToken('', '', 'access_token', 3600, '2617375872')
+        self.ready = lambda: True  # 返回响应之前等待的条件
+
+    def _show(self, http_method, scheme, netloc, path, body = None):
+        wait(self.ready)
+        if 'uid=404' in path:
+            return 400, 'Bad Request', json.dumps({'error_code': 20003, 'error': 'user does not exists', 'request': '/2/users/show.json'})
+        return 200, 'OK', json.dumps({'id': 1, 'screen_name': 'darkbull'})
+
+    def test_as_completed(self):
+        with transport.use(transport.Player(transport.Cassette(), self._show)):
+            with self.api.batch(max_workers = 4) as b:
+                for uid in range(10) + [404]:
+                    b.users.show.get(self.token, uid = uid)
+                slots = list(b.as_completed(5))
+        self.assertEqual(len(slots), 11)
+        failed = [slot for slot in slots if slot.exception()]
+        self.assertEqual(len(failed), 1)
+        self.assertRaises(errors.ApiError, failed[0].result)
+        self.assertEqual(set(slot.result().screen_name for slot in slots if slot not in failed), set(['darkbull']))
+
+    def test_error_in_block(self):
+        # with块内出错时，还没开始的调用被取消
+        rest = [ ]
+        self.ready = lambda: rest and all(slot.cancelled() for slot in rest)
+        try:
+            with transport.use(transport.Player(transport.Cassette(), self._show)):
+                with self.api.batch(max_workers = 1) as b:
+                    first = b.users.show.get(self.token, uid = 1)
+                    rest.extend(b.users.show.get(self.token, uid = uid) for uid in range(2, 6))
+                    wait(first.running)
+                    raise KeyError('stop')
+        except KeyError:
+            pass
+        self.assertEqual(first.result().screen_name, 'darkbull')
+        self.assertTrue(all(slot.cancelled() for slot in rest))
+
+
+class AsyncApiTest(unittest.TestCase):
+    def test_calls(self):
+        token = weibo2.OAuthToken('', '', 'access_token', 3600, '2617375872')
+        transport_ = player((200, {'id': 1, 'screen_name': 'darkbull'}))
+        with transport.use(transport_):
+            with weibo2.AsyncOAuth2Api('', '', '', max_workers = 4) as api:
+                futures = [api.users.show.get(token, uid = uid) for uid in xrange(20)]
+                self.assertEqual(set(future.result(5).screen_name for future in futures), set(['darkbull']))
+        self.assertEqual(len(transport_.seen), 20)
+        # 关闭之后工作线程退出，不再接受新的调用
+        self.assertFalse([t for t in api.workers._workers if t.is_alive()])
+        self.assertRaises(RuntimeError, api.users.show.get, token, uid = 1)
+
+    def test_shared_workers(self):
+        # 共用的workers不由api关闭
+        workers = executor.Executor(2)
+        try:
+            api = weibo2.AsyncOAuth2Api('', '', '', workers = workers)
+            api.close()
+            self.assertEqual(workers.submit(lambda: 1).result(5), 1)
+        finally:
+            workers.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
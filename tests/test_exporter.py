@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_exporter.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        exporter: 两种格式导出后能完整读回，中断后从检查点继续只请求没有写入的页；pager.pages逐页返回
+'''
+
+import json
+import shutil
+import urlparse
+import tempfile
+import unittest
+from os.path import join
+
+import transport
+import exporter
+import pager
+import weibo2
+
+
+class _Crash(Exception):
+    pass
+
+
+class ExporterTest(unittest.TestCase):
+    statuses = 250
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.crash_after = None
+        self.api = weibo2.OAuth2Api('', '', '')
+        self.token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _user_timeline(self, http_method, scheme, netloc, path, body = None):
+        # 按max_id翻页. 请求数达到crash_after时模拟中断
+        self.requests += 1
+        if self.crash_after is not None and self.requests > self.crash_after:
+            raise _Crash()
+        query = dict(urlparse.parse_qsl(path.partition('?')[2]))
+        max_id = int(query.get('max_id', self.statuses))
+        page = [{'id': id, 'created_at': exporter._format_time(1300000000 + id), 'text': u'第%d条微博' % id} for id in
+                xrange(max_id, max(max_id - int(query.get('count', 20)), 0), -1)]
+        return 200, 'OK', json.dumps({'statuses': page})
+
+    def _export(self, writer, checkpoint):
+        self.requests = 0
+        with transport.use(transport.Player(transport.Cassette(), self._user_timeline)):
+            return exporter.export(self.api, self.token, 'statuses/user_timeline', writer, checkpoint, count = 100)
+
+    def _ids(self, name):
+        if name == 'ndjson':
+            return [json.loads(line)['id'] for line in open(join(self.tmp, 'timeline.ndjson'))]
+        rows = list(exporter.read_columnar(join(self.tmp, 'columnar'), chunk = 7))
+        self.assertEqual(rows[0][2], {u'id': self.statuses, u'created_at': unicode(exporter._format_time(1300000000 + self.statuses)),
+                                      u'text': u'第%d条微博' % self.statuses})
+        self.assertEqual(rows[0][1], 1300000000 + self.statuses)
+        return [row[0] for row in rows]
+
+    def _writer(self, name):
+        if name == 'ndjson':
+            return exporter.NdjsonWriter(join(self.tmp, 'timeline.ndjson'))
+        return exporter.ColumnarWriter(join(self.tmp, 'columnar'))
+
+    def test_roundtrip(self):
+        for name in ('ndjson', 'columnar'):
+            self.assertEqual(self._export(self._writer(name), None), self.statuses)
+            self.assertEqual(self._ids(name), range(self.statuses, 0, -1), name)
+
+    def test_resume(self):
+        for name in ('ndjson', 'columnar'):
+            checkpoint = join(self.tmp, name + '.ckpt')
+            self.crash_after = 2
+            self.assertRaises(_Crash, self._export, self._writer(name), checkpoint)
+            self.crash_after = None
+            self.assertEqual(self._export(self._writer(name), checkpoint), self.statuses)
+            self.assertEqual(self.requests, 2, name)    # 只请求没有写入的最后一页和结束的空页
+            self.assertEqual(self._ids(name), range(self.statuses, 0, -1), name)
+            self.assertEqual(self._export(self._writer(name), checkpoint), self.statuses)
+            self.assertEqual(self.requests, 0, name)
+
+
+    def test_pages(self):
+        self.requests = 0
+        fetch = lambda params: self.api.platform.call('GET', 'statuses/user_timeline', self.token, **params)
+        with transport.use(transport.Player(transport.Cassette(), self._user_timeline)):
+            pages = [(len(items), next_params) for items, next_params in
+                     pager.pages(fetch, {'count': 100}, self.api.platform.cursor('statuses/user_timeline'), prefetch = False)]
+        self.assertEqual([size for size, _ in pages], [100, 100, 50, 0])
+        self.assertEqual(pages[0][1]['max_id'], self.statuses - 100)
+        self.assertEqual(pages[-1][1], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_httpool.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        httpool: 通过本地的transport.ReplayServer检查连接的复用、失效连接的重发、maxsize和idle_timeout
+'''
+
+import json
+import socket
+import unittest
+
+import httpool
+import transport
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.paths = [ ]
+
+        def respond(http_method, scheme, netloc, path, body = None):
+            self.paths.append(path)
+            return 200, 'OK', json.dumps({'path': path})
+        self.server = transport.ReplayServer(transport.Cassette(), fallback = respond).start()
+        self.pool = httpool.ConnectionPool(maxsize = 2)
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.stop()
+
+    def _get(self, path, headers = None, pool = None):
+        status, _, html = (pool or self.pool).request('GET', 'http', self.server.address, path, headers = headers)
+        self.assertEqual((status, json.loads(html)['path']), (200, path))
+
+    def test_reuse(self):
+        for i in range(5):
+            self._get('/%d' % i)
+        self.assertEqual(self.pool.stats(), {'hits': 4, 'misses': 1, 'evictions': 0, 'reconnects': 0, 'idle': 1})
+
+    def test_reconnect(self):
+        # 空闲连接已被关闭(如：服务器端超时)：新建连接重发一次
+        self._get('/1')
+        conn, _ = self.pool._idle[('http', self.server.address)][0]
+        conn.sock.shutdown(socket.SHUT_RDWR)
+        self._get('/2')
+        self.assertEqual(self.pool.stats()['reconnects'], 1)
+        self.assertEqual(self.paths, ['/1', '/2'])
+
+    def test_connection_close(self):
+        self._get('/1', headers = {'Connection': 'close'})
+        self.assertEqual(self.pool.stats()['idle'], 0)
+
+    def test_maxsize(self):
+        conns = [self.pool._get('http', self.server.address, 10)[0] for _ in range(3)]
+        for conn in conns:
+            conn.connect()
+            self.pool._put('http', self.server.address, conn)
+        self.assertEqual(self.pool.stats()['idle'], 2)
+        self.assertEqual(self.pool.stats()['evictions'], 1)
+
+    def test_idle_timeout(self):
+        pool = httpool.ConnectionPool(idle_timeout = 0)
+        try:
+            self._get('/1', pool = pool)
+            self._get('/2', pool = pool)
+            self.assertEqual((pool.hits, pool.misses, pool.evictions), (0, 2, 1))
+        finally:
+            pool.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
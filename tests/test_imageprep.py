@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_imageprep.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        imageprep: jpeg、png的无损处理(保留方向，图像数据不变)，fit的大小检查、缓存和codec，fit_all共用最小限制的结果
+'''
+
+import os
+import zlib
+import struct
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+import errors
+import imageprep
+import multipart
+
+
+def _segment(marker, payload):
+    return '\xff' + chr(marker) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _jpeg(comment_size = 0, orientation = None):
+    # 不能显示的jpeg，只有段结构: SOI, APP0, APP1(EXIF), COM, DQT, SOS + 图像数据, EOI
+    parts = ['\xff\xd8', _segment(0xe0, 'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00')]
+    if orientation is not None:
+        tiff = 'II\x2a\x00' + struct.pack('<IHHHIHHI', 8, 1, 0x0112, 3, 1, orientation, 0, 0)
+        parts.append(_segment(0xe1, 'Exif\x00\x00' + tiff + 'x' * 1000))
+    if comment_size:
+        parts.append(_segment(0xfe, 'c' * comment_size))
+    parts.append(_segment(0xdb, '\x00' + '\x01' * 64))
+    parts.append(_segment(0xda, '\x01\x01\x00\x00\x3f\x00') + 'image data' * 100 + '\xff\xd9')
+    return ''.join(parts)
+
+
+def _chunk(tp, data):
+    return struct.pack('>I', len(data)) + tp + data + struct.pack('>I', zlib.crc32(tp + data) & 0xffffffff)
+
+
+def _png(text_size = 0):
+    raw = ''.join('\x00' + '\x80' * 300 for _ in xrange(100))   # 100行，每行100个rgb像素
+    chunks = [_chunk('IHDR', struct.pack('>IIBBBBB', 100, 100, 8, 2, 0, 0, 0))]
+    if text_size:
+        chunks.append(_chunk('tEXt', 'Comment\x00' + 't' * text_size))
+    chunks.append(_chunk('IDAT', zlib.compress(raw, 0)))
+    chunks.append(_chunk('IEND', ''))
+    return '\x89PNG\r\n\x1a\n' + ''.join(chunks), raw
+
+
+def _idat(png):
+    pos, data = 8, [ ]
+    while pos < len(png):
+        length, tp = struct.unpack('>I4s', png[pos:pos + 8])
+        if tp == 'IDAT':
+            data.append(png[pos + 8:pos + 8 + length])
+        pos += 12 + length
+    return zlib.decompress(''.join(data))
+
+
+class StripTest(unittest.TestCase):
+    def test_jpeg(self):
+        data = _jpeg(comment_size = 5000, orientation = 6)
+        stripped = imageprep.strip_jpeg(data)
+        self.assertTrue(len(stripped) < len(data) - 5000)
+        self.assertTrue(stripped.endswith(data[data.index('\xff\xda'):]))  # 图像数据不变
+        self.assertTrue('JFIF' in stripped and 'c' * 100 not in stripped)
+        app1 = stripped.index('\xff\xe1')
+        self.assertEqual(imageprep._exif_orientation(stripped[app1 + 4:]), 6)
+        self.assertFalse('\xff\xe1' in imageprep.strip_jpeg(_jpeg(orientation = 1)))  # 默认方向不需要保留
+        self.assertEqual(imageprep.strip_jpeg('GIF89a'), None)
+
+    def test_png(self):
+        data, raw = _png(text_size = 1000)
+        stripped = imageprep.strip_png(data)
+        self.assertTrue(len(stripped) < len(data) // 10)
+        self.assertFalse('tEXt' in stripped)
+        self.assertEqual(_idat(stripped), raw)
+        self.assertEqual(imageprep.strip_png(data[:len(data) // 2]), None)    # 不完整的文件
+
+
+class PreprocessorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _file(self, name, data):
+        path = join(self.tmp, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_fit_path(self):
+        path = self._file('small.jpg', _jpeg(comment_size = 2000))
+        self.assertEqual(imageprep.Preprocessor().fit(path, 1024, 1024 * 1024), path)   # 不超出限制时不读取文件
+        self.assertRaises(errors.WeiBoError, imageprep.Preprocessor().fit, join(self.tmp, 'missing.jpg'))
+        self.assertRaises(errors.WeiBoError, imageprep.Preprocessor().fit, path, 1024 * 1024, 2 * 1024 * 1024)
+
+    def test_shrink_cached(self):
+        path = self._file('big.jpg', _jpeg(comment_size = 60000))
+        preprocessor = imageprep.Preprocessor()
+        media = preprocessor.fit(path, 0, 10 * 1024)
+        self.assertTrue(isinstance(media, multipart.Media) and len(media) <= 10 * 1024)
+        self.assertTrue(preprocessor.fit(path, 0, 10 * 1024) is media)
+        self.assertEqual((preprocessor.hits, preprocessor.misses), (1, 1))
+
+    def test_codec(self):
+        path = self._file('big.gif', 'GIF89a' + 'g' * 20000)
+        self.assertRaises(errors.WeiBoError, imageprep.Preprocessor().fit, path, 0, 10 * 1024)
+        calls = [ ]
+
+        def codec(media, max_size):
+            calls.append(max_size)
+            return multipart.Media(media.file_path, media.data[:max_size])
+        media = imageprep.Preprocessor(codec).fit(path, 0, 10 * 1024)
+        self.assertEqual((len(media), calls), (10 * 1024, [10 * 1024]))
+
+    def test_fit_all(self):
+        class Target(object):
+            def __init__(self, min_size, max_size):
+                self.pic_min_size, self.pic_max_size = min_size, max_size
+        path = self._file('big.jpg', _jpeg(comment_size = 60000))
+        preprocessor = imageprep.Preprocessor()
+        small, large, unlimited = preprocessor.fit_all(path, [Target(0, 10 * 1024), Target(0, 20 * 1024), Target(0, 1024 * 1024)])
+        self.assertTrue(small is large)     # 超出限制的平台共用按最小限制处理的结果
+        self.assertEqual(len(unlimited), os.path.getsize(path))
+        self.assertEqual(preprocessor.misses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_jsonobj.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        jsonobj: DictObject按属性访问，嵌套的dict、list只包装一次；Decoder的typed模式和自定义的loads
+'''
+
+import json
+import unittest
+
+import jsonobj
+
+
+_STATUS = {'id': 1, 'text': u'选择python', 'user': {'id': 2, 'screen_name': 'darkbull'},
+           'pic_urls': [{'thumbnail_pic': 'http://ww1.sinaimg.cn/thumbnail/1.jpg'}]}
+
+
+class DictObjectTest(unittest.TestCase):
+    def test_attrs(self):
+        status = jsonobj.DictObject(json.dumps(_STATUS))
+        self.assertEqual(status.text, u'选择python')
+        self.assertEqual(status.user.screen_name, 'darkbull')
+        self.assertEqual(status.pic_urls[0].thumbnail_pic, 'http://ww1.sinaimg.cn/thumbnail/1.jpg')
+        self.assertRaises(AttributeError, getattr, status, 'geo')
+        self.assertEqual(status, _STATUS)   # 仍然是dict
+
+    def test_memoized(self):
+        status = jsonobj.DictObject(_STATUS)
+        self.assertTrue(status.user is status.user)
+        self.assertTrue(isinstance(status['user'], jsonobj.DictObject))    # 包装后的结果替换原来的值
+        self.assertTrue(isinstance(status.pic_urls, jsonobj.DictList))
+
+
+class DecoderTest(unittest.TestCase):
+    def test_default(self):
+        ret = jsonobj.default_decoder.decode(json.dumps({'statuses': [_STATUS]}))
+        self.assertTrue(isinstance(ret, jsonobj.DictObject))
+        self.assertTrue(isinstance(ret.statuses[0], jsonobj.DictObject))
+        self.assertTrue(isinstance(jsonobj.default_decoder.decode('[1, 2]'), jsonobj.DictList))
+
+    def test_typed(self):
+        ret = jsonobj.Decoder(typed = True).decode(json.dumps({'statuses': [_STATUS], 'total_number': 1}))
+        status = ret.statuses[0]
+        self.assertTrue(isinstance(status, jsonobj.Status))
+        self.assertTrue(isinstance(status.user, jsonobj.User))
+        self.assertEqual((status.text, status.user.screen_name, status['id']), (u'选择python', 'darkbull', 1))
+        self.assertEqual(status.geo, None)  # 结果中没有的字段
+        self.assertEqual(status.pic_urls[0].thumbnail_pic, 'http://ww1.sinaimg.cn/thumbnail/1.jpg')
+        self.assertRaises(KeyError, lambda: status['unknown'])
+        self.assertEqual(status.as_dict()['user']['screen_name'], 'darkbull')
+        self.assertEqual(ret.total_number, 1)
+
+    def test_loads(self):
+        calls = [ ]
+
+        def loads(html):
+            calls.append(html)
+            return json.loads(html)
+        self.assertEqual(jsonobj.Decoder(loads = loads).decode('{"id": 1}').id, 1)
+        self.assertEqual(calls, ['{"id": 1}'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_mediaindex.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        mediaindex: 记录的持久化、写了一半的记录被截掉、compact
+'''
+
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+import mediaindex
+
+
+_DIGEST = hashlib.sha1('test.jpg').digest()
+
+
+class MediaIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'media.idx')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_reload(self):
+        index = mediaindex.MediaIndex(self.path)
+        index.put('weibo', _DIGEST, u'http://ww1.sinaimg.cn/large/test.jpg')
+        index.put('tweibo', _DIGEST, 'http://img.t.163.com/test.jpg')
+        index.forget('tweibo', _DIGEST)
+        index = mediaindex.MediaIndex(self.path)
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.get('weibo', _DIGEST), 'http://ww1.sinaimg.cn/large/test.jpg')
+        self.assertEqual(index.get('tweibo', _DIGEST), None)
+
+    def test_partial_record(self):
+        index = mediaindex.MediaIndex(self.path)
+        index.put('weibo', _DIGEST, 'http://ww1.sinaimg.cn/large/test.jpg')
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as f:    # 写入时进程退出：只写了头部和平台名称
+            f.write(mediaindex._HEADER.pack(_DIGEST, 6, 40) + 'qweibo')
+        index = mediaindex.MediaIndex(self.path)
+        self.assertEqual(len(index), 1)
+        self.assertEqual(os.path.getsize(self.path), size)
+        # 截掉之后追加的记录能正常加载
+        index.put('qweibo', _DIGEST, 'http://t2.qpic.cn/test.jpg')
+        index = mediaindex.MediaIndex(self.path)
+        self.assertEqual(index.get('qweibo', _DIGEST), 'http://t2.qpic.cn/test.jpg')
+
+    def test_not_index_file(self):
+        with open(self.path, 'wb') as f:
+            f.write('{}')
+        self.assertRaises(ValueError, mediaindex.MediaIndex, self.path)
+
+    def test_compact(self):
+        index = mediaindex.MediaIndex(self.path)
+        for i in range(10):
+            index.put('weibo', _DIGEST, 'http://ww1.sinaimg.cn/large/%d.jpg' % i)
+        size = os.path.getsize(self.path)
+        index.compact()
+        self.assertTrue(os.path.getsize(self.path) < size)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+        self.assertEqual(mediaindex.MediaIndex(self.path).get('weibo', _DIGEST), 'http://ww1.sinaimg.cn/large/9.jpg')
+
+    def test_memory_only(self):
+        index = mediaindex.MediaIndex()
+        index.put('weibo', _DIGEST, 'http://ww1.sinaimg.cn/large/test.jpg')
+        index.compact()     # 没有索引文件：不做任何处理
+        self.assertEqual(index.get('weibo', _DIGEST), 'http://ww1.sinaimg.cn/large/test.jpg')
+        self.assertEqual(os.listdir(self.dir), [ ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_metrics.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        metrics: 直方图的分位数误差，_call各阶段的计时和错误计数，json/prometheus导出，enable/disable
+'''
+
+import json
+import random
+import unittest
+
+import errors
+import jsonobj
+import metrics
+import transport
+import weibo2
+from tests.support import player
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentile(self):
+        histogram = metrics.Histogram()
+        rand = random.Random(1)
+        values = [rand.uniform(0.001, 2.0) for _ in xrange(10000)]
+        for val in values:
+            histogram.record(val)
+        values.sort()
+        for p in (0.5, 0.9, 0.99):
+            exact = values[int(len(values) * p) - 1]
+            self.assertTrue(abs(histogram.percentile(p) - exact) / exact < 0.02, (p, histogram.percentile(p), exact))
+        self.assertEqual((histogram.count, histogram.min, histogram.max), (10000, values[0], values[-1]))
+        self.assertEqual(metrics.Histogram().percentile(0.5), 0.0)
+
+    def test_cumulative(self):
+        histogram = metrics.Histogram()
+        for val in (0.0005, 0.003, 0.003, 0.2, 20.0):
+            histogram.record(val)
+        buckets = dict(histogram.cumulative())
+        self.assertEqual((buckets[0.001], buckets[0.005], buckets[0.25], buckets[10.0]), (1, 3, 4, 4))
+
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.decoder = jsonobj.default_decoder
+        self.token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+
+    def tearDown(self):
+        metrics.disable()
+        self.assertTrue(jsonobj.default_decoder is self.decoder)
+
+    def test_call(self):
+        tracer = metrics.enable()
+        spans = [ ]
+        tracer.hooks.append(spans.append)
+        with transport.use(player((200, {'id': 1}))):
+            weibo2._call('GET', 'statuses/show/3456789012', self.token)
+        with transport.use(player((400, {'error_code': 20101, 'error': 'target weibo does not exist'}))):
+            self.assertRaises(errors.ApiError, weibo2._call, 'GET', 'statuses/show/3456789013', self.token)
+        self.assertEqual(len(spans), 2)
+        snapshot = tracer.snapshot()
+        self.assertEqual(len(snapshot), 1)     # 数字id替换成:id
+        endpoint = snapshot[0]
+        self.assertTrue(endpoint['endpoint'].endswith('/statuses/show/:id.json'), endpoint['endpoint'])
+        self.assertEqual(endpoint['errors'], {'ApiError': 1})
+        self.assertEqual(endpoint['phases']['total']['count'], 2)
+        self.assertTrue('decode' in endpoint['phases'] and 'wrap' in endpoint['phases'])
+        self.assertEqual(json.loads(tracer.to_json())['endpoints'][0]['errors'], {'ApiError': 1})
+
+        text = tracer.to_prometheus()
+        self.assertTrue('# TYPE weibosdk_call_phase_seconds histogram' in text)
+        self.assertTrue('le="+Inf"} 2' in text)
+        self.assertTrue('weibosdk_call_errors_total{method="GET",endpoint="%s",error="ApiError"} 1' % endpoint['endpoint'] in text)
+
+    def test_sample(self):
+        tracer = metrics.enable(sample = 0)
+        with transport.use(player((200, {'id': 1}))):
+            weibo2._call('GET', 'users/show', self.token, uid = 1)
+        self.assertEqual(tracer.snapshot(), [ ])
+        self.assertEqual(metrics.current(), None)
+
+    def test_reuse(self):
+        tracer = metrics.enable()
+        with transport.use(player((200, {'id': 1}))):
+            weibo2._call('GET', 'users/show', self.token, uid = 1)
+            self.assertTrue(metrics.enable(reuse = metrics.disable()) is tracer)
+            weibo2._call('GET', 'users/show', self.token, uid = 1)
+        self.assertEqual(tracer.snapshot()[0]['phases']['total']['count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_mockserver.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        mockserver: 通过transport.Redirect调用模拟服务器：timeline翻页、发表，注入的错误、频次超限、撤销的token
+        映射成errors中对应的异常(腾讯按ret)
+'''
+
+import unittest
+
+import errors
+import transport
+import mockserver
+import weibo2
+import qweibo2
+
+
+class MockServerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mockserver.MockServer(statuses = 30).start()
+        self.redirect = transport.Redirect(self.server.address)
+        self.weibo = weibo2.OAuthToken('', '', 'weibo_token', 3600, '2617375872')
+        self.qq = qweibo2.OAuthToken('', '', 'qq_token', 3600, 'openid', 'darkbull', 'DarkBull', '')
+
+    def tearDown(self):
+        self.redirect.transport.clear()
+        self.server.stop()
+
+    def test_timeline(self):
+        api = weibo2.OAuth2Api('', '', '')
+        with transport.use(self.redirect):
+            api.statuses.update.post(self.weibo, status = u'选择python')
+            first = api.statuses.home_timeline.get(self.weibo, count = 5).statuses[0]
+            statuses = list(api.statuses.home_timeline.iter(self.weibo, count = 10))
+        self.assertEqual(first.text, u'选择python')
+        self.assertEqual(len(statuses), 31)
+        self.assertEqual(len(set(status.id for status in statuses)), 31)
+        self.assertEqual(self.server.stats()['posted'], 1)
+
+    def test_qq_timeline(self):
+        api = qweibo2.OAuth2Api('', '', '')
+        with transport.use(self.redirect):
+            api.t.add.post(self.qq, content = u'选择python')
+            statuses = list(api.statuses.home_timeline.iter(self.qq, reqnum = 7))
+        self.assertEqual(statuses[0].text, u'选择python')
+        self.assertEqual(len(statuses), 31)
+
+    def test_errors(self):
+        with transport.use(self.redirect):
+            self.server.rate_limit = 1
+            weibo2._call('GET', 'statuses/home_timeline', self.weibo)
+            self.assertRaises(errors.RateLimitError, weibo2._call, 'GET', 'statuses/home_timeline', self.weibo)
+            self.server.rate_limit = None
+            self.server.error_rate = 1.0
+            self.assertRaises(errors.ServerError, weibo2._call, 'GET', 'statuses/home_timeline', self.weibo)
+            self.assertRaises(errors.ServerError, qweibo2._call, 'GET', 'statuses/home_timeline', self.qq)
+            self.server.error_rate = 0.0
+            self.server.revoke('weibo_token')
+            self.server.revoke('qq_token')
+            self.assertRaises(errors.AuthError, weibo2._call, 'GET', 'statuses/home_timeline', self.weibo)
+            self.assertRaises(errors.AuthError, qweibo2._call, 'GET', 'statuses/home_timeline', self.qq)
+            self.assertRaises(errors.ApiError, weibo2._call, 'GET', 'statuses/unknown', self.weibo)
+        stats = self.server.stats()
+        self.assertEqual((stats['rate_limited'], stats['injected_errors'], stats['unauthorized'], stats['not_found']), (1, 2, 2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
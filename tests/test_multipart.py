@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_multipart.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        multipart: 流式读出的请求体与长度一致、能被标准库解析，seek(0)之后重发的内容相同，Media与文件的结果相同
+'''
+
+import os
+import cgi
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import multipart
+
+
+def _read_all(body, size = 1000):
+    chunks = [ ]
+    while True:
+        chunk = body.read(size)
+        if not chunk:
+            return ''.join(chunks)
+        chunks.append(chunk)
+
+
+class MultipartBodyTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.pic = tempfile.mkstemp(suffix = '.jpg')
+        self.data = os.urandom(20 * 1024)
+        os.write(fd, self.data)
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.pic)
+
+    def _parse(self, body, content):
+        environ = {'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': body.content_type, 'CONTENT_LENGTH': str(len(content))}
+        return cgi.FieldStorage(fp = StringIO(content), environ = environ)
+
+    def test_body(self):
+        body = multipart.MultipartBody({'status': u'选择python', 'lat': 39.9}, 'pic', self.pic)
+        try:
+            content = _read_all(body)
+        finally:
+            body.close()
+        self.assertEqual(len(content), len(body))
+        form = self._parse(body, content)
+        self.assertEqual(form.getfirst('status'), u'选择python'.encode('utf-8'))
+        self.assertEqual(form.getfirst('lat'), '39.9')
+        self.assertEqual(form['pic'].filename, os.path.basename(self.pic))
+        self.assertEqual(form['pic'].type, 'image/jpeg')
+        self.assertEqual(form['pic'].value, self.data)
+
+    def test_seek(self):
+        body = multipart.MultipartBody({'status': 'test'}, 'pic', self.pic, boundary = '----test')
+        try:
+            first = _read_all(body, 4096)
+            body.seek(0)
+            self.assertEqual(_read_all(body, 777), first)
+            self.assertRaises(ValueError, body.seek, 10)
+        finally:
+            body.close()
+
+    def test_media(self):
+        media = multipart.Media(self.pic)
+        from_file = multipart.MultipartBody({'status': 'test'}, 'pic', self.pic, boundary = '----test')
+        from_media = multipart.MultipartBody({'status': 'test'}, 'pic', media, boundary = '----test')
+        try:
+            self.assertEqual(len(from_media), len(from_file))
+            self.assertEqual(_read_all(from_media), _read_all(from_file))
+        finally:
+            from_file.close()
+            from_media.close()
+
+    def test_empty_file(self):
+        with open(self.pic, 'wb'):
+            pass
+        body = multipart.MultipartBody({ }, 'pic', self.pic)
+        try:
+            content = _read_all(body)
+        finally:
+            body.close()
+        self.assertEqual(len(content), len(body))
+        self.assertEqual(self._parse(body, content)['pic'].value, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_oauth1.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        oauth1: Signer的签名与逐个参数计算的结果相同，nonce在多线程、fork之后不重复
+'''
+
+import os
+import hmac
+import urllib
+import hashlib
+import binascii
+import threading
+import unittest
+
+import oauth1
+from tests.support import run_threads
+
+
+def _reference(http_method, url, params, secret):
+    # 原先各模块_request中的签名算法: 所有参数(包括oauth_*)排序后逐个urlencode
+    quote = lambda p: urllib.quote_plus(p, safe = '~')
+    base = '&'.join('%s=%s' % (quote(key), quote(val)) for key, val in sorted(params.items()))
+    base = '%s&%s&%s' % (http_method, quote(url), quote(base))
+    return binascii.b2a_base64(hmac.new(secret, base, hashlib.sha1).digest())[:-1]
+
+
+class SignerTest(unittest.TestCase):
+    def setUp(self):
+        self.signer = oauth1.Signer('appkey', 'app secret', 'token', 'token+secret', extra = {'format': 'json'})
+        self.params = {'status': u'选择python ~ 1+1=2&'.encode('utf-8'), 'lat': '39.9'}
+
+    def test_signature(self):
+        url = 'http://open.t.qq.com/api/t/add'
+        oauth = self.signer.sign('POST', url, self.params, 'nonce', '1300000000')
+        signed = dict(self.params)
+        signed.update((key, val) for key, val in oauth.items() if key != 'oauth_signature')
+        self.assertEqual(oauth['oauth_signature'], _reference('POST', url, signed, 'app secret&token+secret'))
+        self.assertEqual(oauth['format'], 'json')
+
+    def test_signed_params(self):
+        # 上传图片时只有oauth_*参数参与签名(新浪)
+        url = 'http://api.t.sina.com.cn/statuses/upload.json'
+        oauth = self.signer.sign('POST', url, self.params, 'nonce', '1300000000', signed = { })
+        self.assertEqual(oauth['oauth_signature'], self.signer.signature('POST', url, { }, 'nonce', '1300000000'))
+        self.assertNotEqual(oauth['oauth_signature'], self.signer.signature('POST', url, self.params, 'nonce', '1300000000'))
+
+    def test_authorization(self):
+        oauth = self.signer.sign('GET', 'http://api.t.sina.com.cn/statuses/home_timeline.json', { }, 'nonce', '1300000000')
+        header = self.signer.authorization(oauth)
+        self.assertTrue(header.startswith('OAuth realm=""'))
+        pairs = dict(item.split('=', 1) for item in header[len('OAuth realm="", '):].split(', '))
+        values = dict((key, urllib.unquote(val.strip('"'))) for key, val in pairs.items())
+        self.assertEqual(values, dict((key, val) for key, val in oauth.items() if key.startswith('oauth_')))
+
+    def test_url_cache(self):
+        for i in xrange(oauth1.Signer._MAX_CACHE + 1):
+            self.signer.signature('GET', 'http://api.t.sina.com.cn/users/%d.json' % i, { }, 'nonce', '1300000000')
+        self.assertTrue(len(self.signer._urls) <= oauth1.Signer._MAX_CACHE)
+
+
+class NonceTest(unittest.TestCase):
+    def test_threads(self):
+        nonces = [ ]
+        run_threads(lambda: nonces.extend(oauth1.nonce() for _ in xrange(10000)), 8)
+        self.assertEqual(len(set(nonces)), 80000)
+
+    def test_concurrent_first_call(self):
+        # 第一次调用时多个线程同时初始化，只能有一个前缀和一个计数器
+        oauth1._nonce_state = (None, None, None)
+        start = threading.Event()
+        nonces = [ ]
+
+        def work():
+            start.wait()
+            nonces.extend(oauth1.nonce() for _ in xrange(100))
+        threads = [threading.Thread(target = work) for _ in xrange(16)]
+        for t in threads:
+            t.start()
+        start.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(nonces)), 1600)
+        self.assertEqual(len(set(nonce[:16] for nonce in nonces)), 1)
+
+    def test_fork(self):
+        # fork出的子进程重新取随机前缀
+        if not hasattr(os, 'fork'):
+            return
+        parent = oauth1.nonce()
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.write(write, oauth1.nonce())
+            finally:
+                os._exit(0)
+        os.close(write)
+        child = os.read(read, 64)
+        os.close(read)
+        os.waitpid(pid, 0)
+        self.assertNotEqual(child[:16], parent[:16])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_oauth2.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        oauth2: 三个平台的OAuth2Api(weibo2, qweibo2, tweibo2)通过mockserver发微博、读timeline，结果是统一的格式；
+        参数的编码，200响应中的error_code
+'''
+
+import urllib
+import unittest
+
+import errors
+import transport
+import mockserver
+import weibo2
+import qweibo2
+import tweibo2
+from tests.support import player
+
+
+def _targets():
+    return [
+        (weibo2.OAuth2Api('', '', ''), weibo2.OAuthToken('', '', 'weibo_token', 3600, '2617375872')),
+        (qweibo2.OAuth2Api('', '', ''), qweibo2.OAuthToken('', '', 'qq_token', 3600, 'openid', 'darkbull', 'DarkBull', '')),
+        (tweibo2.OAuth2Api('', '', ''), tweibo2.OAuthToken('', '', '163_token', 3600, '2617375872')),
+    ]
+
+
+class FacadeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = mockserver.MockServer(statuses = 5).start()
+        self.redirect = transport.Redirect(self.server.address)
+
+    def tearDown(self):
+        self.redirect.transport.clear()
+        self.server.stop()
+
+    def test_post_and_timeline(self):
+        with transport.use(self.redirect):
+            for api, token in _targets():
+                status = api.post_status(token, u'选择python')
+                user = getattr(token, 'name', None) or 'mock_user'  # 腾讯t/add只返回id，用户取自token
+                self.assertEqual((status.platform, status.text, status.user), (api.platform.name, u'选择python', user))
+                self.assertTrue(status.id)
+                timeline = api.timeline(token, count = 3)
+                self.assertEqual(len(timeline), 3, api.platform.name)
+                self.assertEqual(str(timeline[0].id), str(status.id), api.platform.name)
+                self.assertTrue(all(item.platform == api.platform.name for item in timeline))
+        self.assertEqual(self.server.stats()['posted'], 3)
+
+
+class PlatformTest(unittest.TestCase):
+    def setUp(self):
+        self.api, self.token = _targets()[0]
+
+    def test_params(self):
+        replay = player((200, {'id': 1}))
+        with transport.use(replay):
+            self.api.statuses.show.get(self.token, __id = 3, status = u'选择')
+        _, netloc, path, _ = replay.seen[0]
+        self.assertEqual(netloc, 'api.weibo.com')
+        path, _, query = path.partition('?')
+        self.assertEqual(path, '/2/statuses/show.json')
+        params = dict(item.split('=', 1) for item in query.split('&'))
+        self.assertEqual(urllib.unquote(params[urllib.quote(':id')]), '3')
+        self.assertEqual(urllib.unquote_plus(params['status']), u'选择'.encode('utf-8'))
+        self.assertEqual(params['access_token'], 'weibo_token')
+
+    def test_error_in_200(self):
+        with transport.use(player((200, {'error_code': 21327, 'error': 'expired_token', 'request': '/2/users/show.json'}))):
+            self.assertRaises(errors.AuthError, self.api.users.show.get, self.token, uid = 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
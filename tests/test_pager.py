@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_pager.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        pager: 各种Cursor的翻页参数，iterate逐条返回、提前结束时取消预取，OAuth2Api.iter
+'''
+
+import json
+import urlparse
+import unittest
+
+import pager
+import jsonobj
+import transport
+import weibo2
+
+
+def _page(obj):
+    return jsonobj.default_decoder.wrap(obj)
+
+
+class CursorTest(unittest.TestCase):
+    def test_max_id(self):
+        cursor = pager.MaxIdCursor()
+        page = _page({'statuses': [{'id': 10}, {'id': 9}]})
+        items = cursor.items(page)
+        self.assertEqual(cursor.next_params(page, items, {'count': 2, 'page': 3}), {'count': 2, 'max_id': 8})
+
+    def test_max_id_string(self):
+        # 字符串id(网易): max_id是闭区间，下一页去掉重复的第一条
+        cursor = pager.MaxIdCursor()
+        page = _page([{'id': 'b'}, {'id': 'a'}])
+        params = cursor.next_params(page, cursor.items(page), { })
+        self.assertEqual(params, {'max_id': 'a'})
+        self.assertEqual([item.id for item in cursor.items(_page([{'id': 'a'}, {'id': '9'}]))], ['9'])
+
+    def test_next_cursor(self):
+        cursor = pager.NextCursor()
+        page = _page({'users': [{'id': 1}], 'next_cursor': 20})
+        self.assertEqual(cursor.next_params(page, cursor.items(page), {'count': 20}), {'count': 20, 'cursor': 20})
+        page = _page({'users': [{'id': 1}], 'next_cursor': 0})
+        self.assertEqual(cursor.next_params(page, cursor.items(page), { }), None)
+
+    def test_qq(self):
+        cursor = pager.QQTimelineCursor()
+        page = _page({'ret': 0, 'data': {'hasnext': 0, 'info': [{'id': '2', 'timestamp': 20}, {'id': '1', 'timestamp': 10}]}})
+        self.assertEqual(cursor.next_params(page, cursor.items(page), {'reqnum': 2}),
+                         {'reqnum': 2, 'pageflag': 1, 'pagetime': 10, 'lastid': '1'})
+        page = _page({'ret': 0, 'data': {'hasnext': 1, 'info': [{'id': '1', 'timestamp': 10}]}})
+        self.assertEqual(cursor.next_params(page, cursor.items(page), { }), None)
+        cursor = pager.QQIndexCursor()
+        page = _page({'ret': 0, 'data': {'hasnext': 0, 'nextstartpos': 30, 'info': [{'name': 'darkbull'}]}})
+        self.assertEqual(cursor.next_params(page, cursor.items(page), { }), {'startindex': 30})
+        self.assertEqual(cursor.items(_page({'ret': 0, 'data': None})), [ ])
+
+
+class IterateTest(unittest.TestCase):
+    def _fetch(self, params):
+        # 共25条，每页10条
+        self.requests.append(params)
+        start = params.get('max_id', 25)
+        return _page({'statuses': [{'id': id} for id in xrange(start, max(start - 10, 0), -1)]})
+
+    def setUp(self):
+        self.requests = [ ]
+
+    def test_iterate(self):
+        ids = [item.id for item in pager.iterate(self._fetch, { }, pager.MaxIdCursor(), prefetch = False)]
+        self.assertEqual(ids, range(25, 0, -1))
+        self.assertEqual(len(self.requests), 4)     # 最后是空页
+
+    def test_stop_early(self):
+        items = pager.iterate(self._fetch, { }, pager.MaxIdCursor())
+        self.assertEqual(items.next().id, 25)
+        items.close()
+        self.assertTrue(len(self.requests) <= 2)
+
+    def test_api_iter(self):
+        def user_timeline(http_method, scheme, netloc, path, body = None):
+            query = dict(urlparse.parse_qsl(path.partition('?')[2]))
+            return 200, 'OK', json.dumps(self._fetch(dict((key, int(val)) for key, val in query.items() if key == 'max_id')))
+        api = weibo2.OAuth2Api('', '', '')
+        token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+        with transport.use(transport.Player(transport.Cassette(), user_timeline)):
+            ids = [status.id for status in api.statuses.user_timeline.iter(token, count = 10)]
+        self.assertEqual(ids, range(25, 0, -1))
+
+
+if __name__ == '__main__':
+    unittest.main()
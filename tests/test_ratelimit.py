@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_ratelimit.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        ratelimit: 接口分类，按token和类别分别计数，超时拒绝，用服务器的剩余次数校正，_call在超限时不发送请求
+'''
+
+import time
+import unittest
+
+import errors
+import ratelimit
+import transport
+import weibo2
+from tests.support import player
+
+
+class _Token(object):
+    def __init__(self, access_token, appkey = 'appkey'):
+        self.access_token = access_token
+        self.appkey = appkey
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_classify(self):
+        self.assertEqual(ratelimit.classify('POST', 'statuses/update'), 'post')
+        self.assertEqual(ratelimit.classify('POST', 't/add_pic'), 'post')
+        self.assertEqual(ratelimit.classify('POST', 'comments/create'), 'comment')
+        self.assertEqual(ratelimit.classify('POST', 'friendships/create'), 'follow')
+        self.assertEqual(ratelimit.classify('POST', 'favorites/create'), 'write')
+        self.assertEqual(ratelimit.classify('GET', 'statuses/update'), 'read')
+
+    def test_per_token(self):
+        limiter = ratelimit.RateLimiter(per_token = {'post': (2, 3600)}, timeout = 0)
+        a, b = _Token('a'), _Token('b')
+        self.assertTrue(limiter.acquire(a, 'POST', 'statuses/update'))
+        self.assertTrue(limiter.acquire(a, 'POST', 'statuses/update'))
+        self.assertFalse(limiter.acquire(a, 'POST', 'statuses/update'))
+        self.assertTrue(limiter.acquire(b, 'POST', 'statuses/update'))    # 其他token不受影响
+        self.assertTrue(limiter.acquire(a, 'GET', 'statuses/home_timeline'))  # 没有配置的类别不限流
+        self.assertEqual(limiter.remaining(a), {'post': 0})
+        self.assertEqual(limiter.remaining(b, 'post'), 1)
+        self.assertEqual(limiter.stats()['rejected'], 1)
+
+    def test_per_app(self):
+        limiter = ratelimit.RateLimiter(per_app = (3, 3600), timeout = 0)
+        results = [limiter.acquire(_Token(str(i)), 'GET', 'users/show') for i in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        self.assertTrue(limiter.acquire(_Token('0', appkey = 'other'), 'GET', 'users/show'))
+
+    def test_wait(self):
+        limiter = ratelimit.RateLimiter(per_token = {'read': (1, 0.05)})
+        token = _Token('a')
+        start = time.time()
+        for _ in range(3):
+            self.assertTrue(limiter.acquire(token, 'GET', 'users/show'))
+        self.assertTrue(time.time() - start >= 0.09)
+        self.assertTrue(limiter.stats()['waited'] > 0)
+
+    def test_sync(self):
+        limiter = ratelimit.RateLimiter(per_token = {'read': (150, 3600)})
+        token = _Token('a')
+        limiter.sync(token, 'read', 10)
+        self.assertEqual(limiter.remaining(token, 'read'), 10)
+        limiter.sync(token, 'read', 1000)   # 不超过桶的容量
+        self.assertEqual(limiter.remaining(token, 'read'), 150)
+
+    def test_call_rejected(self):
+        # 超限时_call抛出RateLimitError，不发送请求
+        token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+        replay = player((200, {'id': 1}))
+        weibo2.rate_limiter = ratelimit.RateLimiter(per_token = {'read': (1, 3600)}, timeout = 0)
+        try:
+            with transport.use(replay):
+                weibo2._call('GET', 'users/show', token, uid = 1)
+                self.assertRaises(errors.RateLimitError, weibo2._call, 'GET', 'users/show', token, uid = 1)
+        finally:
+            weibo2.rate_limiter = None
+        self.assertEqual(len(replay.seen), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
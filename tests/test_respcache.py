@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_respcache.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        respcache: MemoryBackend的LRU淘汰和有效期，FileBackend，OAuth2Api只缓存成功的GET响应
+'''
+
+import time
+import shutil
+import tempfile
+import unittest
+
+import errors
+import respcache
+import transport
+import weibo2
+import qweibo2
+from tests.support import player
+
+
+class MemoryBackendTest(unittest.TestCase):
+    def test_lru_entries(self):
+        backend = respcache.MemoryBackend(max_entries = 2)
+        backend.set('a', '1', 60)
+        backend.set('b', '2', 60)
+        backend.get('a')    # a变成最近使用
+        backend.set('c', '3', 60)
+        self.assertEqual([backend.get(key) for key in 'abc'], ['1', None, '3'])
+        self.assertEqual(backend.stats(), {'entries': 2, 'bytes': 2, 'evictions': 1})
+
+    def test_lru_bytes(self):
+        backend = respcache.MemoryBackend(max_bytes = 10)
+        backend.set('a', 'x' * 6, 60)
+        backend.set('b', 'y' * 6, 60)
+        self.assertEqual((backend.get('a'), backend.get('b')), (None, 'y' * 6))
+
+    def test_expired(self):
+        backend = respcache.MemoryBackend()
+        backend.set('a', '1', -1)
+        self.assertEqual(backend.get('a'), None)
+        self.assertEqual(backend.stats()['entries'], 0)
+
+    def test_oversized_replace(self):
+        # 超出max_bytes的新内容不缓存，旧的内容也不能再返回
+        backend = respcache.MemoryBackend(max_bytes = 10)
+        backend.set('a', 'old', 60)
+        backend.set('a', 'x' * 11, 60)
+        self.assertEqual(backend.get('a'), None)
+        self.assertEqual(backend.stats()['bytes'], 0)
+
+
+class FileBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_set(self):
+        backend = respcache.FileBackend(self.directory)
+        backend.set('a', '{"id": 1}\n', 60)
+        backend.set('b', '2', -1)
+        self.assertEqual((backend.get('a'), backend.get('b'), backend.get('c')), ('{"id": 1}\n', None, None))
+        # 另一个进程(另一个FileBackend对象)读到同样的内容
+        self.assertEqual(respcache.FileBackend(self.directory).get('a'), '{"id": 1}\n')
+
+    def test_purge(self):
+        backend = respcache.FileBackend(self.directory, max_entries = 2, purge_every = 1000)
+        for i, key in enumerate('abc'):
+            backend.set(key, str(i), 60)
+            time.sleep(0.01)    # 按文件修改时间淘汰
+        backend.set('d', 'expired', -1)
+        backend.purge()
+        self.assertEqual([backend.get(key) for key in 'abcd'], [None, '1', '2', None])
+
+
+class ApiCacheTest(unittest.TestCase):
+    def test_hit(self):
+        cache = respcache.ResponseCache(ttls = {'users/show': 60})
+        api = weibo2.OAuth2Api('', '', '', cache = cache)
+        token = weibo2.OAuthToken('', '', 'access_token', 3600, '2617375872')
+        transport_ = player((200, {'id': 1, 'screen_name': 'darkbull'}))
+        with transport.use(transport_):
+            first = api.users.show.get(token, uid = 1)
+            second = api.users.show.get(token, uid = 1)
+            api.users.show.get(token, uid = 2)
+            api.statuses.update.post(token, status = 'a')
+            api.statuses.update.post(token, status = 'a')
+        self.assertEqual(second.screen_name, 'darkbull')
+        self.assertFalse(first is second)   # 命中时重新解析
+        self.assertEqual(len(transport_.seen), 4)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 2))
+
+    def test_qq_error_not_cached(self):
+        # 腾讯出错时http状态码仍然是200，出错的响应不能缓存
+        cache = respcache.ResponseCache(ttls = {'user/other_info': 60})
+        api = qweibo2.OAuth2Api('', '', '', cache = cache)
+        token = qweibo2.OAuthToken('', '', 'access_token', 3600, 'openid', 'darkbull', 'DarkBull', '')
+        transport_ = player((200, {'ret': 2, 'errcode': 0, 'msg': 'rate limited'}), (200, {'ret': 0, 'msg': 'ok', 'data': {'nick': 'DarkBull'}}))
+        with transport.use(transport_):
+            self.assertRaises(errors.RateLimitError, api.user.other_info.get, token, name = 'darkbull')
+            self.assertEqual(api.user.other_info.get(token, name = 'darkbull').data.nick, 'DarkBull')
+            self.assertEqual(api.user.other_info.get(token, name = 'darkbull').data.nick, 'DarkBull')
+        self.assertEqual(len(transport_.seen), 2)
+        self.assertEqual(cache.stats()['entries'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_scheduler.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        scheduler: 认证失败的token被隔离并换一个token重试(同步、异步)，腾讯ret=3的响应，选择token时的并发
+'''
+
+import json
+import urlparse
+import unittest
+
+import errors
+import transport
+import scheduler
+import weibo2
+import qweibo2
+from tests.support import wait, run_threads
+
+
+class _SyncApi(weibo2.OAuth2Api):
+    def _invoke(self, attrs, token, kwargs):
+        if token.access_token == 'revoked':
+            raise errors.AuthError('expired_token', 21327)
+        return token.access_token
+
+
+class _AsyncApi(weibo2.AsyncOAuth2Api):
+    def _invoke(self, attrs, token, kwargs):
+        return self.workers.submit(_SyncApi._invoke.im_func, self, attrs, token, kwargs)
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.tokens = [weibo2.OAuthToken('', '', access_token, 3600, uid) for uid, access_token in enumerate(('revoked', 'valid'))]
+
+    def test_quarantine_and_retry(self):
+        sched = scheduler.TokenScheduler(_SyncApi('', '', ''), self.tokens, choices = None)
+        self.assertEqual([sched.users.show.get(uid = 1) for _ in xrange(3)], ['valid'] * 3)
+        stats = sched.stats()
+        self.assertEqual((stats['auth_errors'], stats['healthy'], stats['quarantined'], stats['inflight']), (1, 1, 1, 0))
+
+    def test_release_after_quarantine(self):
+        sched = scheduler.TokenScheduler(_SyncApi('', '', ''), self.tokens, quarantine = 0.05, choices = None)
+        sched.users.show.get(uid = 1)
+        self.assertTrue(wait(lambda: sched.stats()['healthy'] == 2))
+
+    def test_async_retry(self):
+        api = _AsyncApi('', '', '')
+        sched = scheduler.TokenScheduler(api, self.tokens, choices = None)
+        try:
+            self.assertEqual(sched.users.show.get(uid = 1).result(5), 'valid')
+            self.assertTrue(wait(lambda: sched.stats()['inflight'] == 0))
+            self.assertEqual(sched.stats()['auth_errors'], 1)
+        finally:
+            api.workers.shutdown()
+
+    def test_no_token(self):
+        sched = scheduler.TokenScheduler(_SyncApi('', '', ''), self.tokens[:1])
+        self.assertRaises(scheduler.NoTokenError, sched.users.show.get, uid = 1)
+
+    def test_concurrent(self):
+        # 并发调用时被隔离的token不会再被选中，负载计数最后回到0
+        tokens = [weibo2.OAuthToken('', '', 'valid%d' % i, 3600, i) for i in xrange(20)] + self.tokens[:1]
+        sched = scheduler.TokenScheduler(_SyncApi('', '', ''), tokens)
+        results = [ ]
+        run_threads(lambda: results.extend(sched.users.show.get(uid = 1) for _ in xrange(200)), 8)
+        self.assertEqual(len(results), 1600)
+        self.assertFalse('revoked' in results)
+        stats = sched.stats()
+        self.assertEqual((stats['auth_errors'], stats['quarantined'], stats['inflight']), (1, 1, 0))
+
+    def test_qq_ret_quarantine(self):
+        # 腾讯的鉴权失败是200响应中的ret=3，同样隔离token
+        def respond(http_method, scheme, netloc, path, body = None):
+            query = dict(urlparse.parse_qsl(path.partition('?')[2]))
+            if query['access_token'] == 'revoked':
+                return 200, 'OK', json.dumps({'ret': 3, 'errcode': 36, 'msg': 'check sign error', 'data': None})
+            return 200, 'OK', json.dumps({'ret': 0, 'msg': 'ok', 'data': {'nick': query['access_token']}})
+        tokens = [qweibo2.OAuthToken('', '', access_token, 3600, access_token, '', '', '') for access_token in ('revoked', 'valid')]
+        sched = scheduler.TokenScheduler(qweibo2.OAuth2Api('', '', ''), tokens, choices = None)
+        with transport.use(transport.Player(transport.Cassette(), respond)):
+            self.assertEqual([sched.user.info.get().data.nick for _ in xrange(3)], ['valid'] * 3)
+        stats = sched.stats()
+        self.assertEqual((stats['auth_errors'], stats['healthy'], stats['quarantined']), (1, 1, 1))
+        self.assertFalse(sched.token_stats()['revoked']['healthy'])
+
+
+if __name__ == '__main__':
+    unittest.main()
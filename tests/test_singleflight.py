@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_singleflight.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        singleflight: 并发的相同请求只执行一次，错误由所有等待者共享且不保留，请求key的生成
+'''
+
+import json
+import unittest
+
+import errors
+import transport
+import singleflight
+import weibo2
+from tests.support import wait, run_threads
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_do(self):
+        group = singleflight.Group()
+        calls = [ ]
+        results = [ ]
+
+        def fetch():
+            calls.append(1)
+            wait(lambda: group.stats()['collapsed'] == 9)
+            return 'user'
+
+        def work():
+            results.append(group.do('users/show?uid=1', fetch))
+        run_threads(work, 10)
+        self.assertEqual((len(calls), results), (1, ['user'] * 10))
+        self.assertEqual(group.stats(), {'calls': 10, 'collapsed': 9, 'inflight': 0})
+
+    def test_error_shared(self):
+        group = singleflight.Group()
+        failures = [ ]
+
+        def fetch():
+            wait(lambda: group.stats()['collapsed'] == 4)
+            raise errors.ServerError('server error')
+
+        def work():
+            try:
+                group.do('key', fetch)
+            except errors.ServerError:
+                failures.append(1)
+        run_threads(work, 5)
+        self.assertEqual(len(failures), 5)
+        self.assertEqual(group.do('key', lambda: 'again'), 'again')   # 出错之后不保留
+
+    def test_make_key(self):
+        group = singleflight.Group()
+        token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+        other = weibo2.OAuthToken('', '', 'other_token', 3600, 'uid')
+        key = group.make_key('weibo', 'GET', 'users/show', token, {'uid': 1, 'screen_name': u'选择'})
+        self.assertEqual(key, group.make_key('weibo', 'GET', 'users/show', token, {'screen_name': '选择', 'uid': '1'}))
+        self.assertNotEqual(key, group.make_key('weibo', 'GET', 'users/show', other, {'uid': 1, 'screen_name': u'选择'}))
+        self.assertNotEqual(key, group.make_key('weibo', 'GET', 'users/show', token, {'uid': 2, 'screen_name': u'选择'}))
+
+    def test_api(self):
+        # 通过OAuth2Api: 同样的GET请求只发送一次
+        requests = [ ]
+        api = weibo2.OAuth2Api('', '', '', singleflight = singleflight.Group())
+        token = weibo2.OAuthToken('', '', 'access_token', 3600, 'uid')
+
+        def show(http_method, scheme, netloc, path, body = None):
+            requests.append(path)
+            wait(lambda: api.singleflight.stats()['collapsed'] == 9)
+            return 200, 'OK', json.dumps({'id': 1, 'screen_name': 'darkbull'})
+        results = [ ]
+        with transport.use(transport.Player(transport.Cassette(), show)):
+            run_threads(lambda: results.append(api.users.show.get(token, uid = 1).screen_name), 10)
+        self.assertEqual((len(requests), results), (1, ['darkbull'] * 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
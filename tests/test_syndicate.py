@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_syndicate.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        syndicate: 并行发到三个平台，失败的平台记录在Report中，retry只重发失败的平台，图片有问题时不发送请求
+'''
+
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+
+import errors
+import oauth2
+import syndicate
+import transport
+import weibo2
+import qweibo2
+import tweibo2
+
+
+def _targets():
+    return [
+        (weibo2.OAuth2Api('', '', ''), weibo2.OAuthToken('', '', 'token', 3600, 'uid')),
+        (qweibo2.OAuth2Api('', '', ''), qweibo2.OAuthToken('', '', 'token', 3600, 'openid', 'darkbull', 'DarkBull', '')),
+        (tweibo2.OAuth2Api('', '', ''), tweibo2.OAuthToken('', '', 'token', 3600, 'uid')),
+    ]
+
+
+class SyndicatorTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.pic = tempfile.mkstemp(suffix = '.jpg')
+        os.write(fd, os.urandom(20 * 1024))
+        os.close(fd)
+        self.requests = [ ]
+        self.qq_failures = 0    # 腾讯前几次返回ret=4(服务器错误)
+        self.running = [0, 0]   # 同时在执行的请求数, 最大数
+        self._lock = threading.Lock()
+
+    def tearDown(self):
+        os.remove(self.pic)
+
+    def _respond(self, http_method, scheme, netloc, path, body = None):
+        with self._lock:
+            self.requests.append((netloc, path.partition('?')[0]))
+            self.running[0] += 1
+            self.running[1] = max(self.running)
+        time.sleep(0.02)
+        with self._lock:
+            self.running[0] -= 1
+        if netloc == 'open.t.qq.com':
+            if self.qq_failures:
+                self.qq_failures -= 1
+                return 200, 'OK', json.dumps({'ret': 4, 'errcode': 0, 'msg': 'server error'})
+            return 200, 'OK', json.dumps({'ret': 0, 'data': {'id': '2', 'time': 1357358400}})
+        if 'upload' in path and netloc == 'api.t.163.com':
+            return 200, 'OK', json.dumps({'upload_image_url': 'http://img.t.163.com/1.jpg'})
+        return 200, 'OK', json.dumps({'id': 1, 'text': u'选择python', 'user': {'screen_name': 'darkbull'}})
+
+    def test_post(self):
+        syndicator = syndicate.Syndicator(_targets())
+        try:
+            with transport.use(transport.Player(transport.Cassette(), self._respond)):
+                report = syndicator.post(u'选择python', self.pic)
+        finally:
+            syndicator.shutdown()
+        self.assertTrue(report.ok, report)
+        self.assertEqual([(result.platform, str(result.status.id)) for result in report], [('weibo', '1'), ('qweibo', '2'), ('tweibo', '1')])
+        self.assertEqual(len(self.requests), 4)     # 网易先上传图片再发表
+        self.assertEqual(self.running[1], 3)        # 三个平台并行
+
+    def test_retry_failed(self):
+        self.qq_failures = 1
+        syndicator = syndicate.Syndicator(_targets())
+        try:
+            with transport.use(transport.Player(transport.Cassette(), self._respond)):
+                report = syndicator.post(u'选择python')
+                self.assertEqual([result.platform for result in report.failed], ['qweibo'])
+                self.assertTrue(isinstance(report.failed[0].error, errors.ServerError))
+                del self.requests[:]
+                report = report.retry()
+        finally:
+            syndicator.shutdown()
+        self.assertTrue(report.ok, report)
+        self.assertEqual([netloc for netloc, _ in self.requests], ['open.t.qq.com'])
+        self.assertEqual([result.attempts for result in report], [1, 2, 1])
+
+    def test_bad_picture(self):
+        # 网易要求图片至少1K: 提交之前就失败，不发送任何请求
+        with open(self.pic, 'wb') as f:
+            f.write('x' * 100)
+        syndicator = syndicate.Syndicator(_targets())
+        try:
+            with transport.use(transport.Player(transport.Cassette(), self._respond)):
+                self.assertRaises(errors.WeiBoError, syndicator.post, u'选择python', self.pic)
+        finally:
+            syndicator.shutdown()
+        self.assertEqual(self.requests, [ ])
+
+    def test_post_all(self):
+        with transport.use(transport.Player(transport.Cassette(), self._respond)):
+            report = oauth2.post_all(_targets(), u'选择python', self.pic)
+        self.assertTrue(isinstance(report, syndicate.Report))
+        self.assertTrue(report.ok, report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_tokenstore.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        tokenstore: FileStorage/SqliteStorage的持久化(包括损坏的文件)，single-flight的刷新，AuthError时刷新后重试
+'''
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import unittest
+from os.path import join
+
+import errors
+import tokenstore
+import weibo2
+import qweibo2
+from tests.support import run_threads
+
+
+class _RefreshApi(weibo2.OAuth2Api):
+    def __init__(self):
+        weibo2.OAuth2Api.__init__(self, '', '', '')
+        self.refreshes = 0
+
+    def refresh(self, token):
+        self.refreshes += 1
+        time.sleep(0.05)
+        return weibo2.OAuthToken('', '', 'access_token%d' % self.refreshes, 3600, token.uid, refresh_token = token.refresh_token)
+
+
+def _token(access_token = 'access_token0', expires_in = 3600):
+    return weibo2.OAuthToken('', '', access_token, expires_in, '2617375872', refresh_token = 'refresh')
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = [ ]
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class StorageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = join(self.tmp, 'tokens.json')
+        self.log = _Records()
+        logging.getLogger('tokenstore').addHandler(self.log)
+
+    def tearDown(self):
+        logging.getLogger('tokenstore').removeHandler(self.log)
+        shutil.rmtree(self.tmp)
+
+    def test_file_storage(self):
+        storage = tokenstore.FileStorage(self.path)
+        storage.save('a', {'access_token': '1'})
+        storage.save('b', {'access_token': '2'})
+        storage.delete('a')
+        self.assertEqual(tokenstore.FileStorage(self.path).load(), {'b': {'access_token': '2'}})
+        self.assertEqual(os.listdir(self.tmp), ['tokens.json'])    # 没有留下临时文件
+
+    def test_corrupt_file(self):
+        # 写了一半的文件: 记录日志，文件改名保留，从空的记录开始
+        with open(self.path, 'wb') as f:
+            f.write('{"a": {"access_token": "1"')
+        storage = tokenstore.FileStorage(self.path)
+        self.assertEqual(storage.load(), { })
+        storage.save('b', {'access_token': '2'})
+        self.assertEqual(len(self.log.records), 1)
+        self.assertEqual(tokenstore.FileStorage(self.path).load(), {'b': {'access_token': '2'}})
+        corrupt = [name for name in os.listdir(self.tmp) if name.startswith('tokens.json.corrupt.')]
+        self.assertEqual(len(corrupt), 1)
+        self.assertEqual(open(join(self.tmp, corrupt[0]), 'rb').read(), '{"a": {"access_token": "1"')
+
+    def test_not_an_object(self):
+        with open(self.path, 'wb') as f:
+            f.write('[1, 2]')
+        self.assertEqual(tokenstore.FileStorage(self.path).load(), { })
+        self.assertEqual(len(self.log.records), 1)
+
+    def test_sqlite_storage(self):
+        storage = tokenstore.SqliteStorage(join(self.tmp, 'tokens.db'))
+        storage.save('a', {'access_token': '1'})
+        storage.save('a', {'access_token': '2'})
+        storage.save('b', {'access_token': '3'})
+        storage.delete('b')
+        self.assertEqual(tokenstore.SqliteStorage(join(self.tmp, 'tokens.db')).load(), {'a': {'access_token': '2'}})
+
+    def test_restore_tokens(self):
+        # 从持久化的记录恢复成api所在模块的OAuthToken
+        api = qweibo2.OAuth2Api('', '', '')
+        store = tokenstore.TokenStore(api, tokenstore.FileStorage(self.path))
+        key = store.add(qweibo2.OAuthToken('', '', 'access_token', 3600, 'openid', 'darkbull', 'DarkBull', '', refresh_token = 'refresh'))
+        token = tokenstore.TokenStore(api, tokenstore.FileStorage(self.path)).get(key)
+        self.assertEqual((type(token), key, token.access_token, token.nick), (qweibo2.OAuthToken, 'openid', 'access_token', 'DarkBull'))
+
+
+class TokenStoreTest(unittest.TestCase):
+    def test_single_refresh(self):
+        api = _RefreshApi()
+        store = tokenstore.TokenStore(api)
+        stale = _token()
+        key = store.add(stale)
+        results = [ ]
+        run_threads(lambda: results.append(store.refresh(key, stale).access_token), 10)
+        self.assertEqual((api.refreshes, results), (1, ['access_token1'] * 10))
+        self.assertEqual(store.stats(), {'tokens': 1, 'refreshes': 1, 'failures': 0})
+
+    def test_get_expired(self):
+        api = _RefreshApi()
+        store = tokenstore.TokenStore(api)
+        key = store.add(_token(expires_in = -1))
+        self.assertEqual(store.get(key).access_token, 'access_token1')
+        self.assertEqual(store.get(key).access_token, 'access_token1')
+        self.assertEqual(api.refreshes, 1)
+
+    def test_refresh_expiring(self):
+        api = _RefreshApi()
+        store = tokenstore.TokenStore(api, refresh_margin = 600)
+        soon = store.add(_token('soon', 60))
+        later = store.add(weibo2.OAuthToken('', '', 'later', 3600, 'other', refresh_token = 'refresh'))
+        self.assertEqual(store.refresh_expiring(), [ ])
+        self.assertEqual((store.get(soon).access_token, store.get(later).access_token), ('access_token1', 'later'))
+
+    def test_call_refreshes_on_auth_error(self):
+        api = _RefreshApi()
+        store = tokenstore.TokenStore(api)
+        key = store.add(_token())
+
+        def call(token):
+            if token.access_token == 'access_token0':
+                raise errors.AuthError('expired_token', 21327)
+            return token.access_token
+        self.assertEqual(store.call(key, call), 'access_token1')
+        self.assertEqual(store.get(key).access_token, 'access_token1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tests/test_transport.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        transport: 六个模块(weibo, qweibo, tweibo, weibo2, qweibo2, tweibo2)的_call和上传图片通过回放的请求
+        (host、路径，结果的解析)，录制的cassette保存后能完整回放，错误码映射成errors.AuthError；请求的匹配
+'''
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+import errors
+import transport
+import benchmark
+
+
+_HOSTS = {'weibo': 'api.t.sina.com.cn', 'qweibo': 'open.t.qq.com', 'tweibo': 'api.t.163.com',
+          'weibo2': 'api.weibo.com', 'qweibo2': 'open.t.qq.com', 'tweibo2': 'api.t.163.com'}
+
+
+def _capture(name, requests):
+    # benchmark的响应，同时记录每个请求: (方法, host, 路径, 请求体)
+    fallback = benchmark._fallback(name)
+
+    def respond(http_method, scheme, netloc, path, body = None):
+        requests.append((http_method, netloc, path.partition('?')[0], body))
+        return fallback(http_method, scheme, netloc, path, body)
+    return respond
+
+
+class PlatformTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.pic = tempfile.mkstemp(suffix = '.jpg')
+        os.write(fd, os.urandom(20 * 1024))
+        os.close(fd)
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        os.remove(self.pic)
+        shutil.rmtree(self.tmp)
+
+    def _first(self, name, ret):
+        # timeline的第一条微博的id
+        if name.startswith('qweibo'):
+            return ret.data.info[0].id
+        if name.startswith('tweibo'):
+            return ret[0].id
+        return ret.statuses[0].id
+
+    def test_call(self):
+        for name in benchmark.MODULES:
+            module, token, params, _, _ = benchmark._target(name)
+            requests = [ ]
+            with transport.use(transport.Player(transport.Cassette(), _capture(name, requests))):
+                ret = module._call('GET', 'statuses/home_timeline', token, **params)
+            self.assertEqual(len(requests), 1, name)
+            http_method, netloc, path, _ = requests[0]
+            self.assertEqual((http_method, netloc), ('GET', _HOSTS[name]), name)
+            self.assertTrue('home_timeline' in path, (name, path))
+            self.assertEqual(str(self._first(name, ret)), str(benchmark._STATUS['id']), name)
+
+    def test_upload(self):
+        for name in benchmark.MODULES:
+            module, token, _, upload_api, upload_params = benchmark._target(name)
+            requests = [ ]
+            with transport.use(transport.Player(transport.Cassette(), _capture(name, requests))):
+                ret = module._call('POST', upload_api, token, pic = self.pic, **upload_params)
+            self.assertEqual(len(requests), 1, name)
+            http_method, netloc, path, body = requests[0]
+            self.assertEqual((http_method, netloc), ('POST', _HOSTS[name]), name)
+            self.assertTrue(upload_api.split('/')[-1] in path, (name, path))
+            self.assertFalse(isinstance(body, str), '%s: upload is not multipart' % name)
+            self.assertTrue(ret.data.id if name.startswith('qweibo') else ret.id, name)
+
+    def test_upload_missing_file(self):
+        # 图片有问题时不发送请求
+        for name in benchmark.MODULES:
+            module, token, _, upload_api, upload_params = benchmark._target(name)
+            player = transport.Player(transport.Cassette(), benchmark._fallback(name))
+            with transport.use(player):
+                self.assertRaises(errors.WeiBoError, module._call, 'POST', upload_api, token,
+                                  pic = join(self.tmp, 'missing.jpg'), **upload_params)
+            self.assertEqual(player.requests, 0, name)
+
+    def test_record_replay(self):
+        # 录制的cassette保存后，不需要fallback也能回放(OAuth1.0每次不同的nonce, 签名不参与匹配)
+        for name in benchmark.MODULES:
+            module, token, params, upload_api, upload_params = benchmark._target(name)
+            path = join(self.tmp, name + '.cassette')
+            cassette = transport.Cassette(path)
+            with transport.use(transport.Recorder(cassette, transport.Player(transport.Cassette(), benchmark._fallback(name)))):
+                recorded = module._call('GET', 'statuses/home_timeline', token, **params)
+                module._call('POST', upload_api, token, pic = self.pic, **upload_params)
+            cassette.save()
+
+            player = transport.Player(transport.Cassette(path))
+            with transport.use(player):
+                replayed = module._call('GET', 'statuses/home_timeline', token, **params)
+                module._call('POST', upload_api, token, pic = self.pic, **upload_params)
+            self.assertEqual((player.requests, player.misses), (2, 0), name)
+            self.assertEqual(self._first(name, replayed), self._first(name, recorded), name)
+
+    def test_auth_error(self):
+        for name in benchmark.MODULES:
+            module, token, params, _, _ = benchmark._target(name)
+            if name.startswith('qweibo'):
+                # 腾讯出错时http状态码仍然是200: Oauth1.0的_call返回原始结果，Oauth2.0按ret抛出异常
+                response = (200, 'OK', json.dumps({'ret': 3, 'errcode': 36, 'msg': 'auth fail'}))
+            else:
+                response = (401, 'Unauthorized', json.dumps({'error_code': 21327, 'error': 'expired_token',
+                                                             'request': '/statuses/home_timeline'}))
+            with transport.use(transport.Player(transport.Cassette(), lambda *args: response)):
+                if name == 'qweibo':
+                    self.assertEqual(module._call('GET', 'statuses/home_timeline', token, **params).ret, 3, name)
+                else:
+                    self.assertRaises(errors.AuthError, module._call, 'GET', 'statuses/home_timeline', token, **params)
+
+
+
+class CassetteTest(unittest.TestCase):
+    def test_request_key(self):
+        key = transport.request_key('GET', 'https', 'api.weibo.com', '/2/users/show.json?uid=1&oauth_nonce=a&count=2')
+        self.assertEqual(key, transport.request_key('GET', 'https', 'api.weibo.com', '/2/users/show.json?count=2&uid=1&oauth_nonce=b'))  # nonce不参与匹配
+        self.assertNotEqual(key, transport.request_key('GET', 'https', 'api.weibo.com', '/2/users/show.json?uid=2&count=2'))
+
+    def test_play_in_order(self):
+        cassette = transport.Cassette()
+        key = transport.request_key('GET', 'https', 'api.weibo.com', '/2/users/show.json?uid=1')
+        cassette.record(key, (200, 'OK', '1'))
+        cassette.record(key, (200, 'OK', '2'))
+        self.assertEqual([cassette.play(key)[2] for _ in range(3)], ['1', '2', '2'])  # 最后一个重复使用
+        cassette.rewind()
+        self.assertEqual(cassette.play(key)[2], '1')
+
+    def test_miss(self):
+        player = transport.Player(transport.Cassette())
+        self.assertRaises(transport.CassetteMiss, player.request, 'GET', 'https', 'api.weibo.com', '/2/users/show.json')
+        self.assertEqual((player.requests, player.misses), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: tokenstore.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        Oauth2.0(weibo2.py, qweibo2.py, tweibo2.py)的token仓库.
+        记录每个token过期的绝对时间和refresh_token，在过期之前用refresh_token换取新的token，
+        避免抓取到一半时token过期、整个请求失败后再重试。
+        说明：
+            . start()启动后台线程，定期刷新refresh_margin秒内将要过期的token
+            . get(key)取当前有效的token，已经过期的token同步刷新后返回
+            . 刷新是single-flight的：同一个token同时只有一个线程请求刷新接口，其他线程等待同一个结果
+            . call(key, func, ...): 调用接口遇到errors.AuthError时刷新token并重试一次
+            . 持久化: FileStorage(json文件，写入时先写临时文件再rename)或SqliteStorage
+            . FileStorage的文件损坏(不是完整的json)时记录日志，把文件改名为"原文件名.corrupt.时间戳"保留下来，从空的记录开始
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        api = weibo2.OAuth2Api('appkey', 'appsecret', 'callback_url')
+        store = TokenStore(api, SqliteStorage('/var/lib/weibo/tokens.db'))
+        store.add(api.create_token(code))
+        store.start()
+
+        token = store.get(uid)
+        statuses = store.call(uid, api.statuses.home_timeline.get, count = 100)
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import threading
+
+import errors
+import executor
+
+
+_log = logging.getLogger(__name__)
+
+
+class FileStorage(object):
+    def __init__(self, path):
+        '''所有token保存在一个json文件中
+
+        @param path: 文件路径
+        '''
+        self.path = path
+        self._records = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._records is None:
+            try:
+                with open(self.path, 'rb') as f:
+                    records = json.load(f)
+            except IOError:
+                records = { }
+            except ValueError as ex:    # 写了一半的文件，或者被其他程序改坏
+                records = self._corrupt(ex)
+            if not isinstance(records, dict):
+                records = self._corrupt('not a json object')
+            self._records = records
+        return self._records
+
+    def _corrupt(self, reason):
+        # 损坏的文件改名保留下来，从空的记录开始
+        corrupt = '%s.corrupt.%d' % (self.path, time.time())
+        _log.error('token file "%s" is corrupt (%s), moved to "%s"', self.path, reason, corrupt)
+        os.rename(self.path, corrupt)
+        return { }
+
+    def _dump(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir = directory, prefix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                json.dump(self._records, f)
+            os.rename(tmp, self.path)
+        except:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def load(self):
+        '''返回所有记录. dict: key: token的key, value: 记录
+        '''
+        with self._lock:
+            return dict(self._load())
+
+    def save(self, key, record):
+        with self._lock:
+            self._load()[key] = record
+            self._dump()
+
+    def delete(self, key):
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._dump()
+
+
+class SqliteStorage(object):
+    def __init__(self, path):
+        '''token保存在sqlite数据库的tokens表中
+
+        @param path: 数据库文件路径
+        '''
+        import sqlite3
+        self._conn = sqlite3.connect(path, check_same_thread = False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS tokens (key TEXT PRIMARY KEY, data TEXT NOT NULL)')
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            return dict((key, json.loads(data)) for key, data in self._conn.execute('SELECT key, data FROM tokens'))
+
+    def save(self, key, record):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO tokens (key, data) VALUES (?, ?)', (key, json.dumps(record)))
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM tokens WHERE key = ?', (key, ))
+            self._conn.commit()
+
+
+def token_key(token):
+    '''token的默认key: 用户id(刷新之后access_token会改变，用户id不变)
+    '''
+    return str(getattr(token, 'uid', None) or getattr(token, 'open_id', None) or token.access_token)
+
+
+def _token_class(api):
+    # api所在模块(weibo2, qweibo2, tweibo2)的OAuthToken, 从持久化的记录恢复token时使用
+    for cls in type(api).__mro__:
+        token_class = getattr(sys.modules.get(cls.__module__), 'OAuthToken', None)
+        if token_class is not None:
+            return token_class
+    raise TypeError('%s is not an OAuth2Api' % type(api).__name__)
+
+
+class TokenStore(object):
+    def __init__(self, api, storage = None, refresh_margin = 600, check_interval = 60):
+        '''
+
+        @param api: OAuth2Api对象，用它的refresh方法刷新token
+        @param storage: FileStorage或者SqliteStorage. None表示不持久化
+        @param refresh_margin: 在过期之前多少秒刷新
+        @param check_interval: 后台线程检查的时间间隔(秒)
+        '''
+        self.api = api
+        self.storage = storage
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        self.refreshes = 0  # 调用刷新接口的次数
+        self.failures = 0   # 刷新失败的次数
+        self._token_class = _token_class(api)
+        self._tokens = { }
+        self._inflight = { }    # key: token的key, value: 正在进行的刷新的Future
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if storage is not None:
+            for key, record in storage.load().items():
+                token = self._token_class.__new__(self._token_class)
+                token.__dict__.update(record)
+                self._tokens[key] = token
+
+    def add(self, token, key = None):
+        '''加入(或替换)一个token
+        '''
+        key = key or token_key(token)
+        with self._lock:
+            self._tokens[key] = token
+        self._save(key, token)
+        return key
+
+    def remove(self, key):
+        with self._lock:
+            self._tokens.pop(key, None)
+        if self.storage is not None:
+            self.storage.delete(key)
+
+    def keys(self):
+        with self._lock:
+            return self._tokens.keys()
+
+    def _save(self, key, token):
+        if self.storage is not None:
+            self.storage.save(key, dict(token.__dict__))
+
+    def get(self, key):
+        '''取当前有效的token. 已经过期时同步刷新
+        '''
+        with self._lock:
+            token = self._tokens[key]
+        if token.expired:
+            token = self.refresh(key, token)
+        return token
+
+    def refresh(self, key, stale = None):
+        '''刷新token. 同一个token同时只有一个线程调用刷新接口
+
+        @param stale: 调用方认为已经失效的token. 如果已经被其他线程刷新过，直接返回新的token
+        '''
+        with self._lock:
+            token = self._tokens[key]
+            if stale is not None and token.access_token != stale.access_token:
+                return token
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = executor.Future()
+        if not owner:
+            return future.result()
+
+        future.set_running()
+        try:
+            new_token = self.api.refresh(token)
+        except:
+            exc_info = sys.exc_info()
+            with self._lock:
+                self.failures += 1
+                del self._inflight[key]
+            future.set_exc_info(exc_info)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        with self._lock:
+            self.refreshes += 1
+            self._tokens[key] = new_token
+            del self._inflight[key]
+        self._save(key, new_token)
+        future.set_result(new_token)
+        return new_token
+
+    def call(self, key, func, *args, **kwargs):
+        '''调用接口: func(token, *args, **kwargs). 遇到errors.AuthError时刷新token再重试一次
+        '''
+        token = self.get(key)
+        try:
+            return func(token, *args, **kwargs)
+        except errors.AuthError:
+            if not token.refresh_token:
+                raise
+        return func(self.refresh(key, token), *args, **kwargs)
+
+    def refresh_expiring(self):
+        '''刷新refresh_margin秒内将要过期的token. 返回刷新失败的token的key
+        '''
+        deadline = time.time() + self.refresh_margin
+        with self._lock:
+            expiring = [(key, token) for key, token in self._tokens.items()
+                        if token.refresh_token and token.expires_at <= deadline]
+        failed = [ ]
+        for key, token in expiring:
+            try:
+                self.refresh(key, token)
+            except Exception:
+                failed.append(key)
+        return failed
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_expiring()
+            self._stop.wait(self.check_interval)
+
+    def start(self):
+        '''启动后台刷新线程
+        '''
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target = self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {'tokens': len(self._tokens), 'refreshes': self.refreshes, 'failures': self.failures}
+
+
+if __name__ == '__main__':
+    pass
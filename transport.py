@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+    file: transport.py
+    author：darkbull(http://darkbull.net)
+    date: 2026-10-17
+    desc:
+        可替换的传输层：录制/回放api的请求和响应，不访问真实的api也可以做回归测试和性能测试.
+        六个模块的_request最后都调用httpool.default_pool.request(http_method, scheme, netloc, path, body, headers, timeout)，
+        任何有同样request方法的对象都可以代替连接池(传输层)：
+            . Recorder(cassette): 通过真实的传输层发送请求，同时把请求和响应记录到cassette
+            . Player(cassette): 不联网，在进程内直接返回cassette中记录的响应
+            . ReplayServer(cassette) + Redirect(address): 本地的http服务器返回记录的响应，
+              Redirect把所有请求转发到这个服务器(Host头不变)，用于测试连接、请求体的发送
+            . use(transport): 在with语句中临时替换httpool.default_pool
+        说明：
+            . cassette文件是gzip压缩的json lines，每行一个请求/响应
+            . 请求按(方法, scheme, host, 路径, 参数)匹配. 每次都不同的参数(oauth_nonce, oauth_timestamp, oauth_signature)
+              不参与匹配；multipart请求体(上传图片)的分隔符是随机的，也不参与匹配
+            . 同一个请求记录了多次时按录制的顺序返回，最后一次的响应重复使用
+            . 回放时没有匹配的记录抛出CassetteMiss；可以指定fallback(http_method, scheme, netloc, path, body)生成响应
+
+        python版本要求：python2.6+，不支持python3.x
+
+    example:
+        cassette = Cassette('/tmp/weibo.cassette')
+        with use(Recorder(cassette)):
+            api.statuses.home_timeline.get(token)
+        cassette.save()
+
+        with use(Player(Cassette('/tmp/weibo.cassette'))):
+            print api.statuses.home_timeline.get(token)     # 不联网
+'''
+
+__version__ = '0.1a'
+__author__ = 'darkbull(http://darkbull.net)'
+
+import gzip
+import json
+import base64
+import urllib
+import urlparse
+import threading
+import contextlib
+import SocketServer
+import BaseHTTPServer
+from os.path import exists
+
+import httpool
+
+
+# 每次请求都不同的参数，不参与匹配
+VOLATILE_PARAMS = frozenset(['oauth_nonce', 'oauth_timestamp', 'oauth_signature'])
+
+
+class CassetteMiss(Exception):
+    '''回放时cassette中没有匹配的请求
+    '''
+
+
+def _normalize(query):
+    pairs = [(key, val) for key, val in urlparse.parse_qsl(query, keep_blank_values = True) if key not in VOLATILE_PARAMS]
+    pairs.sort()
+    return urllib.urlencode(pairs)
+
+
+def request_key(http_method, scheme, netloc, path, body = None):
+    '''请求的匹配key: 方法 scheme://host路径?排序后的参数 排序后的表单参数
+    '''
+    path, _, query = path.partition('?')
+    form = _normalize(body) if isinstance(body, str) else ''    # multipart请求体不参与匹配
+    return '%s %s://%s%s?%s %s' % (http_method, scheme, netloc, path, _normalize(query), form)
+
+
+def _drain(body):
+    # 读完流式的请求体(如multipart.MultipartBody)，与真实发送时的开销相同
+    if hasattr(body, 'read'):
+        while body.read(65536):
+            pass
+
+
+class Cassette(object):
+    def __init__(self, path = None):
+        '''
+
+        @param path: cassette文件路径. 文件存在时加载记录. None表示只保存在内存中
+        '''
+        self.path = path
+        self._records = [ ] # [(key, (status, reason, html)), ...], 录制的顺序
+        self._responses = { }   # key: 请求的key, value: [响应, ...]
+        self._played = { }  # key: 请求的key, value: 已经回放的次数
+        self._lock = threading.Lock()
+        if path and exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._records)
+
+    def record(self, key, response):
+        with self._lock:
+            self._records.append((key, response))
+            self._responses.setdefault(key, [ ]).append(response)
+
+    def play(self, key):
+        '''返回key对应的下一个响应. 没有记录时返回None
+        '''
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                return None
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            return responses[min(index, len(responses) - 1)]
+
+    def rewind(self):
+        '''从头开始回放
+        '''
+        with self._lock:
+            self._played.clear()
+
+    def load(self, path):
+        f = gzip.open(path, 'rb')
+        try:
+            for line in f:
+                entry = json.loads(line)
+                html = base64.b64decode(entry['b64']) if 'b64' in entry else entry['html'].encode('utf-8')
+                self.record(str(entry['key']), (entry['status'], str(entry['reason']), html))
+        finally:
+            f.close()
+
+    def save(self, path = None):
+        path = path or self.path
+        with self._lock:
+            records = list(self._records)
+        f = gzip.open(path, 'wb')
+        try:
+            for key, (status, reason, html) in records:
+                entry = {'key': key, 'status': status, 'reason': reason}
+                try:
+                    entry['html'] = html.decode('utf-8')
+                except UnicodeDecodeError:  # 不是utf-8的响应(如图片)
+                    entry['b64'] = base64.b64encode(html)
+                f.write(json.dumps(entry, ensure_ascii = False).encode('utf-8') + '\n')
+        finally:
+            f.close()
+
+
+class Recorder(object):
+    def __init__(self, cassette, transport = None):
+        '''
+
+        @param transport: 真实的传输层. None表示httpool.default_pool(创建Recorder时的)
+        '''
+        self.cassette = cassette
+        self.transport = transport or httpool.default_pool
+
+    def request(self, http_method, scheme, netloc, path, body = None, headers = None, timeout = 10):
+        key = request_key(http_method, scheme, netloc, path, body)
+        response = self.transport.request(http_method, scheme, netloc, path, body, headers, timeout)
+        self.cassette.record(key, response)
+        return response
+
+
+class Player(object):
+    def __init__(self, cassette, fallback = None):
+        '''
+
+        @param fallback: 没有匹配的记录时生成响应的函数: fallback(http_method, scheme, netloc, path, body). None表示抛出CassetteMiss
+        '''
+        self.cassette = cassette
+        self.fallback = fallback
+        self.requests = 0
+        self.misses = 0
+
+    def request(self, http_method, scheme, netloc, path, body = None, headers = None, timeout = 10):
+        _drain(body)
+        self.requests += 1
+        response = self.cassette.play(request_key(http_method, scheme, netloc, path, body))
+        if response is None:
+            self.misses += 1
+            if self.fallback is None:
+                raise CassetteMiss(request_key(http_method, scheme, netloc, path, body))
+            response = self.fallback(http_method, scheme, netloc, path, body)
+        return response
+
+
+class _ReplayHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # 响应头和内容分开写，开启Nagle时keep-alive连接上每个请求都要等待约40ms的延迟确认
+
+    def _replay(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else ''
+        if self.headers.get('Content-Type', '').startswith('multipart/'):
+            body = None
+        scheme = self.headers.get('X-Forwarded-Proto', 'https')
+        response = self.server.player.request(self.command, scheme, self.headers.get('Host'), self.path, body)
+        status, reason, html = response
+        self.send_response(status, reason)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(html)))
+        self.end_headers()
+        self.wfile.write(html)
+
+    do_GET = do_POST = do_DELETE = _replay
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, cassette, address = ('127.0.0.1', 0), fallback = None):
+        '''本地的http服务器，返回cassette中记录的响应. 没有匹配的记录时返回404
+
+        @param address: 监听的地址. 端口为0时自动分配，实际地址见self.address
+        '''
+        if fallback is None:
+            fallback = lambda *args: (404, 'Not Found', json.dumps({'error': 'cassette miss', 'request': request_key(*args)}))
+        self.player = Player(cassette, fallback)
+        BaseHTTPServer.HTTPServer.__init__(self, address, _ReplayHandler)
+        self.address = '%s:%d' % self.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target = self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class Redirect(object):
+    def __init__(self, address, transport = None):
+        '''把所有请求以http发送到address(如：ReplayServer的address)，Host头保持原来的api域名
+
+        @param transport: 发送请求的传输层. None表示新建一个httpool.ConnectionPool
+        '''
+        self.address = address
+        self.transport = transport or httpool.ConnectionPool()
+
+    def request(self, http_method, scheme, netloc, path, body = None, headers = None, timeout = 10):
+        headers = dict(headers or { })
+        headers['Host'] = netloc
+        headers['X-Forwarded-Proto'] = scheme
+        return self.transport.request(http_method, 'http', self.address, path, body, headers, timeout)
+
+
+@contextlib.contextmanager
+def use(transport):
+    '''在with语句中用transport代替httpool.default_pool
+    '''
+    default_pool, httpool.default_pool = httpool.default_pool, transport
+    try:
+        yield transport
+    finally:
+        httpool.default_pool = default_pool
+
+
+if __name__ == '__main__':
+    pass
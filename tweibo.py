@@ -30,21 +30,28 @@ __version__ = '0.1b'
 __author__ = 'darkbull(http://darkbull.net)'
 
 
+import sys
 import urllib
+import functools
 import binascii
 import time
-import random
-import json
-import httplib
-import uuid
-import mimetypes
 import hmac
 import hashlib
-from os.path import getsize, isfile, basename
+from os.path import getsize, isfile
 from urlparse import urlparse
 
+import httpool
+import apipath
+import multipart
+import executor
+from jsonobj import DictObject
+from errors import WeiBoError
+import oauth1
+import metrics
+import imageprep
+
 hmac_sha1 = lambda key, val: binascii.b2a_base64(hmac.new(str(key), val, hashlib.sha1).digest())[:-1]
-nonce = lambda: str(random.randint(1000000, 9999999))
+nonce = oauth1.nonce
 tm = lambda: str(int(time.time()))
 utf8 = lambda u: u.encode('utf-8')
 urlencode = lambda p: urllib.quote_plus(p, safe = '~')
@@ -55,30 +62,6 @@ class OAuthError(IOError):
     pass
     
     
-class WeiBoError(Exception):
-    pass
-
-    
-class DictObject(dict):  
-    def __init__(self, d): 
-        if isinstance(d, basestring):
-            d = json.loads(d)
-        dict.__init__(self, d)  
-      
-    def __getattr__(self, attr):  
-        if attr in self:  
-            ret = self[attr]  
-            if type(ret) is dict:  
-                return DictObject(ret)  
-            elif type(ret) is list:  
-                for idx, item in enumerate(ret):  
-                    if type(item) is dict:  
-                        ret[idx] = DictObject(item)  
-            return ret  
-        else:
-            raise AttributeError, attr
-
-
 class OAuthToken(object):
     def __init__(self, appkey, appsecret, oauth_token, oauth_token_secret, original_data = '', callback = 'null'):
         """
@@ -157,8 +140,26 @@ class OAuthToken(object):
                 'oauth_nonce': nonce(),
                 'oauth_version': '1.0',
             }
+
+    def signer(self):
+        '''请求签名用的oauth1.Signer. 取得access token之后密钥改变，重新创建
+        '''
+        if not self.verified:
+            raise OAuthError, ('oauth error', 'unauthorized token.')
+        key = (self.appkey, self.appsecret, self.oauth_token, self.oauth_token_secret)
+        signer = getattr(self, '_signer', None)
+        if signer is None or signer.key != key:
+            signer = self._signer = oauth1.Signer(*key)
+        return signer
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_signer', None)  # hmac对象不能pickle
+        return state
         
     
+PIC_MIN_SIZE, PIC_MAX_SIZE = 1024, 1024 * 1024 * 2  # 网易微博上传图片大小限制是1K-2M, 参考imageprep
+
 def _request(http_method, url, query = None, timeout = 10, token = None):
     '''向远程服务器发送一个http request
     
@@ -170,77 +171,34 @@ def _request(http_method, url, query = None, timeout = 10, token = None):
     scheme, netloc, path, params, args = urlparse(url)[:5]
     if args:
         path += '?' + args
-    conn = httplib.HTTPConnection(netloc, timeout = timeout) if scheme == 'http' else httplib.HTTPSConnection(netloc, timeout = timeout)
     headers = {
         'User-Agent': '163WeiBo-Python-Client; Created by darkbull(http://darkbull.net)',
         'Host': netloc,
     }
     upload_pic = 'statuses/upload' in url
-    if token and query:
+    if token:
         # 生成签名
         # 如果有上传图片，只需签名"oauth_"开头的参数. Fuck, 在api文档里没有一点说明，浪费了我n多时间。fuck....
-        if upload_pic:
-            items = [(key, val) for key, val in query.items() if key.startswith('oauth_')]
-        else:
-            items = query.items()
-        items.sort()
-        t = '&'.join(('%s=%s' % (urlencode(key), urlencode(val)) for key, val in items))
-        sig_base_str = '%s&%s&%s' % (http_method, urlencode(url), urlencode(t))
-        sig = hmac_sha1('%s&%s' % (token.appsecret, token.oauth_token_secret), sig_base_str)
-        query['oauth_signature'] = sig
-        
-        t = [ ]
-        auth_header = ['OAuth realm=""']
-        for key in query:
-            if key.startswith('oauth_'):
-                auth_header.append('%s="%s"' % (urlencode(key), urlencode(query[key])))
-                t.append(key)
-        for key in t:
-            del query[key]
-        headers['Authorization'] = ', '.join(auth_header)
+        signer = token.signer()
+        oauth = signer.sign(http_method, url, query, nonce(), tm(), { } if upload_pic else None)
+        headers['Authorization'] = signer.authorization(oauth)
     
     if upload_pic:    # 需要上传图片
         assert http_method == 'POST'
         assert 'pic' in query
-        pic_path = query.pop('pic')
-        
-        if not isfile(pic_path):
-            raise WeiBoError(u'File "{0}" not exist' % pic_path)
-        if not (1024 <= getsize(pic_path) <= 1024 * 1024 * 2): # 网易微博上传图片大小限制是1K-2M
-            raise WeiBoError('Size of file "{0}" must be less than 2M.' % pic_path)
+        pic = query.pop('pic')   # 文件路径或者multipart.Media
         
-        boundary = '------' + str(uuid.uuid4())
-        body = [ ]
-        
-        if query:
-            for field_name, val in query.items():
-                body.append('--' + boundary)
-                body.append('Content-Disposition: form-data; name="%s"' % field_name)
-                body.append('Content-Type: text/plain; charset=US-ASCII')
-                body.append('Content-Transfer-Encoding: 8bit')
-                body.append('')
-                if type(val) is unicode:
-                    body.append(utf8(val))
-                else:
-                    body.append(val)
-        
-        mimetype = mimetypes.guess_type(pic_path)[0]
-        with open(pic_path, 'rb') as f:
-            data = f.read()
-        filename = basename(pic_path)
-        body.append('--' + boundary)
-        body.append('Content-Disposition: form-data; name="%s"; filename="%s"' % ('pic', filename))
-        if mimetype:
-            body.append('Content-Type: ' + mimetype)
-        body.append('Content-Transfer-Encoding: binary')
-        body.append('')
-        body.append(data)
-        
-        body.append('--' + boundary + '--')
-        body.append('')
-        body = '\r\n'.join(body)
+        if isinstance(pic, multipart.Media):
+            pic_path, pic_size = pic.file_path, len(pic)
+        elif isfile(pic):
+            pic_path, pic_size = pic, getsize(pic)
+        else:
+            raise WeiBoError(u'File "%s" not exist' % pic)
+        if not (PIC_MIN_SIZE <= pic_size <= PIC_MAX_SIZE):
+            raise WeiBoError('Size of file "%s" must be between %dK and %dM.' % (pic_path, PIC_MIN_SIZE // 1024, PIC_MAX_SIZE // (1024 * 1024)))
         
-        headers['Content-Type'] = 'multipart/form-data; boundary=' + boundary
+        body = multipart.MultipartBody(query, 'pic', pic)
+        headers['Content-Type'] = body.content_type
         headers['Content-Length'] = str(len(body))
         headers['Connection'] = 'keep-alive'
     else:
@@ -256,13 +214,19 @@ def _request(http_method, url, query = None, timeout = 10, token = None):
                     path += '?' + body
                 body = ''
             
-    conn.request(http_method, path, body = body, headers = headers)  
-    resp = conn.getresponse()
-    result = (resp.status, resp.reason, resp.read())
-    conn.close()
-    return result
+    try:
+        return httpool.default_pool.request(http_method, scheme, netloc, path, body, headers, timeout)
+    finally:
+        if upload_pic:
+            body.close()
     
     
+# 客户端限流(参考ratelimit.RateLimiter)和失败重试策略(参考errors.RetryPolicy)，由oauth1.Sender读取. None表示不限流、不重试
+rate_limiter = None
+retry_policy = None
+
+_sender = oauth1.Sender(sys.modules[__name__], _request)
+
 _URI_COMMON = 'http://api.t.163.com/'
 def _call(http_method, uri, token, **kwargs):
     if not uri.startswith('http'):
@@ -271,39 +235,31 @@ def _call(http_method, uri, token, **kwargs):
         uri = uri + '.json'
     http_method = http_method.upper()
         
-    params = token.to_header()
+    if not token.verified:
+        raise OAuthError, ('oauth error', 'unauthorized token.')
+    params = { }  # oauth_*参数在_request中签名时加上，重试时重新生成nonce和timestamp
     for key, val in kwargs.items():
         if type(key) is unicode:
             key = utf8(key)
         if type(val) is unicode:
             val = utf8(val)
         params[key] = val
+    if 'statuses/upload' in uri and 'pic' in params:   # 发送请求之前检查图片大小，超出限制时压缩，参考imageprep
+        params['pic'] = imageprep.default_preprocessor.fit(params['pic'], PIC_MIN_SIZE, PIC_MAX_SIZE)
     
-    try:
-        errcode, reason, html = _request(http_method, uri, params, token = token)
-    except IOError as ex:
-        raise WeiBoError(ex)
-    if errcode != 200:
-        try:
-            json_obj = json.loads(html)
-            raise WeiBoError(u'[error:%s occur when request "%s"]:%s' % (json_obj['error_code'],  json_obj['request'], json_obj['error']))
-        except WeiBoError:
-            raise
-        except Exception:
-            raise WeiBoError('errcode: %d, reason: %s, html: %s' % (errcode, reason, html))
-    
-    response = html.decode('utf-8') # utf-8 => unicode
-    json_obj = json.loads(response)
-    if type(json_obj) is dict and json_obj.get('error_code'):
-        raise WeiBoError(u'[error:%s occur when request "%s"]:%s' % (json_obj['error_code'],  json_obj['request'], json_obj['error']))
-    return DictObject(json_obj)
+    tracer = metrics.tracer
+    if tracer is not None:  # 耗时统计，参考metrics.Tracer
+        return tracer.call(http_method, uri, _sender.fetch, http_method, uri, params, token)
+    return _sender.fetch(http_method, uri, params, token)
+
+
+_parse_path = apipath.PathParser().parse
+
 
-    
 class OAuthApi(object):
     def __init__(self, appkey, appsecret):
         self.appkey = appkey
         self.appsecret = appsecret
-        self._attrs = [ ]
         
     _SIGNATURE_BASE_STRING = ('GET', 'http://api.t.163.com/oauth/request_token', 'oauth_consumer_key={app_key}&oauth_nonce={nonce}&oauth_signature_method=HMAC-SHA1&oauth_timestamp={timestamp}&oauth_version=1.0')
     _REQUEST_TOKEN_URL = 'http://api.t.163.com/oauth/request_token?oauth_consumer_key={app_key}&oauth_nonce={nonce}&oauth_signature={signature}&oauth_signature_method=HMAC-SHA1&oauth_timestamp={timestamp}&oauth_version=1.0'
@@ -332,17 +288,28 @@ class OAuthApi(object):
         return token
     
     def __getattr__(self, attr):  
-        self._attrs.append(attr)  
-        return self  
+        if attr.startswith('__'):
+            raise AttributeError, attr
+        return apipath.ApiPath(self, (attr, ))
           
-    def __call__(self, token = None, **kwargs):  
+    def _invoke(self, attrs, token, kwargs):  
         """调用接口，如：api.statuses.public_timeline.get(token) # 以get方式提交请求
         """
-        http_method = self._attrs[-1]
-        api_uri = '/'.join(self._attrs[:-1])    # statues.home_time.get
-        self._attrs = [ ]
+        http_method, api_uri = _parse_path(attrs)
         return _call(http_method, api_uri, token, **kwargs)
         
+    def batch(self, max_workers = 8):
+        """批量调用，调用在后台线程池中执行，按完成的先后顺序取回结果。如：
+            with api.batch() as b:
+                for uid in uids:
+                    b.users.show.get(token, uid = uid)
+                for slot in b.as_completed():
+                    print slot.result()
+                    
+        @param max_workers: 最多同时执行的请求数
+        """
+        return executor.Batch(functools.partial(OAuthApi._invoke, self), max_workers)
+        
         
 # 通过授权的token，可以直接通过 tweibo.api.进行调用
 api = OAuthApi('', '') 